@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark the float32 DSP mode against the default float64 path.
+
+Feeds the same synthetic capture (noise through a filter, delayed, plus a
+little uncorrelated noise) to compute_metrics_batch in both precisions and
+reports the time per frame and the largest magnitude/phase deviation of the
+float32 result. Run from the agent directory:
+
+    python benchmarks/bench_precision.py [--nfft 8192 16384] [--chans 1 4] [--frames 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture_agent import dsp
+from capture_agent.schema import CaptureConfig
+
+FS = 48000
+BUFFER_SECONDS = 2.0
+HOP = 1024
+DELAY_MS = 5.0
+
+
+def make_block(n_meas: int, seconds: float, rng: np.random.Generator) -> np.ndarray:
+    """float32 capture block: ref noise in column 0, filtered/delayed copies after it."""
+    n = int(seconds * FS)
+    delay = int(round(DELAY_MS * FS / 1000.0))
+    ref = rng.standard_normal(n + delay) * 0.1
+    cols = [ref[delay:]]
+    for c in range(n_meas):
+        # a different gentle EQ per channel so the TFs are not flat
+        b, a = [1.0, -0.5 + 0.1 * c], [1.0, -0.2]
+        meas = lfilter(b, a, ref)[:n] * (0.5 / (c + 1))
+        cols.append(meas + 1e-3 * rng.standard_normal(n))
+    return np.stack(cols, axis=1).astype(np.float32)
+
+
+def make_config(nfft: int, n_meas: int, precision: str) -> CaptureConfig:
+    return CaptureConfig(
+        deviceId="0", sampleRate=FS, blockSize=HOP, refChan=1, measChan=2,
+        measChans=list(range(2, 2 + n_meas)), nfft=nfft, avg="power", avgCount=1,
+        window="hann", lpfMode="none", lpfFreq=0.0, dspPrecision=precision,
+    )
+
+
+def run_frames(block: np.ndarray, config: CaptureConfig, frames: int):
+    """Slide a BUFFER_SECONDS window over ``block`` one hop at a time."""
+    dsp.reset_dsp_state()
+    dsp.delay_set_manual(DELAY_MS)
+    window = int(BUFFER_SECONDS * FS)
+    results = None
+    start = time.perf_counter()
+    for i in range(frames):
+        pos = window + i * HOP
+        results = dsp.compute_metrics_batch(
+            block[pos - window:pos], config, stream_pos=pos, estimate_delay=False,
+        )
+    return (time.perf_counter() - start) / frames, results
+
+
+def deviation(ref_results, test_results, min_coh: float = 0.5):
+    """Largest |dB| and |phase| difference over bins with usable coherence."""
+    max_db = max_deg = 0.0
+    for (tf64, _, _), (tf32, _, _) in zip(ref_results, test_results):
+        coh = np.asarray(tf64.coh)
+        ok = coh >= min_coh
+        d_db = np.abs(np.subtract(tf32.mag_db, tf64.mag_db))[ok]
+        d_ph = np.abs((np.subtract(tf32.phase_deg, tf64.phase_deg) + 180.0) % 360.0 - 180.0)[ok]
+        if d_db.size:
+            max_db = max(max_db, float(d_db.max()))
+            max_deg = max(max_deg, float(d_ph.max()))
+    return max_db, max_deg
+
+
+def bench_delay(block: np.ndarray, repeats: int = 10):
+    timings = {}
+    estimates = {}
+    for dtype in (np.float64, np.float32):
+        x = block[:, 0].astype(dtype)
+        y = block[:, 1].astype(dtype)
+        dsp.find_delay(x, y, FS, max_ms=2000.0)  # warm caches/plans
+        start = time.perf_counter()
+        for _ in range(repeats):
+            ms, _ = dsp.find_delay(x, y, FS, max_ms=2000.0)
+        timings[dtype] = (time.perf_counter() - start) / repeats
+        estimates[dtype] = ms
+    return timings, estimates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nfft", type=int, nargs="+", default=[4096, 8192, 16384])
+    parser.add_argument("--chans", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    max_chans = max(args.chans)
+    block = make_block(max_chans, BUFFER_SECONDS + (args.frames + 1) * HOP / FS, rng)
+
+    print(f"fs={FS} Hz, window={BUFFER_SECONDS:.1f} s, hop={HOP}, pyfftw={dsp._PYFFTW_AVAILABLE}")
+    print(f"{'nfft':>6} {'chans':>5} {'f64 ms':>8} {'f32 ms':>8} {'speedup':>8} {'max dB':>9} {'max deg':>9}")
+    for nfft in args.nfft:
+        for n_meas in args.chans:
+            sub = block[:, :1 + n_meas]
+            t64, r64 = run_frames(sub, make_config(nfft, n_meas, "float64"), args.frames)
+            t32, r32 = run_frames(sub, make_config(nfft, n_meas, "float32"), args.frames)
+            max_db, max_deg = deviation(r64, r32)
+            print(f"{nfft:>6} {n_meas:>5} {t64 * 1e3:>8.2f} {t32 * 1e3:>8.2f} "
+                  f"{t64 / t32:>7.2f}x {max_db:>9.2e} {max_deg:>9.2e}")
+
+    timings, estimates = bench_delay(block)
+    print(f"\nfind_delay: f64 {timings[np.float64] * 1e3:.2f} ms -> {estimates[np.float64]:.4f} ms, "
+          f"f32 {timings[np.float32] * 1e3:.2f} ms -> {estimates[np.float32]:.4f} ms "
+          f"({timings[np.float64] / timings[np.float32]:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
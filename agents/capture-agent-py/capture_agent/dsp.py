@@ -1,5 +1,6 @@
 import numpy as np
-from scipy.signal import welch, csd
+from scipy.signal import firwin, upfirdn
+from scipy.sparse import csr_matrix
 try:
     import pyfftw
     import pyfftw.interfaces.numpy_fft as fftw
@@ -11,8 +12,9 @@ from collections import OrderedDict
 from functools import wraps
 import weakref
 import gc
+import threading
 import time
-from typing import Dict, Tuple, Optional, Any, TypedDict, Union
+from typing import Dict, List, NamedTuple, Sequence, Tuple, Optional, Any, TypedDict, Union
 try:
     import psutil
     import os
@@ -20,12 +22,25 @@ try:
 except ImportError:
     _MEMORY_MONITORING_AVAILABLE = False
 from .schema import CaptureConfig, TFData, SPLData
+from .stats import StageTimings
 
-_windows: OrderedDict[Tuple[str, int], np.ndarray] = OrderedDict()
+# Windows, smoothing operators, output grids and tapers are shared by every
+# session's analysis and delay threads; their LRU bookkeeping is not atomic.
+_cache_lock = threading.RLock()
+
+def _with_cache_lock(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _cache_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+_windows: OrderedDict[Tuple[str, int, np.dtype], np.ndarray] = OrderedDict()
 _MAX_WINDOWS = 16  # Reduced cap for better memory control
 
-def get_window(name, N):
-    key = (name, int(N))
+@_with_cache_lock
+def get_window(name, N, dtype=np.float64):
+    key = (name, int(N), np.dtype(dtype))
     w = _windows.get(key)
     if w is None:
         if name == 'hann':
@@ -36,6 +51,7 @@ def get_window(name, N):
             w = np.blackman(N)
         else:
             w = np.hanning(N)
+        w = w.astype(dtype, copy=False)
         _windows[key] = w
         _windows.move_to_end(key, last=True)
         if len(_windows) > _MAX_WINDOWS:
@@ -44,255 +60,381 @@ def get_window(name, N):
         _windows.move_to_end(key, last=True)
     return w
 
-# Add cache clearing function
-def log_memory_usage():
-    """Log current memory usage if psutil is available."""
-    if not _MEMORY_MONITORING_AVAILABLE:
-        return
+def dsp_dtype(config: CaptureConfig) -> np.dtype:
+    """Real sample dtype the analysis runs in (``config.dspPrecision``)."""
+    if getattr(config, "dspPrecision", "float64") == "float32":
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+def _complex_dtype(dtype) -> np.dtype:
+    """complex64 for float32 data, complex128 otherwise."""
+    return np.result_type(dtype, np.complex64)
 
+def _as_float(a: np.ndarray) -> np.ndarray:
+    """Keep float32/float64 input as is (it selects the precision); upcast the rest."""
+    return a if a.dtype in (np.float32, np.float64) else a.astype(np.float64)
+
+# Add cache clearing function
+try:
+    import resource
+    _PAGE_SIZE = resource.getpagesize()
+except ImportError:
+    _PAGE_SIZE = 4096
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where it can't be read."""
+    if _MEMORY_MONITORING_AVAILABLE:
+        try:
+            return int(psutil.Process(os.getpid()).memory_info().rss)
+        except Exception:
+            pass  # Fall back to /proc below
     try:
-        process = psutil.Process(os.getpid())
-        memory_info = process.memory_info()
-        memory_mb = memory_info.rss / 1024 / 1024
-        pass  # Memory stats tracked
-    except Exception:
-        pass  # Memory monitoring error
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
 
+@_with_cache_lock
 def clear_dsp_caches():
     """Clear DSP caches to free memory.
 
-    Enhanced with proper cleanup of all memory-tracking structures.
+    Enhanced with proper cleanup of all memory-tracking structures. Clears
+    the shared caches and the default analyzer's; session analyzers clear
+    their own with ``Analyzer.clear_caches``.
     """
-    global _windows, _work_arrays, _work_array_access_times, _work_array_memory_sizes, _fft_plans
+    global _windows
     _windows.clear()
-    _hann_cached.cache_clear()
+    _smoothing_ops.clear()
+    _output_grids.clear()
+    _decimation_filters.clear()
     _taper_for_M.cache_clear()
-    # Clear work arrays and memory tracking
-    _work_arrays.clear()
-    _work_array_access_times.clear()
-    _work_array_memory_sizes.clear()  # Fix 2: Clear memory size tracking
-    # Clear FFT plans with proper cleanup
-    for plan_data in _fft_plans.values():
-        if plan_data:
-            plan, in_arr, out_arr, _ = plan_data
-            del plan
-            del in_arr
-            del out_arr
-    _fft_plans.clear()
-    gc.collect()
-    log_memory_usage()
+    _default_analyzer.clear_caches()
+
+@_with_cache_lock
+def cache_sizes(analyzer: Optional["Analyzer"] = None) -> Dict[str, int]:
+    """Entries in each shared DSP cache and in ``analyzer``'s, plus its work-array bytes."""
+    an = _analyzer(analyzer)
+    with an._lock:
+        work_arrays = len(an._work_arrays)
+        work_array_bytes = int(sum(an._work_array_memory_sizes.values()))
+        fft_plans = len(an._fft_plans)
+    return {
+        "windows": len(_windows),
+        "smoothingOps": len(_smoothing_ops),
+        "outputGrids": len(_output_grids),
+        "decimationFilters": len(_decimation_filters),
+        "tapers": len(_taper_for_M.__self__.cache),
+        "workArrays": work_arrays,
+        "workArrayBytes": work_array_bytes,
+        "fftPlans": fft_plans,
+    }
 
 # Fix 2: Memory-aware cache for DSP work arrays
-_work_arrays: Dict[Tuple[str, Tuple[int, ...], Any], np.ndarray] = {}
-_work_array_access_times: Dict[Tuple[str, Tuple[int, ...], Any], float] = {}
-_work_array_memory_sizes: Dict[Tuple[str, Tuple[int, ...], Any], int] = {}  # Track memory usage per array
 MAX_WORK_ARRAYS = 16
 MAX_WORK_ARRAY_MEMORY = 100 * 1024 * 1024  # 100MB limit for work array cache
-_cleanup_counter = 0
 CLEANUP_INTERVAL = 100  # Every 100 frames
 
 # Fix 3: FFT plan lifecycle management with memory threshold
-_fft_plans: Dict[Tuple[int, str, Any], Tuple[Any, np.ndarray, np.ndarray, float]] = {}
 MAX_FFT_PLANS = 8
 MAX_FFT_PLAN_MEMORY = 50 * 1024 * 1024  # 50MB limit for FFT plans
-_fft_plan_cleanup_counter = 0
 FFT_CLEANUP_INTERVAL = 50  # Cleanup FFT plans every 50 calls
 
-def get_work_array(key: str, shape: tuple, dtype=np.float64) -> np.ndarray:
-    """Get a reusable work array with memory-aware limits and tracking.
-
-    Fix 2: Implements memory-aware caching that tracks array.nbytes and evicts
-    based on total memory usage, prioritizing largest arrays for eviction.
-    """
-    global _work_arrays, _work_array_access_times, _work_array_memory_sizes
-
-    # Include dtype in cache key to prevent type mismatches
-    cache_key = (key, shape, dtype)
-
-    # Calculate memory size for new array
-    array_nbytes = np.prod(shape) * np.dtype(dtype).itemsize
-
-    # Check if we need this array and if it would exceed memory limit
-    if cache_key not in _work_arrays:
-        current_memory = sum(_work_array_memory_sizes.values())
-
-        # Evict arrays if we exceed memory limit
-        while current_memory + array_nbytes > MAX_WORK_ARRAY_MEMORY and _work_arrays:
-            # Sort by memory size (largest first) and then by access time
-            evict_candidates = sorted(
-                _work_array_memory_sizes.keys(),
-                key=lambda k: (-_work_array_memory_sizes[k], _work_array_access_times.get(k, 0))
-            )
-
-            # Evict largest/oldest arrays until we have space
-            for evict_key in evict_candidates:
-                if evict_key != cache_key:  # Don't evict what we're trying to create
-                    evicted_size = _work_array_memory_sizes.pop(evict_key, 0)
-                    _work_arrays.pop(evict_key, None)
-                    _work_array_access_times.pop(evict_key, None)
-                    current_memory -= evicted_size
-                    if current_memory + array_nbytes <= MAX_WORK_ARRAY_MEMORY:
-                        break
-
-            # If still not enough space, clear more aggressively
-            if current_memory + array_nbytes > MAX_WORK_ARRAY_MEMORY:
-                # Keep only the smallest essential arrays
-                break
+class Analyzer:
+    """DSP state of one capture session.
 
-    if cache_key not in _work_arrays:
-        _work_arrays[cache_key] = np.empty(shape, dtype=dtype)
-        _work_array_memory_sizes[cache_key] = array_nbytes
+    Owns everything concurrent sessions must not share: the delay state of
+    each measurement channel, the streaming spectra ring, and the reusable
+    work arrays and FFT plans (behind the analyzer's own lock, since a
+    session's delay job and analysis run on different threads). Windows,
+    smoothing operators, output grids, tapers and decimation filters depend
+    only on their arguments and stay shared.
 
-    _work_array_access_times[cache_key] = time.time()
-    return _work_arrays[cache_key]
-
-
-def cleanup_fft_plans(force: bool = False):
-    """Clean up FFT plans based on memory usage and age.
-
-    Fix 3: Implements proper lifecycle management for FFT plans with
-    memory thresholds and periodic cleanup.
+    Module-level functions take an optional ``analyzer``; without one they
+    use the module default, which single-session callers never need to see.
     """
-    global _fft_plans, _fft_plan_cleanup_counter
-
-    if not _fft_plans:
-        return
 
-    # Calculate total memory used by FFT plans
-    total_memory = 0
-    plan_memory = {}
-    for key, (plan, in_arr, out_arr, last_access) in _fft_plans.items():
-        memory = in_arr.nbytes + out_arr.nbytes
-        plan_memory[key] = memory
-        total_memory += memory
-
-    # Clean up if over memory limit or forced
-    if force or total_memory > MAX_FFT_PLAN_MEMORY:
-        # Sort by last access time (oldest first)
-        sorted_plans = sorted(_fft_plans.keys(),
-                            key=lambda k: _fft_plans[k][3])
-
-        # Remove oldest plans until under memory limit
-        while total_memory > MAX_FFT_PLAN_MEMORY * 0.75 and sorted_plans:
-            key_to_remove = sorted_plans.pop(0)
-            removed_memory = plan_memory.get(key_to_remove, 0)
-
-            # Properly clean up the plan and its arrays
-            plan_data = _fft_plans.pop(key_to_remove, None)
-            if plan_data:
-                plan, in_arr, out_arr, _ = plan_data
-                # PyFFTW plans hold references to arrays; break these
-                del plan
-                del in_arr
-                del out_arr
-                total_memory -= removed_memory
-
-        # Force garbage collection after cleanup
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.delay: DelayState = _new_delay_state()
+        # Every measurement channel has its own acoustic path, so batched
+        # captures keep one delay state per extra channel; ``delay`` belongs
+        # to the first.
+        self.channel_delays: Dict[int, DelayState] = {}
+        self.spectra = StreamingSpectra()
+        # Run times of the analysis stages, for the capture's stats
+        self.timings = StageTimings()
+        # Spectra behind the newest frame, for snapshots
+        self.last_spectra: Optional["CrossSpectra"] = None
+        self._work_arrays: Dict[Tuple[str, Tuple[int, ...], Any], np.ndarray] = {}
+        self._work_array_access_times: Dict[Tuple[str, Tuple[int, ...], Any], float] = {}
+        self._work_array_memory_sizes: Dict[Tuple[str, Tuple[int, ...], Any], int] = {}  # Track memory usage per array
+        self._cleanup_counter = 0
+        self._fft_plans: Dict[Tuple[int, str, Any], Tuple[Any, np.ndarray, np.ndarray, float]] = {}
+        self._fft_plan_cleanup_counter = 0
+
+    def delay_states(self, meas_chans: Sequence[int]) -> List["DelayState"]:
+        """Delay state for each measurement channel, primary channel first."""
+        with self._lock:
+            return [self.delay] + [self.channel_delays.setdefault(ch, _new_delay_state()) for ch in meas_chans[1:]]
+
+    def reset(self):
+        """Forget delay estimates and drop spectra, work arrays and plans."""
+        with self._lock:
+            self.delay.update(_new_delay_state())
+            self.channel_delays.clear()
+        self.last_spectra = None
+        self.clear_caches()
+
+    def clear_caches(self):
+        with self._lock:
+            self._work_arrays.clear()
+            self._work_array_access_times.clear()
+            self._work_array_memory_sizes.clear()  # Fix 2: Clear memory size tracking
+            # Clear FFT plans with proper cleanup
+            for plan_data in self._fft_plans.values():
+                if plan_data:
+                    plan, in_arr, out_arr, _ = plan_data
+                    del plan
+                    del in_arr
+                    del out_arr
+            self._fft_plans.clear()
+            self.spectra.reset()
         gc.collect()
 
-def get_fft_plan(n: int, direction: str = 'forward', dtype=np.float64):
-    """Get a cached FFT plan along with its IO arrays.
-
-    Fix 3: Enhanced with memory-aware caching and periodic cleanup.
-    Uses weak references where possible and implements proper cleanup.
-    """
-    global _fft_plan_cleanup_counter
-
-    if not _PYFFTW_AVAILABLE:
-        return (None, None, None)
+    def get_work_array(self, key: str, shape: tuple, dtype=np.float64) -> np.ndarray:
+        """Get a reusable work array with memory-aware limits and tracking.
+
+        Fix 2: Implements memory-aware caching that tracks array.nbytes and evicts
+        based on total memory usage, prioritizing largest arrays for eviction.
+        """
+        with self._lock:
+            work_arrays = self._work_arrays
+            access_times = self._work_array_access_times
+            memory_sizes = self._work_array_memory_sizes
+
+            # Include dtype in cache key to prevent type mismatches
+            cache_key = (key, shape, dtype)
+
+            # Calculate memory size for new array
+            array_nbytes = np.prod(shape) * np.dtype(dtype).itemsize
+
+            # Check if we need this array and if it would exceed memory limit
+            if cache_key not in work_arrays:
+                current_memory = sum(memory_sizes.values())
+
+                # Evict arrays if we exceed memory limit
+                while current_memory + array_nbytes > MAX_WORK_ARRAY_MEMORY and work_arrays:
+                    # Sort by memory size (largest first) and then by access time
+                    evict_candidates = sorted(
+                        memory_sizes.keys(),
+                        key=lambda k: (-memory_sizes[k], access_times.get(k, 0))
+                    )
+
+                    # Evict largest/oldest arrays until we have space
+                    for evict_key in evict_candidates:
+                        if evict_key != cache_key:  # Don't evict what we're trying to create
+                            evicted_size = memory_sizes.pop(evict_key, 0)
+                            work_arrays.pop(evict_key, None)
+                            access_times.pop(evict_key, None)
+                            current_memory -= evicted_size
+                            if current_memory + array_nbytes <= MAX_WORK_ARRAY_MEMORY:
+                                break
+
+                    # If still not enough space, clear more aggressively
+                    if current_memory + array_nbytes > MAX_WORK_ARRAY_MEMORY:
+                        # Keep only the smallest essential arrays
+                        break
 
-    direction = direction.lower()
-    if direction not in ('forward', 'inverse', 'backward'):
-        raise ValueError(f"Invalid FFT direction: {direction}")
+            if cache_key not in work_arrays:
+                work_arrays[cache_key] = np.empty(shape, dtype=dtype)
+                memory_sizes[cache_key] = array_nbytes
 
-    # Periodic cleanup
-    _fft_plan_cleanup_counter += 1
-    if _fft_plan_cleanup_counter >= FFT_CLEANUP_INTERVAL:
-        _fft_plan_cleanup_counter = 0
-        cleanup_fft_plans()
+            access_times[cache_key] = time.time()
+            return work_arrays[cache_key]
 
-    # For rfft/irfft we require real dtype input and complex output (and vice versa)
-    if direction in ('forward',):
-        if not np.issubdtype(dtype, np.floating):
-            raise TypeError(f"Forward FFT expects real input dtype, got {dtype}")
-    else:
-        # inverse/backward expects complex input and real output; we fix in_arr dtype below
-        if not np.issubdtype(dtype, np.floating):
-            raise TypeError(f"Inverse FFT expects real output dtype, got {dtype}")
+    def trim_work_arrays(self):
+        """Periodic cleanup: every CLEANUP_INTERVAL frames keep only the most
+        recently used half of the work arrays."""
+        self._cleanup_counter += 1
+        if self._cleanup_counter < CLEANUP_INTERVAL:
+            return
+        self._cleanup_counter = 0
+        with self._lock:
+            current_keys = set(self._work_arrays.keys())
+            if len(current_keys) > MAX_WORK_ARRAYS // 2:
+                # Keep only most recently used
+                recent_keys = sorted(self._work_array_access_times.keys(),
+                                     key=lambda k: self._work_array_access_times[k],
+                                     reverse=True)[:MAX_WORK_ARRAYS // 2]
+                for key in current_keys - set(recent_keys):
+                    self._work_arrays.pop(key, None)
+                    self._work_array_access_times.pop(key, None)
+                    self._work_array_memory_sizes.pop(key, None)
 
-    plan_key = (n, 'forward' if direction == 'forward' else 'inverse', dtype)
+        gc.collect(0)  # Fast generation 0 collection
 
-    if plan_key not in _fft_plans:
-        # Check memory before creating new plan
-        new_plan_memory = n * np.dtype(dtype).itemsize
-        if direction == 'forward':
-            new_plan_memory += (n // 2 + 1) * np.dtype(np.complex128).itemsize
+    def cleanup_fft_plans(self, force: bool = False):
+        """Clean up FFT plans based on memory usage and age.
+
+        Fix 3: Implements proper lifecycle management for FFT plans with
+        memory thresholds and periodic cleanup.
+        """
+        with self._lock:
+            fft_plans = self._fft_plans
+            if not fft_plans:
+                return
+
+            # Calculate total memory used by FFT plans
+            total_memory = 0
+            plan_memory = {}
+            for key, (plan, in_arr, out_arr, last_access) in fft_plans.items():
+                memory = in_arr.nbytes + out_arr.nbytes
+                plan_memory[key] = memory
+                total_memory += memory
+
+            # Clean up if over memory limit or forced
+            if force or total_memory > MAX_FFT_PLAN_MEMORY:
+                # Sort by last access time (oldest first)
+                sorted_plans = sorted(fft_plans.keys(),
+                                      key=lambda k: fft_plans[k][3])
+
+                # Remove oldest plans until under memory limit
+                while total_memory > MAX_FFT_PLAN_MEMORY * 0.75 and sorted_plans:
+                    key_to_remove = sorted_plans.pop(0)
+                    removed_memory = plan_memory.get(key_to_remove, 0)
+
+                    # Properly clean up the plan and its arrays
+                    plan_data = fft_plans.pop(key_to_remove, None)
+                    if plan_data:
+                        plan, in_arr, out_arr, _ = plan_data
+                        # PyFFTW plans hold references to arrays; break these
+                        del plan
+                        del in_arr
+                        del out_arr
+                        total_memory -= removed_memory
+
+                # Force garbage collection after cleanup
+                gc.collect()
+
+    def get_fft_plan(self, n: int, direction: str = 'forward', dtype=np.float64):
+        """Get a cached FFT plan along with its IO arrays.
+
+        Fix 3: Enhanced with memory-aware caching and periodic cleanup.
+        Uses weak references where possible and implements proper cleanup.
+        """
+        if not _PYFFTW_AVAILABLE:
+            return (None, None, None)
+
+        direction = direction.lower()
+        if direction not in ('forward', 'inverse', 'backward'):
+            raise ValueError(f"Invalid FFT direction: {direction}")
+
+        # For rfft/irfft we require real dtype input and complex output (and vice versa)
+        if direction in ('forward',):
+            if not np.issubdtype(dtype, np.floating):
+                raise TypeError(f"Forward FFT expects real input dtype, got {dtype}")
         else:
-            new_plan_memory += (n // 2 + 1) * np.dtype(np.complex128).itemsize + n * np.dtype(dtype).itemsize
-
-        # Ensure we have space
-        current_memory = sum(p[1].nbytes + p[2].nbytes for p in _fft_plans.values())
-        if current_memory + new_plan_memory > MAX_FFT_PLAN_MEMORY:
-            cleanup_fft_plans(force=True)
-
-        if len(_fft_plans) >= MAX_FFT_PLANS:
-            oldest_key = min(_fft_plans.keys(), key=lambda k: _fft_plans[k][3])
-            old_plan = _fft_plans.pop(oldest_key, None)
-            if old_plan:
-                # Properly clean up old plan
-                plan, in_arr, out_arr, _ = old_plan
-                del plan
-                del in_arr
-                del out_arr
-
-        if direction == 'forward':
-            in_arr = pyfftw.empty_aligned(n, dtype=dtype)
-            out_arr = pyfftw.empty_aligned(n // 2 + 1, dtype=np.complex128)
-            plan = pyfftw.FFTW(in_arr, out_arr, direction='FFTW_FORWARD', flags=('FFTW_MEASURE',))
-        else:
-            in_arr = pyfftw.empty_aligned(n // 2 + 1, dtype=np.complex128)
-            out_arr = pyfftw.empty_aligned(n, dtype=dtype)
-            plan = pyfftw.FFTW(in_arr, out_arr, direction='FFTW_BACKWARD', flags=('FFTW_MEASURE',))
-
-        _fft_plans[plan_key] = (plan, in_arr, out_arr, time.time())
-
-    plan, in_arr, out_arr, _ = _fft_plans[plan_key]
-    _fft_plans[plan_key] = (plan, in_arr, out_arr, time.time())
-    return plan, in_arr, out_arr
-
-def find_delay_ms(ref_chan: np.ndarray, meas_chan: np.ndarray, fs: Union[int, float], max_ms: Optional[float] = None) -> float:
+            # inverse/backward expects complex input and real output; we fix in_arr dtype below
+            if not np.issubdtype(dtype, np.floating):
+                raise TypeError(f"Inverse FFT expects real output dtype, got {dtype}")
+
+        with self._lock:
+            fft_plans = self._fft_plans
+
+            # Periodic cleanup
+            self._fft_plan_cleanup_counter += 1
+            if self._fft_plan_cleanup_counter >= FFT_CLEANUP_INTERVAL:
+                self._fft_plan_cleanup_counter = 0
+                self.cleanup_fft_plans()
+
+            plan_key = (n, 'forward' if direction == 'forward' else 'inverse', np.dtype(dtype))
+            # float32 plans run single precision end to end (complex64 spectra)
+            ctype = _complex_dtype(dtype)
+
+            if plan_key not in fft_plans:
+                # Check memory before creating new plan
+                new_plan_memory = n * np.dtype(dtype).itemsize
+                if direction == 'forward':
+                    new_plan_memory += (n // 2 + 1) * ctype.itemsize
+                else:
+                    new_plan_memory += (n // 2 + 1) * ctype.itemsize + n * np.dtype(dtype).itemsize
+
+                # Ensure we have space
+                current_memory = sum(p[1].nbytes + p[2].nbytes for p in fft_plans.values())
+                if current_memory + new_plan_memory > MAX_FFT_PLAN_MEMORY:
+                    self.cleanup_fft_plans(force=True)
+
+                if len(fft_plans) >= MAX_FFT_PLANS:
+                    oldest_key = min(fft_plans.keys(), key=lambda k: fft_plans[k][3])
+                    old_plan = fft_plans.pop(oldest_key, None)
+                    if old_plan:
+                        # Properly clean up old plan
+                        plan, in_arr, out_arr, _ = old_plan
+                        del plan
+                        del in_arr
+                        del out_arr
+
+                if direction == 'forward':
+                    in_arr = pyfftw.empty_aligned(n, dtype=dtype)
+                    out_arr = pyfftw.empty_aligned(n // 2 + 1, dtype=ctype)
+                    plan = pyfftw.FFTW(in_arr, out_arr, direction='FFTW_FORWARD', flags=('FFTW_MEASURE',))
+                else:
+                    in_arr = pyfftw.empty_aligned(n // 2 + 1, dtype=ctype)
+                    out_arr = pyfftw.empty_aligned(n, dtype=dtype)
+                    plan = pyfftw.FFTW(in_arr, out_arr, direction='FFTW_BACKWARD', flags=('FFTW_MEASURE',))
+
+                fft_plans[plan_key] = (plan, in_arr, out_arr, time.time())
+
+            plan, in_arr, out_arr, _ = fft_plans[plan_key]
+            fft_plans[plan_key] = (plan, in_arr, out_arr, time.time())
+            return plan, in_arr, out_arr
+
+def _analyzer(analyzer: Optional[Analyzer]) -> Analyzer:
+    return _default_analyzer if analyzer is None else analyzer
+
+def get_work_array(key: str, shape: tuple, dtype=np.float64, analyzer: Optional[Analyzer] = None) -> np.ndarray:
+    """``Analyzer.get_work_array`` of ``analyzer`` (default: the module's)."""
+    return _analyzer(analyzer).get_work_array(key, shape, dtype)
+
+def cleanup_fft_plans(force: bool = False, analyzer: Optional[Analyzer] = None):
+    """``Analyzer.cleanup_fft_plans`` of ``analyzer`` (default: the module's)."""
+    _analyzer(analyzer).cleanup_fft_plans(force)
+
+def get_fft_plan(n: int, direction: str = 'forward', dtype=np.float64, analyzer: Optional[Analyzer] = None):
+    """``Analyzer.get_fft_plan`` of ``analyzer`` (default: the module's)."""
+    return _analyzer(analyzer).get_fft_plan(n, direction, dtype)
+
+def _gcc_phat(x: np.ndarray, y: np.ndarray, analyzer: Optional[Analyzer] = None) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Linear (zero-padded) GCC-PHAT delay. Positive => meas lags ref by +delay.
+    Linear (zero-padded) GCC-PHAT of equal-length x, y.
+    Returns (cc, lags) over lags -(n-1)..(n-1); positive lag => y lags x.
+    Runs in the precision of ``x`` (float32 or float64), in work arrays and
+    FFT plans owned by ``analyzer``.
     """
-    x = ref_chan.astype(np.float64, copy=False)
-    y = meas_chan.astype(np.float64, copy=False)
+    an = _analyzer(analyzer)
     n = min(len(x), len(y))
-    if n < 2:
-        return 0.0
-
-    if max_ms is not None:
-        # Optional: keep FFT size from thrashing
-        n = min(n, int(1.25 * fs * max_ms / 1000.0))
+    rtype = x.dtype
+    ctype = _complex_dtype(rtype)
 
     # FFT size >= 2n-1 for linear correlation
     N = 1 << int(np.ceil(np.log2(2*n - 1)))
 
     # Use reusable FFT work arrays
     fft_size = N // 2 + 1  # rfft output size
-    X = get_work_array('fft_X', (fft_size,), dtype=np.complex128)
-    Y = get_work_array('fft_Y', (fft_size,), dtype=np.complex128)
+    X = an.get_work_array('fft_X', (fft_size,), dtype=ctype)
+    Y = an.get_work_array('fft_Y', (fft_size,), dtype=ctype)
 
     # Ensure inputs match planned length N (zero-pad or truncate)
-    xN = get_work_array('xN', (N,), dtype=x.dtype)
-    yN = get_work_array('yN', (N,), dtype=y.dtype)
-    xN.fill(0); yN.fill(0)
-    ncopy = min(len(x), N)
-    xN[:ncopy] = x[:ncopy]
-    yN[:ncopy] = y[:ncopy]
+    xN = an.get_work_array('xN', (N,), dtype=rtype)
+    yN = an.get_work_array('yN', (N,), dtype=rtype)
+    xN[:n] = x[:n]
+    yN[:n] = y[:n]
+    xN[n:] = 0
+    yN[n:] = 0
 
     # Use pyFFTW for optimal performance with preallocated arrays
     if _PYFFTW_AVAILABLE:
-        plan, in_arr, out_arr = get_fft_plan(N, 'forward', xN.dtype)
+        plan, in_arr, out_arr = an.get_fft_plan(N, 'forward', xN.dtype)
         if plan is None:
             X[:] = fftw.rfft(xN, n=N)
             Y[:] = fftw.rfft(yN, n=N)
@@ -317,11 +459,11 @@ def find_delay_ms(ref_chan: np.ndarray, meas_chan: np.ndarray, fs: Union[int, fl
     R /= (np.abs(R) + 1e-15)  # PHAT
 
     # Use work array for irfft
-    cc = get_work_array('cc', (N,), dtype=np.float64)
+    cc = an.get_work_array('cc', (N,), dtype=rtype)
 
     # Use pyFFTW for optimal performance with preallocated arrays
     if _PYFFTW_AVAILABLE:
-        plan, in_arr, out_arr = get_fft_plan(N, 'inverse', np.float64)
+        plan, in_arr, out_arr = an.get_fft_plan(N, 'inverse', rtype)
         if plan is None:
             cc[:] = fftw.irfft(R, n=N)
         else:
@@ -340,147 +482,354 @@ def find_delay_ms(ref_chan: np.ndarray, meas_chan: np.ndarray, fs: Union[int, fl
 
     # keep only the valid linear part (length 2n-1), map to lags [-(n-1) .. +(n-1)]
     # Use work array instead of np.concatenate
-    cc_lin = get_work_array('cc_lin', (2*n-1,), dtype=np.float64)
+    cc_lin = an.get_work_array('cc_lin', (2*n-1,), dtype=rtype)
     cc_lin[:n-1] = cc[-(n-1):]
     cc_lin[n-1:] = cc[:n]
     lags = np.arange(-(n-1), n, dtype=np.int64)
-
-    # optional search limit
-    if max_ms is not None:
-        max_lag = int(round(max_ms * fs / 1000.0))
-        half = min(max_lag, n-1)
-        center = n-1
-        sl = slice(center - half, center + half + 1)
-        cc_seg = cc_lin[sl]
-        lags_seg = lags[sl]
-    else:
-        cc_seg = cc_lin
-        lags_seg = lags
-
+    return cc_lin, lags
+
+def _lag_window(n: int, max_lag: Optional[int]) -> slice:
+    """Slice of a length 2n-1 correlation covering |lag| <= max_lag."""
+    if max_lag is None:
+        return slice(0, 2*n - 1)
+    half = min(max_lag, n-1)
+    center = n-1
+    return slice(center - half, center + half + 1)
+
+def _peak_lag(cc_seg: np.ndarray, lags_seg: np.ndarray) -> float:
+    """Lag of the correlation peak with sub-sample parabolic refinement."""
     k = int(np.argmax(cc_seg))
-    # sub-sample parabolic refinement
     if 0 < k < len(cc_seg) - 1:
         y0, y1, y2 = cc_seg[k-1], cc_seg[k], cc_seg[k+1]
         denom = (y0 - 2*y1 + y2)
         d = 0.0 if abs(denom) < 1e-20 else 0.5 * (y0 - y2) / denom
     else:
         d = 0.0
+    return lags_seg[k] + d
+
+def _peak_to_sidelobe(cc: np.ndarray, k: int, guard: int = 4) -> float:
+    """Peak-to-sidelobe ratio of cc[k]: its height above the mean of the
+    correlation outside +-guard samples, in units of that region's std."""
+    n = cc.size
+    a, b = max(0, k - guard), min(n, k + guard + 1)
+    m = n - (b - a)
+    if m < 2:
+        return 0.0
+    lobe = cc[a:b]
+    s1 = float(np.sum(cc)) - float(np.sum(lobe))
+    s2 = float(np.dot(cc, cc)) - float(np.dot(lobe, lobe))
+    mean = s1 / m
+    var = max(s2 / m - mean * mean, 1e-30)
+    return (float(cc[k]) - mean) / float(np.sqrt(var))
+
+# Coarse-to-fine delay search: below this many samples a single full-rate
+# GCC-PHAT is cheap enough; above it the coarse pass runs on signals
+# decimated to roughly DELAY_COARSE_RATE_HZ.
+DELAY_COARSE_MIN_SAMPLES = 16384
+DELAY_COARSE_RATE_HZ = 6000.0
+DELAY_REFINE_LEN = 8192
+
+_decimation_filters: Dict[int, np.ndarray] = {}
+
+def _decimate(x: np.ndarray, q: int) -> np.ndarray:
+    """Anti-aliased decimation by q along the last axis (cached windowed-sinc
+    FIR, polyphase so only kept samples are filtered)."""
+    h = _decimation_filters.get(q)
+    if h is None:
+        h = firwin(10 * q + 1, 0.8 / q, window=("kaiser", 7.0))
+        _decimation_filters[q] = h
+    return upfirdn(h.astype(x.dtype, copy=False), x, down=q, axis=-1)
+
+def _refine_delay(
+    x: np.ndarray, y: np.ndarray, n: int, lag_c: int, half: int, analyzer: Optional[Analyzer] = None,
+) -> Tuple[float, float]:
+    """
+    Short full-rate GCC-PHAT on segments pre-aligned by ``lag_c``; the peak is
+    searched within +-half samples of it. Returns (lag_samples, confidence).
+    """
+    span = n - abs(lag_c)
+    if span < 2:
+        return float(lag_c), 0.0
+    L = min(DELAY_REFINE_LEN, span)
+    s = max(0, -lag_c) + (span - L) // 2
+    cc, lags = _gcc_phat(x[s:s + L], y[s + lag_c:s + lag_c + L], analyzer)
+    sl = _lag_window(L, half)
+    k = sl.start + int(np.argmax(cc[sl]))
+    return float(lag_c + _peak_lag(cc[sl], lags[sl])), _peak_to_sidelobe(cc, k)
+
+def find_delay(
+    ref_chan: np.ndarray,
+    meas_chan: np.ndarray,
+    fs: Union[int, float],
+    max_ms: Optional[float] = None,
+    analyzer: Optional[Analyzer] = None,
+) -> Tuple[float, float]:
+    """
+    Linear (zero-padded) GCC-PHAT delay. Positive => meas lags ref by +delay.
+    Returns (delay_ms, confidence), confidence being the peak-to-sidelobe
+    ratio of the full-rate correlation peak.
+
+    Long searches run coarse-to-fine: the peak is located on band-limited,
+    decimated copies, then refined with a short full-rate GCC-PHAT over a
+    few coarse samples around it. float32 input runs the search in single
+    precision; anything else is analyzed as float64.
+    """
+    x = _as_float(ref_chan)
+    y = meas_chan.astype(x.dtype, copy=False)
+    n = min(len(x), len(y))
+    if n < 2:
+        return 0.0, 0.0
+
+    max_lag = None
+    if max_ms is not None:
+        # Optional: keep FFT size from thrashing
+        n = min(n, int(1.25 * fs * max_ms / 1000.0))
+        max_lag = int(round(max_ms * fs / 1000.0))
+
+    q = int(fs // DELAY_COARSE_RATE_HZ)
+    if n < DELAY_COARSE_MIN_SAMPLES or q < 2:
+        cc, lags = _gcc_phat(x[:n], y[:n], analyzer)
+        sl = _lag_window(n, max_lag)
+        k = sl.start + int(np.argmax(cc[sl]))
+        return float(_peak_lag(cc[sl], lags[sl]) / fs) * 1000.0, _peak_to_sidelobe(cc, k)
+
+    # Coarse: locate the peak to within a few decimated samples
+    xyd = _decimate(np.stack((x[:n], y[:n])), q)
+    cc, lags = _gcc_phat(xyd[0], xyd[1], analyzer)
+    sl = _lag_window(xyd.shape[1], None if max_lag is None else -(-max_lag // q))
+    lag_c = int(lags[sl][int(np.argmax(cc[sl]))]) * q
 
-    lag_samples = lags_seg[k] + d
-    return (lag_samples / fs) * 1000.0
+    # Fine: short full-rate pass on segments pre-aligned by the coarse lag
+    lag_samples, confidence = _refine_delay(x, y, n, lag_c, 2 * q, analyzer)
+    return (lag_samples / fs) * 1000.0, confidence
+
+def find_delay_ms(ref_chan: np.ndarray, meas_chan: np.ndarray, fs: Union[int, float], max_ms: Optional[float] = None) -> float:
+    """
+    Linear (zero-padded) GCC-PHAT delay. Positive => meas lags ref by +delay.
+    """
+    return find_delay(ref_chan, meas_chan, fs, max_ms)[0]
+
+def track_delay(
+    ref_chan: np.ndarray,
+    meas_chan: np.ndarray,
+    fs: Union[int, float],
+    center_ms: float,
+    window_ms: float,
+    max_ms: Optional[float] = None,
+    analyzer: Optional[Analyzer] = None,
+) -> Tuple[float, float]:
+    """
+    Re-measure a known delay: evaluate the correlation only within
+    +-window_ms of center_ms. Returns (delay_ms, confidence) like find_delay.
+    """
+    x = _as_float(ref_chan)
+    y = meas_chan.astype(x.dtype, copy=False)
+    n = min(len(x), len(y))
+    if max_ms is not None:
+        n = min(n, int(1.25 * fs * max_ms / 1000.0))
+    lag_c = int(round(center_ms * fs / 1000.0))
+    half = max(1, int(round(window_ms * fs / 1000.0)))
+    lag_samples, confidence = _refine_delay(x, y, n, lag_c, half, analyzer)
+    return (lag_samples / fs) * 1000.0, confidence
 
 # ---- Delay state ----
+# Auto mode locks into "tracking" once the correlation peak stands this far
+# above its sidelobes, and falls back to full acquisition below UNLOCK.
+DELAY_LOCK_CONFIDENCE = 12.0
+DELAY_UNLOCK_CONFIDENCE = 6.0
+DELAY_TRACK_WINDOW_MS = 2.0
+
 class DelayState(TypedDict):
-    mode: str  # "auto" | "frozen" | "manual"
+    mode: str  # "auto" | "tracking" | "frozen" | "manual"
     ema_ms: Optional[float]  # smoothed auto delay
     frozen_ms: float  # value latched when freezing
     manual_ms: float  # operator-set delay
     alpha: float  # EMA factor
     last_raw_ms: Optional[float]  # optional: for UI visibility
+    confidence: Optional[float]  # peak-to-sidelobe ratio of the last estimate
 
-_delay: DelayState = {
-    "mode": "auto",         # "auto" | "frozen" | "manual"
-    "ema_ms": None,         # smoothed auto delay
-    "frozen_ms": 0.0,       # value latched when freezing
-    "manual_ms": 0.0,       # operator-set delay
-    "alpha": 0.9,           # EMA factor
-    "last_raw_ms": None,    # optional: for UI visibility
-}
-
-def reset_dsp_state():
-    _delay.update({"mode":"auto","ema_ms":None,"frozen_ms":0.0,"manual_ms":0.0,"last_raw_ms":None})
+def _new_delay_state() -> DelayState:
+    return {
+        "mode": "auto",         # "auto" | "tracking" | "frozen" | "manual"
+        "ema_ms": None,         # smoothed auto delay
+        "frozen_ms": 0.0,       # value latched when freezing
+        "manual_ms": 0.0,       # operator-set delay
+        "alpha": 0.9,           # EMA factor
+        "last_raw_ms": None,    # optional: for UI visibility
+        "confidence": None,     # peak-to-sidelobe ratio of the last estimate
+    }
+
+def delay_states(meas_chans: Sequence[int], analyzer: Optional[Analyzer] = None) -> List[DelayState]:
+    """Delay state for each measurement channel, primary channel first."""
+    return _analyzer(analyzer).delay_states(meas_chans)
+
+def reset_dsp_state(analyzer: Optional[Analyzer] = None):
+    """Reset ``analyzer``'s delay tracking and caches; without one, the
+    module default's, and the shared caches go too."""
+    if analyzer is not None:
+        analyzer.reset()
+        return
+    _default_analyzer.reset()
     # Clear caches when resetting state
     clear_dsp_caches()
 
-def delay_freeze(enable: bool, applied_ms: Optional[float] = None):
+def _freeze_state(state: DelayState, enable: bool, applied_ms: Optional[float]):
     if enable:
         # Prefer explicit value, else the last applied auto/manual value.
         if applied_ms is not None:
             ms = float(applied_ms)
-        elif _delay["mode"] == "manual":
-            ms = float(_delay["manual_ms"])
-        elif _delay["ema_ms"] is not None:
-            ms = _delay["ema_ms"]
+        elif state["mode"] == "manual":
+            ms = float(state["manual_ms"])
+        elif state["ema_ms"] is not None:
+            ms = state["ema_ms"]
         else:
             # no estimate yet; stay in auto until we have one
-            _delay["mode"] = "auto"
+            state["mode"] = "auto"
             return
-        _delay["frozen_ms"] = ms
-        _delay["ema_ms"] = ms    # keep everything consistent
-        _delay["mode"] = "frozen"
+        state["frozen_ms"] = ms
+        state["ema_ms"] = ms    # keep everything consistent
+        state["mode"] = "frozen"
     else:
-        _delay["mode"] = "auto"
-
-def delay_set_manual(ms: Optional[float]):
-    if ms is None:
-        _delay["mode"] = "auto"
+        state["mode"] = "auto"
+
+def delay_freeze(enable: bool, applied_ms: Optional[float] = None, analyzer: Optional[Analyzer] = None):
+    """Freeze (or release) the delay of every measurement channel."""
+    an = _analyzer(analyzer)
+    with an._lock:
+        for state in (an.delay, *an.channel_delays.values()):
+            _freeze_state(state, enable, applied_ms)
+
+def delay_set_manual(ms: Optional[float], analyzer: Optional[Analyzer] = None):
+    an = _analyzer(analyzer)
+    with an._lock:
+        for state in (an.delay, *an.channel_delays.values()):
+            if ms is None:
+                state["mode"] = "auto"
+            else:
+                state["manual_ms"] = ms
+                state["mode"] = "manual"
+
+def update_delay_estimate(
+    x: np.ndarray,
+    y: np.ndarray,
+    fs: float,
+    max_ms: float,
+    state: Optional[DelayState] = None,
+    analyzer: Optional[Analyzer] = None,
+) -> Optional[float]:
+    """
+    Run one delay estimate and fold it into the delay state.
+    Returns the raw measured ms, or None when frozen/manual (nothing to do)
+    or when a freeze or manual set arrived while the search ran.
+    Auto runs a full-range search until the peak is confident, then tracks
+    it within a narrow window until confidence drops.
+    ``state`` defaults to the primary channel's of ``analyzer``.
+    """
+    an = _analyzer(analyzer)
+    st = an.delay if state is None else state
+    with an._lock:
+        mode, ema = st["mode"], st["ema_ms"]
+    if mode not in ("auto", "tracking"):
+        return None
+    # The search runs unlocked; freeze/manual may change the state meanwhile
+    if mode == "tracking" and ema is not None:
+        raw, conf = track_delay(x, y, fs, ema, DELAY_TRACK_WINDOW_MS, max_ms=max_ms, analyzer=analyzer)
     else:
-        _delay["manual_ms"] = ms
-        _delay["mode"] = "manual"
+        raw, conf = find_delay(x, y, fs, max_ms=max_ms, analyzer=analyzer)
+    with an._lock:
+        if st["mode"] != mode or st["ema_ms"] != ema:
+            return None  # superseded by the operator; drop this estimate
+        st["last_raw_ms"] = raw
+        st["confidence"] = conf
+        if mode == "tracking" and conf < DELAY_UNLOCK_CONFIDENCE:
+            # lost lock: keep the last good value, re-acquire next time
+            st["mode"] = "auto"
+            return raw
+        if mode == "auto" and conf >= DELAY_LOCK_CONFIDENCE:
+            st["mode"] = "tracking"
+            if ema is not None and abs(raw - ema) > DELAY_TRACK_WINDOW_MS:
+                ema = None  # locked onto a new path; don't track around the stale EMA
+        alpha = st["alpha"]
+        ema = raw if ema is None else alpha * ema + (1.0 - alpha) * raw
+        st["ema_ms"] = ema
+    return raw
+
+def update_delay_estimates(
+    x: np.ndarray,
+    ys: np.ndarray,
+    fs: float,
+    max_ms: float,
+    meas_chans: Sequence[int],
+    analyzer: Optional[Analyzer] = None,
+) -> List[Optional[float]]:
+    """``update_delay_estimate`` for each row of ``ys`` against the same reference."""
+    with _analyzer(analyzer).timings.time("delay"):
+        return [
+            update_delay_estimate(x, y, fs, max_ms, state, analyzer)
+            for y, state in zip(ys, delay_states(meas_chans, analyzer))
+        ]
+
+def delay_applied_ms(state: Optional[DelayState] = None, analyzer: Optional[Analyzer] = None) -> float:
+    """The delay analysis should use right now."""
+    st = _analyzer(analyzer).delay if state is None else state
+    mode = st["mode"]
+    if mode in ("auto", "tracking"):
+        return st["ema_ms"] or 0.0
+    elif mode == "frozen":
+        return st["frozen_ms"]
+    else:  # "manual"
+        return st["manual_ms"]
 
-def _delay_pick_applied(x: np.ndarray, y: np.ndarray, fs: float, max_ms: float) -> Tuple[float, Optional[float]]:
+def _delay_pick_applied(
+    x: np.ndarray, y: np.ndarray, fs: float, max_ms: float, state: Optional[DelayState] = None,
+    analyzer: Optional[Analyzer] = None,
+) -> Tuple[float, Optional[float]]:
     """
     Returns (applied_delay_ms, raw_measured_ms_or_None).
     Skips GCC-PHAT when frozen/manual to save CPU and to keep the value fixed.
     """
-    mode = _delay["mode"]
-    if mode == "auto":
-        raw = find_delay_ms(x, y, fs, max_ms=max_ms)
-        _delay["last_raw_ms"] = raw
-        ema = _delay["ema_ms"]
-        alpha = _delay["alpha"]
-        ema = raw if ema is None else alpha * ema + (1.0 - alpha) * raw
-        _delay["ema_ms"] = ema
-        return ema, raw
-    elif mode == "frozen":
-        raw = None  # not updated
-        return _delay["frozen_ms"], raw
-    else:  # "manual"
-        raw = None
-        return _delay["manual_ms"], raw
+    raw = update_delay_estimate(x, y, fs, max_ms, state, analyzer)
+    return delay_applied_ms(state, analyzer), raw
 
-def delay_status() -> dict:
+def delay_status(state: Optional[DelayState] = None, analyzer: Optional[Analyzer] = None) -> dict:
+    st = _analyzer(analyzer).delay if state is None else state
     return {
-        "mode": _delay["mode"],
-        "applied_ms": (
-            _delay["ema_ms"] if _delay["mode"]=="auto" else
-            _delay["frozen_ms"] if _delay["mode"]=="frozen" else
-            _delay["manual_ms"]
-        ) or 0.0,
-        "raw_ms": _delay["last_raw_ms"],
+        "mode": st["mode"],
+        "applied_ms": delay_applied_ms(st),
+        "raw_ms": st["last_raw_ms"],
+        "confidence": st["confidence"],
     }
 
-def _align_by_integer_delay_pad(x: np.ndarray, y: np.ndarray, delay_ms: float, fs: float):
+# ---- Signal gate ----
+def signal_gate(
+    block: np.ndarray,
+    ref_col: int,
+    meas_cols: Sequence[int],
+    min_dbfs: float,
+    max_crest_db: float,
+) -> Tuple[Optional[str], float, float]:
     """
-    Shift y by integer samples with zero-padding so x,y keep the SAME length.
-    Positive delay => y lags => shift y LEFT by D_int.
-    Returns: y_shifted, frac_samples, D_int, usable_len
+    Cheap per-block presence check on the reference and measurement columns.
+    Returns (reason, ref_dbfs, meas_dbfs), meas being the loudest meas channel;
+    reason is None when the block is worth analyzing, else "invalid"
+    (non-finite samples), "silent" (RMS below ``min_dbfs``) or "crest"
+    (peak/RMS above ``max_crest_db``: clicks, dropouts, glitches).
     """
-    D = delay_ms * fs / 1000.0
-    D_int = int(np.round(D))          # integer samples
-    frac = D - D_int                  # fractional remainder (in samples)
-
-    # Use work array instead of np.zeros_like
-    y_shift = get_work_array('y_shift', y.shape, dtype=y.dtype)
-    y_shift.fill(0)  # Fill with zeros (more efficient than np.copyto)
-    N = y.size
-
-    if D_int > 0:
-        # y late: advance y (shift left)
-        if D_int < N:
-            y_shift[:N - D_int] = y[D_int:]
-        # else: all zeros; no overlap
-    elif D_int < 0:
-        # y early: delay y (shift right)
-        s = -D_int
-        if s < N:
-            y_shift[s:] = y[:N - s]
-        # else: all zeros; no overlap
-    else:
-        y_shift[:] = y
-
-    usable_len = max(0, N - abs(D_int))
-    return y_shift, frac, D_int, usable_len
+    cols = [ref_col, *meas_cols]
+    sub = block[:, cols]
+    ms = np.mean(np.square(sub, dtype=np.float64), axis=0)
+    peak = np.max(np.abs(sub), axis=0).astype(np.float64)
+    if not np.all(np.isfinite(ms)):
+        return "invalid", float("nan"), float("nan")
+    level_db = 10.0 * np.log10(np.maximum(ms, 1e-20))
+    m = 1 + int(np.argmax(ms[1:]))
+    ref_db, meas_db = float(level_db[0]), float(level_db[m])
+    if ref_db < min_dbfs or meas_db < min_dbfs:
+        return "silent", ref_db, meas_db
+    crest_db = 20.0 * np.log10(peak[[0, m]] / np.sqrt(ms[[0, m]]))
+    if np.any(crest_db > max_crest_db):
+        return "crest", ref_db, meas_db
+    return None, ref_db, meas_db
 
 MIN_SAMPLES_FOR_ANALYSIS = 64  # bump if you want smoother plots
 
@@ -496,6 +845,264 @@ def _choose_nperseg_with_min_segments(usable_len: int, target_n: int, min_segmen
         n //= 2
     return 32, 24  # very small fallback
 
+def _segment_spectra(segs: np.ndarray, window: np.ndarray, nperseg: int) -> np.ndarray:
+    """Detrend ('constant'), window and rFFT segments along the last axis in one call."""
+    segs = segs - segs.mean(axis=-1, keepdims=True)
+    segs *= window
+    return fftw.rfft(segs, n=nperseg, axis=-1)
+
+def _density_spectra(
+    Sxx: np.ndarray,
+    Syy: np.ndarray,
+    Sxy: np.ndarray,
+    count: int,
+    window: np.ndarray,
+    fs: float,
+    nperseg: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Turn summed |X|^2, |Y|^2, conj(X)Y over ``count`` segments into
+    onesided PSD/CSD with scipy's ``scaling='density'``. Frequency runs along
+    the last axis, so per-channel ``(C, bins)`` sums scale the same way."""
+    scale = 1.0 / (fs * float(np.sum(window * window, dtype=np.float64)) * count)
+    Pxx = Sxx * scale
+    Pyy = Syy * scale
+    Pxy = Sxy * scale
+    # onesided: fold negative frequencies (not DC / Nyquist)
+    sl = slice(1, -1) if nperseg % 2 == 0 else slice(1, None)
+    Pxx[..., sl] *= 2
+    Pyy[..., sl] *= 2
+    Pxy[..., sl] *= 2
+    return Pxx, Pyy, Pxy
+
+def cross_spectra(
+    x: np.ndarray,
+    y: np.ndarray,
+    fs: float,
+    window: np.ndarray,
+    nperseg: int,
+    noverlap: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Joint Welch estimate of (freqs, Pxx, Pyy, Pxy) in a single pass.
+
+    Equivalent to ``welch(x)``, ``welch(y)`` and ``csd(x, y)`` with
+    ``detrend='constant'`` and density scaling, but both channels are
+    segmented together and transformed with one batched 2-D rFFT.
+    ``y`` may be ``(C, n)`` to measure several channels against ``x``; the
+    reference is transformed once and Pyy/Pxy come back as ``(C, bins)``.
+    float32 input (with a float32 window) is transformed in single precision;
+    the averages are always accumulated in float64.
+    """
+    ys = np.atleast_2d(y)
+    n = min(x.size, ys.shape[-1])
+    hop = nperseg - noverlap
+    nseg = 1 + (n - nperseg) // hop
+    freqs = np.fft.rfftfreq(nperseg, d=1.0 / fs)
+    if nseg < 1:
+        shape = ys.shape[:-1] + freqs.shape if y.ndim > 1 else freqs.shape
+        return freqs, np.zeros(freqs.size), np.zeros(shape), np.zeros(shape, dtype=np.complex128)
+
+    view = np.lib.stride_tricks.sliding_window_view
+    segs = np.empty((1 + ys.shape[0], nseg, nperseg), dtype=np.result_type(x, ys, np.float32))
+    segs[0] = view(x[:n], nperseg)[::hop][:nseg]
+    segs[1:] = view(ys[:, :n], nperseg, axis=-1)[:, ::hop][:, :nseg]
+    XY = _segment_spectra(segs, window, nperseg)
+    X, Y = XY[0], XY[1:]
+
+    Sxx = np.sum(X.real**2 + X.imag**2, axis=0, dtype=np.float64)
+    Syy = np.sum(Y.real**2 + Y.imag**2, axis=1, dtype=np.float64)
+    Sxy = np.sum(np.conj(X) * Y, axis=1, dtype=np.complex128)
+    Pxx, Pyy, Pxy = _density_spectra(Sxx, Syy, Sxy, nseg, window, fs, nperseg)
+    if y.ndim == 1:
+        Pyy, Pxy = Pyy[0], Pxy[0]
+    return freqs, Pxx, Pyy, Pxy
+
+# Empty ring slot. Starts can be negative: until a capture has run for a
+# window, the window reaches back into the zeros before the stream start.
+_EMPTY_SLOT = np.iinfo(np.int64).min
+
+class StreamingSpectra:
+    """Running Welch/CSD averages over the sliding analysis window.
+
+    Segments sit on an absolute sample grid (starts are multiples of the hop),
+    so consecutive calls share every segment except the ones the latest hop
+    completed. Per-segment spectra live in a fixed-size ring; only new segments
+    are detrended, windowed and FFT'd, and the running sums are updated by
+    adding the new segments and subtracting the evicted ones.
+
+    Several measurement channels can share one reference: the ring holds one
+    ref spectrum per segment and a ``(C, bins)`` block of meas spectra, and
+    each update transforms ref and all meas segments in one batched rFFT.
+    The ring stores spectra in the input's precision (complex64 for float32
+    input); the running sums are float64 so long averages don't drift.
+
+    ``advance`` folds new segments in without forming densities, so hops
+    between frames can be absorbed ahead of the next ``update``.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._key = None          # (nperseg, hop, D_ints, fs, dtype) the ring was built for
+        self._X = None            # (slots, bins) ref spectra
+        self._Y = None            # (slots, C, bins) meas spectra
+        self._starts = None       # absolute start sample per slot, _EMPTY_SLOT = empty
+        self._Sxx = None
+        self._Syy = None
+        self._Sxy = None
+        self._count = 0
+        self._newest = None       # absolute start of newest stored segment
+        self._adds_since_resum = 0
+        self.last_new_segments = 0
+
+    def _rebuild(self, key, slots: int, chans: int, bins: int, dtype=np.float64):
+        self._key = key
+        ctype = _complex_dtype(dtype)
+        self._X = np.zeros((slots, bins), dtype=ctype)
+        self._Y = np.zeros((slots, chans, bins), dtype=ctype)
+        self._starts = np.full(slots, _EMPTY_SLOT, dtype=np.int64)
+        self._Sxx = np.zeros(bins, dtype=np.float64)
+        self._Syy = np.zeros((chans, bins), dtype=np.float64)
+        self._Sxy = np.zeros((chans, bins), dtype=np.complex128)
+        self._count = 0
+        self._newest = None
+        self._adds_since_resum = 0
+
+    def _resum(self):
+        used = self._starts != _EMPTY_SLOT
+        X = self._X[used]
+        Y = self._Y[used]
+        self._Sxx[:] = np.sum(X.real**2 + X.imag**2, axis=0, dtype=np.float64)
+        self._Syy[:] = np.sum(Y.real**2 + Y.imag**2, axis=0, dtype=np.float64)
+        self._Sxy[:] = np.sum(np.conj(X)[:, np.newaxis] * Y, axis=0, dtype=np.complex128)
+        self._adds_since_resum = 0
+
+    def _remove(self, i: int):
+        X, Y = self._X[i], self._Y[i]
+        self._Sxx -= X.real**2 + X.imag**2
+        self._Syy -= Y.real**2 + Y.imag**2
+        self._Sxy -= np.conj(X) * Y
+        self._starts[i] = _EMPTY_SLOT
+        self._count -= 1
+
+    def advance(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        stream_pos: int,
+        fs: float,
+        nperseg: int,
+        noverlap: int,
+        D_int: Union[int, Sequence[int]],
+        window_len: Optional[int] = None,
+    ) -> bool:
+        """Fold the segments completed up to ``stream_pos`` into the ring.
+
+        ``x``/``y`` hold the newest ``len(x)`` samples, ending at absolute sample
+        ``stream_pos``; the analysis window is the newest ``window_len`` samples
+        (default ``len(x)``), so callers between frames can pass just the tail
+        holding the new segments. Returns False, leaving the ring untouched,
+        when no full segment overlaps or the tail doesn't reach back to the
+        first segment still missing.
+        """
+        dtype = _as_float(x).dtype
+        ys = np.atleast_2d(y)
+        D = np.atleast_1d(np.asarray(D_int, dtype=np.int64))
+        C = ys.shape[0]
+        N = x.size
+        hop = nperseg - noverlap
+        buf_start = stream_pos - N
+        win_start = stream_pos - (N if window_len is None else int(window_len))
+        lo = win_start + max(0, -int(D.min()))
+        hi = stream_pos - nperseg - max(0, int(D.max()))
+        first = -(-lo // hop) * hop
+        last = (hi // hop) * hop
+        if last < first:
+            self.last_new_segments = 0
+            return False
+
+        n_segs = (last - first) // hop + 1
+        bins = nperseg // 2 + 1
+        key = (nperseg, hop, tuple(D.tolist()), fs, dtype)
+        rebuild = (key != self._key or self._starts.size < n_segs
+                   or (self._newest is not None and self._newest > last))
+
+        # Segments completed since the previous call
+        start_new = first if rebuild or self._newest is None else max(first, self._newest + hop)
+        if start_new <= last and start_new < buf_start + max(0, -int(D.min())):
+            self.last_new_segments = 0
+            return False
+        if rebuild:
+            self._rebuild(key, n_segs + 1, C, bins, dtype)
+
+        # Evict segments that slid out of the window
+        slots = self._starts.size
+        for i in np.flatnonzero((self._starts != _EMPTY_SLOT) & (self._starts < first)):
+            self._remove(i)
+
+        new_starts = np.arange(start_new, last + 1, hop, dtype=np.int64)
+        self.last_new_segments = new_starts.size
+        if new_starts.size:
+            win = get_window("hann", nperseg, dtype)
+            offs = new_starts - buf_start
+            view = np.lib.stride_tricks.sliding_window_view
+            segs = np.empty((1 + C, new_starts.size, nperseg), dtype=dtype)
+            segs[0] = view(x, nperseg)[offs]
+            segs[1:] = view(ys, nperseg, axis=-1)[np.arange(C)[:, np.newaxis], offs + D[:, np.newaxis]]
+            XY = _segment_spectra(segs, win, nperseg)
+            Xn, Yn = XY[0], XY[1:].transpose(1, 0, 2)
+
+            for j, s in enumerate(new_starts):
+                i = int((s // hop) % slots)
+                if self._starts[i] != _EMPTY_SLOT:
+                    self._remove(i)
+                self._X[i] = Xn[j]
+                self._Y[i] = Yn[j]
+                self._starts[i] = s
+                self._Sxx += Xn[j].real**2 + Xn[j].imag**2
+                self._Syy += Yn[j].real**2 + Yn[j].imag**2
+                self._Sxy += np.conj(Xn[j]) * Yn[j]
+                self._count += 1
+            self._newest = int(new_starts[-1])
+            self._adds_since_resum += new_starts.size
+            # Re-derive the sums once per ring turnover so add/subtract
+            # rounding never accumulates
+            if self._adds_since_resum >= slots:
+                self._resum()
+        return True
+
+    def update(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        stream_pos: int,
+        fs: float,
+        nperseg: int,
+        noverlap: int,
+        D_int: Union[int, Sequence[int]],
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Advance to ``stream_pos`` and return (freqs, Pxx, Pyy, Pxy).
+
+        ``x``/``y`` hold the newest ``len(x)`` samples, ending at absolute sample
+        ``stream_pos``. Ref segment ``s`` pairs with meas segment ``s + D_int``.
+        ``y`` may be ``(C, N)`` with one ``D_int`` per channel; Pyy/Pxy then
+        come back as ``(C, bins)``, computed over the segments every channel
+        fully overlaps. Scaling matches scipy's ``csd``/``welch`` (density,
+        onesided, 'constant' detrend). Segments are transformed in the
+        precision of ``x``. Returns None when no full segment overlaps.
+        """
+        if not self.advance(x, y, stream_pos, fs, nperseg, noverlap, D_int) or self._count == 0:
+            return None
+
+        win = get_window("hann", nperseg, _as_float(x).dtype)
+        Pxx, Pyy, Pxy = _density_spectra(
+            self._Sxx, self._Syy, self._Sxy, self._count, win, fs, nperseg,
+        )
+        if y.ndim == 1:
+            Pyy, Pxy = Pyy[0], Pxy[0]
+        freqs = np.fft.rfftfreq(nperseg, d=1.0 / fs)
+        return freqs, Pxx, Pyy, Pxy
+
 def _log_band_edges(freqs: np.ndarray, frac: int = 6) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """For each bin i, return [i0[i], i1[i]) index edges spanning ±(1/2*1/frac) octaves."""
     f = freqs.copy()
@@ -578,16 +1185,107 @@ class MemoryAwareLRUCache:
         return wrapper
 
 # Create memory-aware cache instances
-_hann_cache_instance = MemoryAwareLRUCache(max_memory_mb=5, max_items=32)
 _taper_cache_instance = MemoryAwareLRUCache(max_memory_mb=5, max_items=16)
 
-@_hann_cache_instance
-def _hann_cached(M: int) -> np.ndarray:
-    """Cached Hann window generation with memory-aware eviction."""
-    if M <= 1:
-        return np.ones(max(M,1))
-    n = np.arange(M)
-    return 0.5 - 0.5*np.cos(2*np.pi*n/(M-1))
+# Sparse 1/frac-octave smoothing operators keyed by (bins, fs, frac, min_bins)
+_smoothing_ops: OrderedDict[Tuple[int, float, int, int], Any] = OrderedDict()
+_MAX_SMOOTHING_OPS = 4
+# Operators above this many weights (~12 bytes each) are not materialized
+# (1/6 oct at nfft=65536 would be ~62M); see _smooth_sums_banded.
+MAX_SMOOTHING_NNZ = 8_000_000
+# Rows per banded block of _smooth_sums_banded
+_SMOOTHING_BLOCK_ROWS = 32
+
+def _smoothing_windows(freqs: np.ndarray, frac: int, min_bins: int):
+    """Per-row [a, b) window in the positive-bin index space, plus the map
+    back to real bin indices."""
+    I0, I1, valid = _log_band_edges(freqs, frac=frac)
+    fpos_idx = np.flatnonzero(valid)
+    L = fpos_idx.size
+    a = I0[fpos_idx].astype(np.int64)
+    b = I1[fpos_idx].astype(np.int64)
+    # guardrail at very small windows
+    small = (b - a) < min_bins
+    k = np.arange(L, dtype=np.int64)
+    a[small] = np.maximum(0, k[small] - min_bins // 2)
+    b[small] = np.minimum(L, a[small] + min_bins)
+    return fpos_idx, a, b
+
+def _smoothing_operator(freqs: np.ndarray, frac: int, min_bins: int):
+    """CSR matrix whose row i holds the Hann band weights for output bin i."""
+    fpos_idx, a, b = _smoothing_windows(freqs, frac, min_bins)
+    n = freqs.size
+    rows = fpos_idx
+    M = b - a
+
+    nnz = int(M.sum())
+    row_of = np.repeat(np.arange(rows.size), M)
+    offs = np.concatenate(([0], np.cumsum(M)[:-1])) if rows.size else np.zeros(0, dtype=np.int64)
+    t = np.arange(nnz, dtype=np.int64) - np.repeat(offs, M)
+    Mr = M[row_of]
+    cols = fpos_idx[a[row_of] + t]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(Mr > 1, 0.5 - 0.5 * np.cos(2 * np.pi * t / (Mr - 1)), 1.0)
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[rows + 1] = M
+    np.cumsum(indptr, out=indptr)
+    return csr_matrix((w, cols.astype(np.int32), indptr), shape=(n, n))
+
+def _smoothing_nnz(freqs: np.ndarray, frac: int, min_bins: int) -> int:
+    _, a, b = _smoothing_windows(freqs, frac, min_bins)
+    return int(np.sum(b - a))
+
+def _smooth_sums_banded(freqs: np.ndarray, V: np.ndarray, frac: int, min_bins: int) -> np.ndarray:
+    """Same result as ``_smoothing_operator(...) @ V`` without building it.
+
+    Consecutive rows with the same window length M apply the same Hann
+    kernel at shifted offsets, so a block of up to ``_SMOOTHING_BLOCK_ROWS``
+    of them is one dense (rows, span) banded matrix times the ``span`` input
+    bins it covers. That does the operator's nnz multiply-adds as a few
+    thousand small matrix products; only one block's band is in memory at
+    a time.
+    """
+    fpos_idx, a, b = _smoothing_windows(freqs, frac, min_bins)
+    M = b - a
+    Vp = V[fpos_idx]
+    out = np.empty_like(Vp)
+    # a block ends where M changes or a row's window no longer overlaps the previous one
+    breaks = np.flatnonzero((M[1:] != M[:-1]) | (a[1:] - a[:-1] >= M[1:])) + 1
+    starts = np.concatenate(([0], breaks)).tolist()
+    ends = np.concatenate((breaks, [M.size])).tolist()
+    for run_start, run_end in zip(starts, ends):
+        m = int(M[run_start])
+        w = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(m) / (m - 1)) if m > 1 else np.ones(1)
+        for s in range(run_start, run_end, _SMOOTHING_BLOCK_ROWS):
+            e = min(run_end, s + _SMOOTHING_BLOCK_ROWS)
+            lo = int(a[s])
+            r = a[s:e] - lo
+            span = int(r[-1]) + m
+            pad = span - m
+            wz = np.zeros(2 * pad + m)
+            wz[pad:pad + m] = w
+            # row k is the kernel shifted to start at r[k]
+            band = np.lib.stride_tricks.sliding_window_view(wz, span)[pad - r]
+            out[s:e] = band @ Vp[lo:lo + span]
+    full = np.zeros_like(V)
+    full[fpos_idx] = out
+    return full
+
+@_with_cache_lock
+def _get_smoothing_operator(freqs: np.ndarray, frac: int, min_bins: int):
+    """Cached full smoothing operator, or None when it is too large to keep."""
+    key = (int(freqs.size), float(freqs[-1]) if freqs.size else 0.0, int(frac), int(min_bins))
+    op = _smoothing_ops.get(key)
+    if op is None:
+        if _smoothing_nnz(freqs, frac, min_bins) > MAX_SMOOTHING_NNZ:
+            return None
+        op = _smoothing_operator(freqs, frac, min_bins)
+        _smoothing_ops[key] = op
+        if len(_smoothing_ops) > _MAX_SMOOTHING_OPS:
+            _smoothing_ops.popitem(last=False)
+    _smoothing_ops.move_to_end(key, last=True)
+    return op
 
 def smooth_constQ_tf_and_coh(
     freqs: np.ndarray,
@@ -602,47 +1300,77 @@ def smooth_constQ_tf_and_coh(
     """
     1/frac-octave smoothing on log-f for TF and coherence.
     Returns (Hs, coh_s) where Hs is complex and coh_s is real in [0,1].
+
+    Each output bin is a Hann-weighted (optionally coherence-weighted) mean of
+    the spectra in its band, applied as sparse mat-vecs with a cached operator.
+    ``Pyy``/``Pxy`` may be ``(C, bins)`` against a shared ``Pxx``; all channels
+    then go through the operator as one multi-column product and Hs/coh_s
+    come back as ``(C, bins)``.
     """
-    I0, I1, valid = _log_band_edges(freqs, frac=frac)
+    valid = freqs > 0
+    Pyy2 = np.atleast_2d(Pyy)
+    Pxy2 = np.atleast_2d(Pxy)
+    C, n = Pxy2.shape
 
     # raw coherence (unsmoothed) -> optional weights
-    coh0 = (np.abs(Pxy)**2) / (np.maximum(Pxx, eps)*np.maximum(Pyy, eps) + eps)
+    coh0 = (np.abs(Pxy2)**2) / (np.maximum(Pxx, eps)*np.maximum(Pyy2, eps) + eps)
     coh0 = np.clip(coh0, 0.0, 1.0)
+    c = coh0 ** coh_weight_pow if coh_weight_pow > 0 else np.ones_like(coh0)
 
-    Hs = np.zeros_like(Pxy, dtype=np.complex128)
-    coh_s = np.zeros_like(coh0, dtype=np.float64)
-
-    # Work only on positive-freq bins
-    fpos_idx = np.flatnonzero(valid)
-    for k, i in enumerate(fpos_idx):
-        a, b = int(I0[i]), int(I1[i])
-        # guardrail at very small windows
-        if b - a < min_bins:
-            a = max(0, k - min_bins//2)
-            b = min(len(fpos_idx), a + min_bins)
-            seg_idx = fpos_idx[a:b]
-        else:
-            # map (a:b) in the compressed valid-index space to real indices
-            seg_idx = fpos_idx[a:b]
+    cPxy = c * Pxy2
+    # (bins, 5*C): columns grouped by quantity, channels within each group
+    V = np.concatenate((c, c * Pxx, c * Pyy2, cPxy.real, cPxy.imag)).T
 
-        M = seg_idx.size
-        w = _hann_cached(M)
-        if coh_weight_pow > 0:
-            w = w * (coh0[seg_idx] ** coh_weight_pow)
-        wsum = float(np.sum(w)) + eps
+    op = _get_smoothing_operator(freqs, frac, min_bins)
+    if op is not None:
+        S = op @ V
+    else:
+        S = _smooth_sums_banded(freqs, V, frac, min_bins)
+    S = S.T.reshape(5, C, n)
 
-        Pxx_b = np.sum(Pxx[seg_idx] * w) / wsum
-        Pyy_b = np.sum(Pyy[seg_idx] * w) / wsum
-        Pxy_b = np.sum(Pxy[seg_idx] * w) / wsum
+    wsum = S[0] + eps
+    Pxx_b = S[1] / wsum
+    Pyy_b = S[2] / wsum
+    Pxy_b = (S[3] + 1j * S[4]) / wsum
 
-        Hs[i] = Pxy_b / (Pxx_b + eps)
-        coh_s[i] = (np.abs(Pxy_b)**2) / (Pxx_b*Pyy_b + eps)
+    Hs = Pxy_b / (Pxx_b + eps)
+    coh_s = (np.abs(Pxy_b)**2) / (Pxx_b*Pyy_b + eps)
 
     # Clamp coherence to [0,1] and copy DC/Nyquist safely
-    coh_s = np.clip(coh_s, 0.0, 1.0)
-    Hs[~valid] = Hs[valid][0] if np.any(valid) else 0.0
+    coh_s = np.where(valid, np.clip(coh_s, 0.0, 1.0), 0.0)
+    Hs[:, ~valid] = Hs[:, valid][:, :1] if np.any(valid) else 0.0
+    if np.ndim(Pxy) == 1:
+        return Hs[0], coh_s[0]
     return Hs, coh_s
 
+# Log-frequency output grids keyed by (bins, fs, points_per_octave)
+_output_grids: OrderedDict[Tuple[int, float, int], np.ndarray] = OrderedDict()
+_MAX_OUTPUT_GRIDS = 8
+
+@_with_cache_lock
+def log_grid_indices(freqs: np.ndarray, points_per_octave: int) -> Optional[np.ndarray]:
+    """Bin indices sampling ``freqs`` on a log grid with ``points_per_octave``.
+
+    Grid points are snapped to the nearest FFT bin and de-duplicated, so at low
+    frequencies (where bins are sparser than the grid) every bin is kept. DC is
+    dropped. Returns None when ``points_per_octave`` <= 0 (send every bin).
+    """
+    if points_per_octave <= 0 or freqs.size < 2:
+        return None
+    key = (int(freqs.size), float(freqs[-1]), int(points_per_octave))
+    idx = _output_grids.get(key)
+    if idx is None:
+        df = freqs[1] - freqs[0]
+        n_pts = int(np.floor(np.log2(freqs[-1] / freqs[1]) * points_per_octave)) + 1
+        f_grid = freqs[1] * 2.0 ** (np.arange(n_pts) / points_per_octave)
+        idx = np.unique(np.clip(np.rint(f_grid / df).astype(np.int64), 1, freqs.size - 1))
+        _output_grids[key] = idx
+        if len(_output_grids) > _MAX_OUTPUT_GRIDS:
+            _output_grids.popitem(last=False)
+    _output_grids.move_to_end(key, last=True)
+    return idx
+
+@_with_cache_lock
 @_taper_cache_instance
 def _taper_for_M(M: int) -> np.ndarray:
     """Cached taper generation with memory-aware eviction."""
@@ -652,80 +1380,219 @@ def _taper_for_M(M: int) -> np.ndarray:
     t[-fade:] = np.linspace(1, 0, fade)
     return t
 
-def compute_metrics(block: np.ndarray, config: CaptureConfig) -> tuple[TFData, SPLData, float]:
-    global _cleanup_counter
+class TFArrays(NamedTuple):
+    """TFData fields as arrays, for encoders that don't want Python lists."""
+    freqs: np.ndarray
+    mag_db: np.ndarray
+    phase_deg: np.ndarray
+    coh: np.ndarray
+    ir: np.ndarray
+
+    def to_tfdata(self) -> TFData:
+        return TFData(
+            freqs=self.freqs.tolist(),
+            mag_db=self.mag_db.tolist(),
+            phase_deg=self.phase_deg.tolist(),
+            coh=self.coh.tolist(),
+            ir=self.ir.tolist(),
+        )
+
+class CrossSpectra(NamedTuple):
+    """Averaged spectra behind one frame: ``Pxx`` (bins,) of the reference,
+    ``Pyy``/``Pxy`` (C, bins) of the measurement channels, with the delays
+    applied (``Pxy`` includes the fractional-delay rotation)."""
+    freqs: np.ndarray
+    Pxx: np.ndarray
+    Pyy: np.ndarray
+    Pxy: np.ndarray
+    meas_chans: Tuple[int, ...]
+    delays_ms: Tuple[float, ...]
+
+_EMPTY = np.zeros(0)
+_EMPTY_TF = TFArrays(_EMPTY, _EMPTY, _EMPTY, _EMPTY, _EMPTY)
+
+def measurement_channels(config: CaptureConfig) -> List[int]:
+    """1-based measurement channels, primary first (``measChans`` wins over ``measChan``)."""
+    chans = getattr(config, "measChans", None)
+    return list(chans) if chans else [int(config.measChan)]
+
+def _split_delays(delays_ms: Sequence[float], fs: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-channel delays as whole samples plus the fractional remainder."""
+    D = np.asarray(delays_ms, dtype=np.float64) * fs / 1000.0
+    D_int = np.round(D).astype(np.int64)
+    return D_int, D - D_int
+
+def _overlap_span(N: int, D_int: np.ndarray) -> Tuple[int, int]:
+    """(start, length) of the ref samples every delayed channel overlaps."""
+    start = max(0, -int(D_int.min()))
+    end = N - max(0, int(D_int.max()))
+    return start, max(0, end - start)
+
+def compute_metrics(
+    block: np.ndarray,
+    config: CaptureConfig,
+    stream_pos: Optional[int] = None,
+    estimate_delay: bool = True,
+    analyzer: Optional[Analyzer] = None,
+) -> tuple[TFData, SPLData, float]:
+    """Transfer function, coherence, IR and level for one analysis window.
+
+    Measures the primary channel only; see ``compute_metrics_batch``.
+    """
+    return compute_metrics_batch(
+        block, config, stream_pos=stream_pos, estimate_delay=estimate_delay,
+        meas_chans=measurement_channels(config)[:1], analyzer=analyzer,
+    )[0]
+
+def compute_metrics_batch(
+    block: np.ndarray,
+    config: CaptureConfig,
+    stream_pos: Optional[int] = None,
+    estimate_delay: bool = True,
+    meas_chans: Optional[Sequence[int]] = None,
+    arrays: bool = False,
+    analyzer: Optional[Analyzer] = None,
+) -> List[Tuple[Union[TFData, TFArrays], SPLData, float]]:
+    """Transfer function, coherence, IR and level for one analysis window,
+    one ``(tf, spl, delay_ms)`` per measurement channel.
+
+    All channels are measured against the same reference: the ref segments
+    are transformed once and the meas segments as one batch, and smoothing
+    and the IR run over all channels together. Each channel keeps its own
+    delay state (see ``delay_states``). ``meas_chans`` defaults to
+    ``measurement_channels(config)``. With ``arrays=True`` each result holds
+    a ``TFArrays`` instead of a ``TFData`` (no per-frame list conversion).
+    Delay states, streaming spectra and work arrays are ``analyzer``'s
+    (default: the module's), so sessions with their own analyzers can run
+    concurrently.
+
+    ``stream_pos`` is the absolute index of the sample just past the end of
+    ``block``. When given, spectra come from the streaming segment engine and
+    only segments completed since the previous call are transformed; without
+    it the whole window is analyzed from scratch.
+
+    With ``estimate_delay=False`` the delay is not measured here, only read
+    from the delay state (see ``update_delay_estimate``).
+
+    ``config.dspPrecision == "float32"`` keeps the samples, windows, segment
+    FFTs and spectrum ring in single precision; averages, smoothing and the
+    displayed values stay float64.
+    """
+    an = _analyzer(analyzer)
     if block.ndim == 1:
         block = block[:, np.newaxis]
+    dtype = dsp_dtype(config)
+    if meas_chans is None:
+        meas_chans = measurement_channels(config)
+    states = an.delay_states(meas_chans)
 
     # Use views instead of copies where possible
     x = block[:, config.refChan - 1]
-    y = block[:, config.measChan - 1]
+    # (C, N): one contiguous row per measurement channel
+    ys = np.ascontiguousarray(block[:, [ch - 1 for ch in meas_chans]].T, dtype=dtype)
     
-    # Only convert to float64 if necessary
-    if x.dtype != np.float64:
-        x = x.astype(np.float64, copy=False)
-    if y.dtype != np.float64:
-        y = y.astype(np.float64, copy=False)
+    # Only convert if necessary (float32 capture buffers stay as-is in float32 mode)
+    if x.dtype != dtype:
+        x = x.astype(dtype, copy=False)
     
     fs = float(config.sampleRate)
 
     # Delay (linear GCC-PHAT you already implemented)
     MAX_DELAY_MS = getattr(config, "maxDelayMs", 2000.0)
-    delay_ms, _ = _delay_pick_applied(x, y, fs, max_ms=MAX_DELAY_MS)
+    if estimate_delay:
+        delays_ms = [_delay_pick_applied(x, y, fs, MAX_DELAY_MS, st, an)[0] for y, st in zip(ys, states)]
+    else:
+        delays_ms = [delay_applied_ms(st) for st in states]
 
-    # Integer align with zero-padding (preserve length) + fractional remainder
-    y_al, frac_samples, D_int, _ = _align_by_integer_delay_pad(x, y, delay_ms, fs)
+    # Integer delay + fractional remainder (in samples)
+    D_int, frac_samples = _split_delays(delays_ms, fs)
 
-    # derive the fully overlapped indices (exclude zeros)
+    # derive the indices every channel fully overlaps; y is read D_int samples later
     N = x.size
-    if D_int >= 0:
-        start = 0
-        end   = N - D_int
-    else:
-        start = -D_int
-        end   = N
-
-    x_eff = x[start:end]
-    y_eff = y_al[start:end]
-    usable_len = max(0, end - start)
+    start, usable_len = _overlap_span(N, D_int)
+    x_eff = x[start:start + usable_len]
+    ys_eff = np.stack([ys[c, start + d:start + d + usable_len] for c, d in enumerate(D_int)])
 
     # Bail out early if not enough overlap to analyze
     if usable_len < MIN_SAMPLES_FOR_ANALYSIS:
-        tf_data = TFData(freqs=[], mag_db=[], phase_deg=[], coh=[], ir=[])
-        rms = float(np.sqrt(np.mean(y**2))) if y.size else 1e-20
-        dbfs = 20.0 * np.log10(max(rms, 1e-20))
-        spl_data = SPLData(Leq=dbfs, LZ=dbfs)
-        return tf_data, spl_data, delay_ms
+        results = []
+        for y, delay_ms in zip(ys, delays_ms):
+            tf_data = _EMPTY_TF if arrays else TFData(freqs=[], mag_db=[], phase_deg=[], coh=[], ir=[])
+            rms = float(np.sqrt(np.mean(y**2, dtype=np.float64))) if y.size else 1e-20
+            dbfs = 20.0 * np.log10(max(rms, 1e-20))
+            results.append((tf_data, SPLData(Leq=dbfs, LZ=dbfs), delay_ms))
+        return results
 
     # nperseg / noverlap from usable overlap
     target_n = int(config.nfft)
     nperseg, noverlap = _choose_nperseg_with_min_segments(usable_len, target_n, min_segments=4)
-    window = get_window("hann", nperseg)
 
-    # Spectra on effective (non-zero-padded) signal slices
-    freqs, Pxy = csd(
-        x_eff, y_eff, fs=fs, window=window, nperseg=nperseg, noverlap=noverlap,
-        detrend='constant', return_onesided=True, scaling='density'
-    )
-    _, Pxx = welch(
-        x_eff, fs=fs, window=window, nperseg=nperseg, noverlap=noverlap,
-        detrend='constant', return_onesided=True, scaling='density'
-    )
-    _, Pyy = welch(
-        y_eff, fs=fs, window=window, nperseg=nperseg, noverlap=noverlap,
-        detrend='constant', return_onesided=True, scaling='density'
-    )
+    t_spectra = time.perf_counter()
+    spectra = None
+    if stream_pos is not None:
+        spectra = an.spectra.update(x, ys, int(stream_pos), fs, nperseg, noverlap, D_int)
+
+    if spectra is not None:
+        freqs, Pxx, Pyy, Pxy = spectra
+    else:
+        window = get_window("hann", nperseg, dtype)
+
+        # Spectra on effective (non-zero-padded) signal slices
+        freqs, Pxx, Pyy, Pxy = cross_spectra(x_eff, ys_eff, fs, window, nperseg, noverlap)
+    an.timings.add("spectra", time.perf_counter() - t_spectra)
 
     eps = 1e-20
     Pxx = np.maximum(Pxx, eps)
     Pyy = np.maximum(Pyy, eps)
 
     # Remove tiny fractional remainder with freq rotation BEFORE smoothing
-    if abs(frac_samples) > 1e-6:
-        tau_frac = frac_samples / fs
-        Pxy *= np.exp(1j * 2 * np.pi * freqs * tau_frac)
+    for c in np.flatnonzero(np.abs(frac_samples) > 1e-6):
+        tau_frac = frac_samples[c] / fs
+        Pxy[c] *= np.exp(1j * 2 * np.pi * freqs * tau_frac)
+    an.last_spectra = CrossSpectra(freqs, Pxx, Pyy, Pxy, tuple(meas_chans), tuple(delays_ms))
+
+    tfs = spectra_to_tf(
+        freqs, Pxx, Pyy, Pxy, int(getattr(config, "pointsPerOctave", 0)), an, int(getattr(config, "irLength", 0)),
+    )
+
+    rms_all = np.sqrt(np.mean(ys_eff**2, axis=-1, dtype=np.float64))
+    results = []
+    for c, delay_ms in enumerate(delays_ms):
+        tf_data = tfs[c] if arrays else tfs[c].to_tfdata()
+        rms = float(rms_all[c]) or eps
+        dbfs = 20.0 * np.log10(rms)
+        spl_data = SPLData(Leq=dbfs, LZ=dbfs)
+        results.append((tf_data, spl_data, delay_ms))
+    
+    # Periodic cleanup instead of random GC
+    an.trim_work_arrays()
+
+    return results
+
+def spectra_to_tf(
+    freqs: np.ndarray,
+    Pxx: np.ndarray,
+    Pyy: np.ndarray,
+    Pxy: np.ndarray,
+    points_per_octave: int = 0,
+    analyzer: Optional[Analyzer] = None,
+    ir_length: int = 0,
+) -> List[TFArrays]:
+    """Displayed values of averaged spectra, one ``TFArrays`` per row of ``Pxy``.
+
+    ``Pyy``/``Pxy`` are ``(C, bins)`` against a shared ``Pxx`` (or one
+    ``Pxx`` row per channel), already delay-compensated: 1/6-octave smoothing,
+    resampling onto the log output grid and the IR of the smoothed TF.
+    ``ir_length`` > 0 keeps that many IR samples around t=0 (tapered at
+    both ends) instead of all ``2 * (bins - 1)``; t=0 stays at the centre.
+    """
+    an = _analyzer(analyzer)
+    eps = 1e-20
+    Pyy = np.atleast_2d(Pyy)
+    Pxy = np.atleast_2d(Pxy)
 
     # ---- 1/6-octave smoothing (no UI; fixed) ----
+    t_smooth = time.perf_counter()
     Hs, coh_s = smooth_constQ_tf_and_coh(
         freqs=freqs,
         Pxx=Pxx, Pyy=Pyy, Pxy=Pxy,
@@ -734,60 +1601,157 @@ def compute_metrics(block: np.ndarray, config: CaptureConfig) -> tuple[TFData, S
         min_bins=3, eps=eps,
     )
 
-    # Smoothed display values
-    mag_db = 20.0 * np.log10(np.abs(Hs) + eps)
-    phase_deg = np.angle(Hs, deg=True)
-    coh = coh_s
+    # Smoothed display values, resampled onto the log output grid
+    grid = log_grid_indices(freqs, int(points_per_octave))
+    H_out = Hs if grid is None else Hs[:, grid]
+    freqs_out = freqs if grid is None else freqs[grid]
+    mag_db = 20.0 * np.log10(np.abs(H_out) + eps)
+    phase_deg = np.angle(H_out, deg=True)
+    coh = coh_s if grid is None else coh_s[:, grid]
+    t_ir = time.perf_counter()
+    an.timings.add("smoothing", t_ir - t_smooth)
 
     # Impulse response from SMOOTHED H (use in-place operations)
+    C = Pxy.shape[0]
     M = len(freqs)
     n_ir = 2 * (M - 1)
     
     # Get reusable work arrays
-    H_ir = get_work_array('H_ir', (M,), dtype=np.complex128)
-    ir = get_work_array('ir', (n_ir,), dtype=np.float64)
+    H_ir = an.get_work_array('H_ir', (C, M), dtype=np.complex128)
     
     # Copy Hs to work array
     H_ir[:] = Hs
-    H_ir[0] = H_ir[0].real + 0j
+    H_ir[:, 0] = H_ir[:, 0].real + 0j
     if M > 1:
-        H_ir[-1] = H_ir[-1].real + 0j
+        H_ir[:, -1] = H_ir[:, -1].real + 0j
     
     # Apply taper in-place
     H_ir *= _taper_for_M(M)
     
-    # Compute irfft into pre-allocated array
-    ir = np.fft.irfft(H_ir, n=n_ir)
-    ir_plot = np.roll(ir, n_ir // 2)
-
-    tf_data = TFData(
-        freqs=freqs.tolist(),
-        mag_db=mag_db.tolist(),
-        phase_deg=phase_deg.tolist(),
-        coh=coh.tolist(),
-        ir=ir_plot.tolist(),
-    )
+    # Compute irfft for every channel in one call
+    ir = np.fft.irfft(H_ir, n=n_ir, axis=-1)
+    if 0 < ir_length < n_ir:
+        # The smoothed TF rings out long before nfft samples; send the part
+        # around t=0, which would otherwise outweigh the gridded TF
+        half = ir_length // 2
+        ir_plot = np.concatenate((ir[:, n_ir - half:], ir[:, :ir_length - half]), axis=-1)
+        ir_plot *= _taper_for_M(ir_length)
+    else:
+        ir_plot = np.roll(ir, n_ir // 2, axis=-1)
+    an.timings.add("ir", time.perf_counter() - t_ir)
 
-    rms = float(np.sqrt(np.mean(y_eff**2))) or eps
-    dbfs = 20.0 * np.log10(rms)
-    spl_data = SPLData(Leq=dbfs, LZ=dbfs)
-    
-    # Periodic cleanup instead of random GC
-    _cleanup_counter += 1
-    if _cleanup_counter >= CLEANUP_INTERVAL:
-        _cleanup_counter = 0
-        # Clear unused work arrays
-        current_keys = set(_work_arrays.keys())
-        if len(current_keys) > MAX_WORK_ARRAYS // 2:
-            # Keep only most recently used
-            recent_keys = sorted(_work_array_access_times.keys(),
-                               key=lambda k: _work_array_access_times[k],
-                               reverse=True)[:MAX_WORK_ARRAYS // 2]
-            for key in current_keys - set(recent_keys):
-                _work_arrays.pop(key, None)
-                _work_array_access_times.pop(key, None)
+    return [TFArrays(freqs_out, mag_db[c], phase_deg[c], coh[c], ir_plot[c]) for c in range(C)]
 
-        gc.collect(0)  # Fast generation 0 collection
-        log_memory_usage()  # Log memory usage during cleanup
+# Inverse-variance weights w = coh / (1 - coh) grow without bound as the
+# coherence approaches 1; the floor caps one position's weight.
+_COH_WEIGHT_FLOOR = 1e-3
+
+def average_spectra(
+    Pxx: np.ndarray,
+    Pyy: np.ndarray,
+    Pxy: np.ndarray,
+    mode: str = "power",
+    coherence_weighted: bool = True,
+    eps: float = 1e-20,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Spatial average of P measurement positions given as ``(P, bins)`` spectra.
+
+    Each position is normalized by its own reference, H_i = Pxy_i / Pxx_i,
+    so positions measured at different levels average fairly. ``mode``
+    "complex" averages H_i as vectors (phase differences between positions
+    cancel, and the averaged coherence drops where they disagree); "power"
+    averages |H_i|^2 and keeps the phase of the vector average. With
+    ``coherence_weighted`` each position and bin is weighted by
+    coh / (1 - coh), the inverse of the TF estimate's variance.
+
+    Returns ``(Pxx, Pyy, Pxy)`` of one equivalent position (``Pxx`` = 1) with
+    the averaged TF and coherence, ready for ``spectra_to_tf``.
+    """
+    Pxx = np.maximum(np.asarray(Pxx, dtype=np.float64), eps)
+    Pyy = np.maximum(np.asarray(Pyy, dtype=np.float64), eps)
+    Pxy = np.asarray(Pxy, dtype=np.complex128)
+
+    H = Pxy / Pxx
+    G = Pyy / Pxx  # output power per unit reference power
+    H_pow = H.real**2 + H.imag**2
+    if coherence_weighted:
+        coh = np.clip(H_pow / G, 0.0, 1.0)
+        w = coh / np.maximum(1.0 - coh, _COH_WEIGHT_FLOOR)
+    else:
+        w = np.ones_like(G)
+    wsum = np.maximum(w.sum(axis=0), eps)
+
+    H_vec = (w * H).sum(axis=0) / wsum
+    G_avg = (w * G).sum(axis=0) / wsum
+    if mode == "complex":
+        H_avg = H_vec
+    else:
+        H_avg = np.sqrt((w * H_pow).sum(axis=0) / wsum) * np.exp(1j * np.angle(H_vec))
+    # The averaged output power keeps the equivalent position's coherence
+    # |H_avg|^2 / G_avg in [0, 1] (Cauchy-Schwarz over the weighted positions)
+    Pyy_avg = np.maximum(G_avg, np.abs(H_avg)**2)
+    return np.ones_like(G_avg), Pyy_avg[np.newaxis], H_avg[np.newaxis]
+
+def analysis_window_len(config: CaptureConfig) -> int:
+    """Samples of history a capture analyzes: one FFT, room for the largest
+    delay either way, and the segment overlap."""
+    nperseg = int(config.nfft)
+    max_delay_ms = int(getattr(config, "maxDelayMs", 2000))
+    max_lag_samples = int(np.ceil(int(config.sampleRate) * max_delay_ms / 1000.0))
+    return nperseg + 2 * max_lag_samples + int(0.75 * nperseg)
+
+def spectra_tail_len(
+    config: CaptureConfig,
+    new_samples: int,
+    meas_chans: Optional[Sequence[int]] = None,
+    analyzer: Optional[Analyzer] = None,
+) -> int:
+    """Newest samples ``ingest_spectra`` needs once ``new_samples`` arrived
+    since the previous ingest or frame (at the current applied delays)."""
+    if meas_chans is None:
+        meas_chans = measurement_channels(config)
+    states = delay_states(meas_chans, analyzer)
+    D_int, _ = _split_delays([delay_applied_ms(st) for st in states], float(config.sampleRate))
+    hop = int(config.nfft) - int(0.75 * int(config.nfft))
+    return (int(new_samples) + int(config.nfft) + hop
+            + max(0, int(D_int.max())) + max(0, -int(D_int.min())))
+
+def ingest_spectra(
+    block: np.ndarray,
+    config: CaptureConfig,
+    stream_pos: int,
+    window_len: int,
+    meas_chans: Optional[Sequence[int]] = None,
+    analyzer: Optional[Analyzer] = None,
+) -> bool:
+    """Fold the segments completed since the last call into the streaming
+    spectra without building a frame.
+
+    ``block`` is the newest part (see ``spectra_tail_len``) of a
+    ``window_len``-sample analysis window ending at ``stream_pos``; segments
+    are laid out exactly as ``compute_metrics_batch`` would for the full
+    window, so the next frame only transforms what arrived after this.
+    Returns False when nothing could be folded in; the next frame then
+    catches up on its own.
+    """
+    if block.ndim == 1:
+        block = block[:, np.newaxis]
+    dtype = dsp_dtype(config)
+    if meas_chans is None:
+        meas_chans = measurement_channels(config)
+    an = _analyzer(analyzer)
+    fs = float(config.sampleRate)
+    D_int, _ = _split_delays([delay_applied_ms(st) for st in an.delay_states(meas_chans)], fs)
+
+    _, usable_len = _overlap_span(int(window_len), D_int)
+    if usable_len < MIN_SAMPLES_FOR_ANALYSIS:
+        return False
+    nperseg, noverlap = _choose_nperseg_with_min_segments(usable_len, int(config.nfft), min_segments=4)
+
+    with an.timings.time("ingest"):
+        x = block[:, config.refChan - 1].astype(dtype, copy=False)
+        ys = np.ascontiguousarray(block[:, [ch - 1 for ch in meas_chans]].T, dtype=dtype)
+        return an.spectra.advance(x, ys, int(stream_pos), fs, nperseg, noverlap, D_int,
+                                  window_len=int(window_len))
 
-    return tf_data, spl_data, delay_ms
+_default_analyzer = Analyzer()
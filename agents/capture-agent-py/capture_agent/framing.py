@@ -0,0 +1,297 @@
+"""
+Binary encoding of analysis frames.
+
+Clients list the frame formats they understand in ``hello.frameFormats``;
+the agent answers with the one it will use in ``hello_ack.frameFormat``.
+"json" (a ``FrameMessage``) is always available. "f32" sends each frame as
+a single binary websocket message, all little-endian:
+
+    header (56 bytes)
+        4s  magic b"SDFB"
+        u16 version, u16 header length
+        f64 ts (ms since epoch)
+        f32 delay_ms, latency_ms, Leq, LZ, delay_confidence (NaN = none)
+        u32 sampleRate, n_freqs, n_ir
+        u8  delay mode (see DELAY_MODE_CODES), u8 n_channels, u16 measChan
+        u32 reserved
+    f32[n_freqs] freqs, mag_db, phase_deg, coh
+    f32[n_ir]    ir
+    n_channels - 1 channel blocks (channels after the first, which the
+    top-level arrays already carry):
+        u16 measChan, u8 delay mode, u8 pad,
+        f32 delay_ms, delay_confidence, Leq, LZ         (20 bytes)
+        f32[n_freqs] mag_db, phase_deg, coh
+        f32[n_ir]    ir
+
+n_channels is 0 for single-channel captures (no ``channels`` list). Every
+block is a multiple of 4 bytes, so clients can view the arrays in place.
+
+"q16" (``QuantizedFrameEncoder``) quantizes mag to 0.01 dB int16, phase to
+int16 (360/65536 deg steps), coherence to uint8 and the IR to int16 against
+a per-keyframe scale, and sends deltas against what the client already has:
+
+    header (60 bytes): the f32 header with magic b"SDFQ", its reserved word
+        replaced by u32 seq, followed by u32 flags (bit 0: keyframe)
+    keyframe: f32[n_freqs] freqs, then per channel (extra channels prefixed
+        by the 20-byte channel header above):
+        f32 ir_scale, i16[n_freqs] mag, i16[n_freqs] phase, i16[n_ir] ir,
+        u8[n_freqs] coh
+    delta: per channel (same channel headers), for mag, phase, ir and coh:
+        u8[ceil(n/8)] changed-bin bitmask (LSB first), then one wrapping
+        delta per changed bin in the array's type (i16, coh u8)
+
+Every section is zero-padded to 4 bytes. A bin is only resent when it moved
+further than the configured error bound from the client's value, so each
+decoded value stays within that bound (plus half a quantization step) of
+the agent's. A delta applies only to the frame with seq - 1; clients that
+miss one ask for a keyframe (``request_keyframe``).
+"""
+import math
+import struct
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .dsp import TFArrays
+from .schema import SPLData
+
+# Formats the agent can encode; the client's order decides
+FRAME_FORMATS = ("q16", "f32", "json")
+
+FRAME_MAGIC = b"SDFB"
+QFRAME_MAGIC = b"SDFQ"
+FRAME_VERSION = 1
+_HEADER = struct.Struct("<4sHHdfffffIIIBBHI")
+_Q_HEADER = struct.Struct("<4sHHdfffffIIIBBHII")
+_Q_KEYFRAME = 0x1
+_CHANNEL_HEADER = struct.Struct("<HBxffff")
+
+DELAY_MODE_CODES = {"auto": 0, "tracking": 1, "frozen": 2, "manual": 3}
+_UNKNOWN_MODE = 255
+
+
+class ChannelArrays(NamedTuple):
+    meas_chan: int
+    tf: TFArrays
+    spl: SPLData
+    delay_ms: float
+    delay_mode: Optional[str]
+    delay_confidence: Optional[float]
+
+
+def negotiate_frame_format(requested: Optional[Sequence[str]]) -> str:
+    """First format the client lists that the agent supports, else "json"."""
+    for fmt in requested or ():
+        if fmt in FRAME_FORMATS:
+            return fmt
+    return "json"
+
+
+def _f32(value: Optional[float]) -> float:
+    return math.nan if value is None else float(value)
+
+
+def encode_frame_f32(
+    tf: TFArrays,
+    spl: SPLData,
+    *,
+    delay_ms: float,
+    latency_ms: float,
+    ts: int,
+    sample_rate: int,
+    delay_mode: Optional[str],
+    delay_confidence: Optional[float],
+    meas_chan: int,
+    channels: Optional[Sequence[ChannelArrays]] = None,
+) -> bytes:
+    """Pack one frame in the "f32" layout. ``channels`` (primary first) is the
+    per-channel list of a batched capture; its first entry must match ``tf``."""
+    n_freqs = int(tf.freqs.size)
+    n_ir = int(tf.ir.size)
+    extra = list(channels[1:]) if channels else []
+    header = _HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, _HEADER.size,
+        float(ts),
+        float(delay_ms), float(latency_ms), float(spl.Leq), float(spl.LZ), _f32(delay_confidence),
+        int(sample_rate), n_freqs, n_ir,
+        DELAY_MODE_CODES.get(delay_mode, _UNKNOWN_MODE), len(channels) if channels else 0,
+        int(meas_chan), 0,
+    )
+
+    per_channel = 3 * n_freqs + n_ir
+    ch_words = _CHANNEL_HEADER.size // 4
+    body = np.empty(n_freqs + per_channel + len(extra) * (ch_words + per_channel), dtype="<f4")
+    body[:n_freqs] = tf.freqs
+    o = n_freqs
+    for ch in [None, *extra]:
+        t = tf if ch is None else ch.tf
+        if ch is not None:
+            # channel header shares the float32 body so the whole frame is one copy
+            body[o:o + ch_words].view(np.uint8)[:] = np.frombuffer(
+                _CHANNEL_HEADER.pack(
+                    int(ch.meas_chan), DELAY_MODE_CODES.get(ch.delay_mode, _UNKNOWN_MODE),
+                    float(ch.delay_ms), _f32(ch.delay_confidence), float(ch.spl.Leq), float(ch.spl.LZ),
+                ),
+                dtype=np.uint8,
+            )
+            o += ch_words
+        for arr in (t.mag_db, t.phase_deg, t.coh):
+            body[o:o + n_freqs] = arr
+            o += n_freqs
+        body[o:o + n_ir] = t.ir
+        o += n_ir
+    return header + body.tobytes()
+
+
+def _pad4(parts: list, size: int) -> int:
+    pad = -size % 4
+    if pad:
+        parts.append(bytes(pad))
+    return size + pad
+
+
+def _channel_header(ch: ChannelArrays) -> bytes:
+    return _CHANNEL_HEADER.pack(
+        int(ch.meas_chan), DELAY_MODE_CODES.get(ch.delay_mode, _UNKNOWN_MODE),
+        float(ch.delay_ms), _f32(ch.delay_confidence), float(ch.spl.Leq), float(ch.spl.LZ),
+    )
+
+
+class QuantizedFrameEncoder:
+    """Stateful "q16" encoder for one client connection (see module docstring).
+
+    Error bounds are in display units: ``mag_error_db`` dB, ``phase_error_deg``
+    degrees, ``coh_error`` coherence, ``ir_error`` as a fraction of the IR
+    peak at the last keyframe. A keyframe goes out every ``keyframe_interval``
+    frames, when the grid or channel count changes, when the IR outgrows its
+    keyframe scale, and after ``request_keyframe``.
+    """
+
+    MAG_STEP_DB = 0.01
+    PHASE_STEP_DEG = 360.0 / 65536.0
+    COH_STEP = 1.0 / 255.0
+
+    def __init__(
+        self,
+        mag_error_db: float = 0.05,
+        phase_error_deg: float = 0.5,
+        coh_error: float = 0.01,
+        ir_error: float = 1e-3,
+        keyframe_interval: int = 50,
+    ):
+        self.mag_error_db = float(mag_error_db)
+        self.phase_error_deg = float(phase_error_deg)
+        self.coh_error = float(coh_error)
+        self.ir_error = float(ir_error)
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self._seq = 0
+        self._since_keyframe = 0
+        self._keyframe_requested = True
+        self._freqs = None
+        self._state = []  # per channel: [ir_scale, mag, phase, ir, coh] as the client has them
+
+    def request_keyframe(self):
+        self._keyframe_requested = True
+
+    @staticmethod
+    def _quantize(tf: TFArrays, ir_scale: float):
+        mag = np.clip(np.rint(np.asarray(tf.mag_db) * 100.0), -32768, 32767).astype(np.int16)
+        phase = (np.rint(np.asarray(tf.phase_deg) * (32768.0 / 180.0)).astype(np.int64) & 0xFFFF)
+        phase = phase.astype(np.uint16).view(np.int16)
+        ir = np.clip(np.rint(np.asarray(tf.ir) / ir_scale), -32767, 32767).astype(np.int16)
+        coh = np.clip(np.rint(np.asarray(tf.coh) * 255.0), 0, 255).astype(np.uint8)
+        return mag, phase, ir, coh
+
+    @staticmethod
+    def _ir_scale(ir: np.ndarray) -> float:
+        # 6 dB headroom over the keyframe's peak before a new keyframe is forced
+        peak = float(np.max(np.abs(ir))) if ir.size else 0.0
+        return max(peak, 1e-12) * 2.0 / 32767.0
+
+    def _needs_keyframe(self, tfs: Sequence[TFArrays]) -> bool:
+        if (self._keyframe_requested or self._freqs is None
+                or self._since_keyframe >= self.keyframe_interval
+                or len(tfs) != len(self._state)
+                or tfs[0].freqs.shape != self._freqs.shape
+                or not np.array_equal(tfs[0].freqs, self._freqs)):
+            return True
+        for tf, st in zip(tfs, self._state):
+            if tf.ir.size != st[3].size or (tf.ir.size and np.max(np.abs(tf.ir)) > 32767 * st[0]):
+                return True
+        return False
+
+    def encode(
+        self,
+        tf: TFArrays,
+        spl: SPLData,
+        *,
+        delay_ms: float,
+        latency_ms: float,
+        ts: int,
+        sample_rate: int,
+        delay_mode: Optional[str],
+        delay_confidence: Optional[float],
+        meas_chan: int,
+        channels: Optional[Sequence[ChannelArrays]] = None,
+    ) -> bytes:
+        """Encode one frame; same arguments as ``encode_frame_f32``."""
+        extra = list(channels[1:]) if channels else []
+        tfs = [tf] + [ch.tf for ch in extra]
+        keyframe = self._needs_keyframe(tfs)
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+
+        parts = [_Q_HEADER.pack(
+            QFRAME_MAGIC, FRAME_VERSION, _Q_HEADER.size,
+            float(ts),
+            float(delay_ms), float(latency_ms), float(spl.Leq), float(spl.LZ), _f32(delay_confidence),
+            int(sample_rate), int(tf.freqs.size), int(tf.ir.size),
+            DELAY_MODE_CODES.get(delay_mode, _UNKNOWN_MODE), len(channels) if channels else 0,
+            int(meas_chan), self._seq, _Q_KEYFRAME if keyframe else 0,
+        )]
+
+        if keyframe:
+            self._keyframe_requested = False
+            self._since_keyframe = 0
+            self._freqs = np.array(tf.freqs, copy=True)
+            self._state = []
+            parts.append(np.asarray(tf.freqs, dtype="<f4").tobytes())
+        self._since_keyframe += 1
+
+        for i, t in enumerate(tfs):
+            if i > 0:
+                parts.append(_channel_header(extra[i - 1]))
+            if keyframe:
+                ir_scale = self._ir_scale(np.asarray(t.ir))
+                q = self._quantize(t, ir_scale)
+                self._state.append([ir_scale, *q])
+                parts.append(struct.pack("<f", ir_scale))
+                for arr in q:
+                    parts.append(arr.astype(arr.dtype.newbyteorder("<"), copy=False).tobytes())
+                    _pad4(parts, arr.nbytes)
+            else:
+                self._append_delta(parts, t, self._state[i])
+        return b"".join(parts)
+
+    def _append_delta(self, parts: list, tf: TFArrays, st: list):
+        q = self._quantize(tf, st[0])
+        # bounds in quantization steps; the IR scale puts the keyframe peak at 32767/2
+        bounds = (
+            self.mag_error_db / self.MAG_STEP_DB,
+            self.phase_error_deg / self.PHASE_STEP_DEG,
+            self.ir_error * 32767.0 / 2.0,
+            self.coh_error / self.COH_STEP,
+        )
+        for k, (new, bound) in enumerate(zip(q, bounds), start=1):
+            old = st[k]
+            # wrapping difference: phase wraps at +-180 deg, the rest never nears the limits
+            diff = new.astype(np.int32) - old.astype(np.int32)
+            if k == 2:
+                diff = (diff + 32768) % 65536 - 32768
+            changed = np.abs(diff) > bound
+            mask = np.packbits(changed, bitorder="little")
+            parts.append(mask.tobytes())
+            _pad4(parts, mask.nbytes)
+            delta = (new[changed] - old[changed]).astype(new.dtype.newbyteorder("<"), copy=False)
+            parts.append(delta.tobytes())
+            _pad4(parts, delta.nbytes)
+            old[changed] = new[changed]
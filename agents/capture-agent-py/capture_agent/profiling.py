@@ -0,0 +1,160 @@
+"""
+On-demand sampling profiler.
+
+A bundled agent cannot be attached to, so ``SamplingProfiler`` profiles it
+from the inside: a background thread wakes every ``interval`` seconds and
+records the Python stack of every other thread (``sys._current_frames``),
+which covers the event loop, the analysis and delay workers and the audio
+callback alike. A thread inside NumPy/FFT code shows the Python call that
+entered it. Nothing runs and nothing is hooked while no profile is active.
+
+Samples are written as collapsed stacks, one ``thread;outer;...;inner count``
+line per distinct stack, the input format of flamegraph.pl and speedscope.
+Stacks that end in a blocking wait (the event loop's select, idle workers)
+are left out unless ``include_idle`` is set.
+"""
+import collections
+import datetime
+import os
+import pathlib
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .schema import ProfileFunction, ProfileMessage
+
+PROFILES_DIR = pathlib.Path.home() / ".sounddocs-agent" / "profiles"
+
+# (file name, function) of the frames idle threads sit in
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+_TOP_FUNCTIONS = 25
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample all threads for up to ``duration`` seconds, then report.
+
+    ``on_done`` is called with the ``ProfileMessage`` from the sampling
+    thread once the profile ends, by ``stop()`` or when ``duration`` runs out.
+    """
+
+    def __init__(
+        self,
+        duration: float,
+        interval: float,
+        include_idle: bool = False,
+        on_done: Optional[Callable[[ProfileMessage], None]] = None,
+        directory: pathlib.Path = PROFILES_DIR,
+    ):
+        self.duration = float(duration)
+        self.interval = float(interval)
+        self.include_idle = include_idle
+        self.on_done = on_done
+        self.directory = pathlib.Path(directory)
+        self._stop = threading.Event()
+        self._counts: Dict[Tuple[int, Tuple], int] = collections.Counter()
+        self._names: Dict[int, str] = {}
+        self.samples = 0
+        self.started = 0.0
+        self.result: Optional[ProfileMessage] = None
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        """End the profile early; the report follows through ``on_done``."""
+        self._stop.set()
+
+    def status(self) -> ProfileMessage:
+        return self.result or ProfileMessage(
+            type="profile", running=True, seconds=time.monotonic() - self.started, samples=self.samples,
+        )
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = self.started + self.duration
+        next_names = 0.0
+        counts = self._counts
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            now = time.monotonic()
+            if now >= next_names:
+                # threads come and go (captures start, executors spin up)
+                self._names.update((t.ident, t.name) for t in threading.enumerate())
+                next_names = now + 1.0
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                counts[ident, tuple(stack)] += 1
+            self.samples += 1
+        self.result = self._report(time.monotonic() - self.started)
+        if self.on_done is not None:
+            self.on_done(self.result)
+
+    def _report(self, seconds: float) -> ProfileMessage:
+        lines: List[str] = []
+        self_counts: Dict[object, int] = collections.Counter()
+        total_counts: Dict[object, int] = collections.Counter()
+        threads: Dict[str, int] = collections.Counter()
+        kept = 0
+        for (ident, stack), n in self._counts.items():
+            leaf = stack[0]
+            if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                continue
+            name = self._names.get(ident, f"thread-{ident}")
+            kept += n
+            threads[name] += n
+            self_counts[leaf] += n
+            for code in set(stack):
+                total_counts[code] += n
+            lines.append(";".join([name] + [_label(c) for c in reversed(stack)]) + f" {n}")
+
+        path = None
+        error = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = self.directory / f"profile-{stamp}.collapsed"
+            path.write_text("\n".join(sorted(lines)) + "\n")
+        except OSError as e:
+            path, error = None, str(e)
+
+        scale = 100.0 / kept if kept else 0.0
+        top = [
+            ProfileFunction(
+                function=code.co_name,
+                file=code.co_filename,
+                line=code.co_firstlineno,
+                selfPct=n * scale,
+                totalPct=total_counts[code] * scale,
+            )
+            for code, n in self_counts.most_common(_TOP_FUNCTIONS)
+        ]
+        return ProfileMessage(
+            type="profile",
+            running=False,
+            seconds=seconds,
+            samples=self.samples,
+            path=str(path) if path else None,
+            threads=dict(threads),
+            top=top,
+            error=error,
+        )
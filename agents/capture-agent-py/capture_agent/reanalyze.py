@@ -0,0 +1,231 @@
+"""
+Offline re-analysis of recorded captures.
+
+Runs the live analysis (``dsp.compute_metrics_batch`` on the same sliding
+window, with the periodic delay job and the signal gate) over recordings made
+by ``Recorder`` or any multichannel WAV, faster than real time: each file is
+split into time chunks analyzed in parallel by a process pool, and the frame
+series is written next to the recording as ``<name>.frames.npz``:
+
+    t                 (T,)        frame end time, seconds from the file start
+    freqs             (F,)        output grid
+    mag_db, phase_deg, coh (T, C, F)
+    ir                (T, C, N)   only with --ir
+    leq, delay_ms, delay_confidence (T, C)
+    meas_chans        (C,)
+    config            JSON of the CaptureConfig used
+
+The config comes from the recording's sidecar (or defaults for plain WAV
+files); ``--set key=value`` overrides any ``CaptureConfig`` field, so the
+same night can be re-run with different analysis settings:
+
+    python -m capture_agent.reanalyze show/*.wav --set nfft=32768 --set pointsPerOctave=24
+
+Each chunk starts with fresh delay and spectra state, exactly like a capture
+started at that point; frames gated by the signal gate are left out.
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import dsp
+from .recorder import as_float32, open_recording, read_sidecar
+from .schema import CaptureConfig
+
+CHUNK_SECONDS = 60.0
+
+
+def _default_config(sample_rate: int) -> dict:
+    return dict(
+        deviceId="offline", sampleRate=sample_rate, blockSize=1024, refChan=1, measChan=2,
+        nfft=16384, avg="power", avgCount=1, window="hann", lpfMode="none", lpfFreq=0.0,
+    )
+
+
+def load_config(path: pathlib.Path, overrides: Dict[str, object]) -> CaptureConfig:
+    """The recording's CaptureConfig with ``overrides`` applied."""
+    sidecar = read_sidecar(path)
+    if sidecar is not None and sidecar.get("config"):
+        values = dict(sidecar["config"])
+    else:
+        values = _default_config(open_recording(path)[1])
+    values.update(overrides)
+    # recording again is never what a re-analysis wants
+    values["record"] = None
+    return CaptureConfig(**values)
+
+
+def frame_positions(config: CaptureConfig, total: int) -> range:
+    """Stream positions frames are analyzed at: every 1/targetFps, at least a hop apart."""
+    nfft = int(config.nfft)
+    hop = nfft - int(0.75 * nfft)
+    step = max(hop, int(round(config.sampleRate / float(config.targetFps))))
+    return range(step, total + 1, step)
+
+
+def _window(data: np.ndarray, pos: int, length: int) -> np.ndarray:
+    # The ``length`` samples ending at ``pos``; zeros before the file start,
+    # as in a capture's initial buffer
+    if pos >= length:
+        return as_float32(np.asarray(data[pos - length:pos]))
+    out = np.zeros((length, data.shape[1]), dtype=np.float32)
+    out[length - pos:] = as_float32(np.asarray(data[:pos]))
+    return out
+
+
+def analyze_chunk(
+    path: str, config_json: str, positions: range, delay_ms: Optional[float], with_ir: bool,
+) -> dict:
+    """Worker process: analyze the frames at ``positions`` of one recording."""
+    config = CaptureConfig.model_validate_json(config_json)
+    data, _ = open_recording(pathlib.Path(path))
+    analyzer = dsp.Analyzer()
+    if delay_ms is not None:
+        dsp.delay_set_manual(delay_ms, analyzer=analyzer)
+
+    fs = float(config.sampleRate)
+    meas_chans = dsp.measurement_channels(config)
+    dtype = dsp.dsp_dtype(config)
+    window_len = dsp.analysis_window_len(config)
+    max_delay_ms = float(getattr(config, "maxDelayMs", 2000))
+    delay_step = max(1, int(round(fs / max(0.1, float(config.delayRateHz)))))
+    gate_enabled = config.gateRmsDbfs is not None
+    gate_hold = int(fs * config.gateHoldMs / 1000.0)
+    gate_cols = [ch - 1 for ch in meas_chans]
+
+    rows: Dict[str, list] = {k: [] for k in (
+        "t", "mag_db", "phase_deg", "coh", "ir", "leq", "delay_ms", "delay_confidence")}
+    freqs = None
+    gate_fail = 0
+    gated = False
+    last_pos = max(0, positions.start - positions.step)
+    next_delay = positions.start
+    for pos in positions:
+        window = _window(data, pos, window_len)
+        if gate_enabled:
+            reason, _, _ = dsp.signal_gate(
+                window[-(pos - last_pos):], config.refChan - 1, gate_cols,
+                config.gateRmsDbfs, config.gateMaxCrestDb,
+            )
+            gate_fail = gate_fail + (pos - last_pos) if reason else 0
+        last_pos = pos
+        now_gated = gate_enabled and gate_fail >= gate_hold
+        if now_gated != gated:
+            # as in the live loop: averages restart on either side of a gap
+            analyzer.spectra.reset()
+            gated = now_gated
+        if gated:
+            continue
+
+        if pos >= next_delay:
+            next_delay = pos + delay_step
+            x = window[:, config.refChan - 1].astype(dtype)
+            ys = window[:, gate_cols].T.astype(dtype)
+            dsp.update_delay_estimates(x, ys, fs, max_delay_ms, meas_chans, analyzer)
+
+        results = dsp.compute_metrics_batch(
+            window, config, stream_pos=pos, estimate_delay=False, arrays=True, analyzer=analyzer,
+        )
+        if not results[0][0].freqs.size:
+            continue  # not enough overlap at the current delay
+        freqs = results[0][0].freqs
+        states = dsp.delay_states(meas_chans, analyzer)
+        rows["t"].append(pos / fs)
+        rows["mag_db"].append([tf.mag_db for tf, _, _ in results])
+        rows["phase_deg"].append([tf.phase_deg for tf, _, _ in results])
+        rows["coh"].append([tf.coh for tf, _, _ in results])
+        if with_ir:
+            rows["ir"].append([tf.ir for tf, _, _ in results])
+        rows["leq"].append([spl.Leq for _, spl, _ in results])
+        rows["delay_ms"].append([d for _, _, d in results])
+        rows["delay_confidence"].append([np.nan if st["confidence"] is None else st["confidence"] for st in states])
+
+    out = {k: np.asarray(v, dtype=np.float64 if k == "t" else np.float32) for k, v in rows.items() if v}
+    if freqs is not None:
+        out["freqs"] = np.asarray(freqs, dtype=np.float32)
+    return out
+
+
+def _merge(chunks: List[dict]) -> dict:
+    chunks = [c for c in chunks if "t" in c]
+    if not chunks:
+        return {}
+    merged = {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0] if k != "freqs"}
+    merged["freqs"] = chunks[0]["freqs"]
+    return merged
+
+
+def _parse_overrides(items: List[str]) -> Dict[str, object]:
+    overrides = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set expects key=value, got {item!r}")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m capture_agent.reanalyze",
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("files", nargs="+", type=pathlib.Path, help="recordings (.wav or .npy)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a CaptureConfig field (JSON value), e.g. nfft=32768")
+    parser.add_argument("--delay-ms", type=float, default=None, help="use a fixed delay instead of estimating it")
+    parser.add_argument("--ir", action="store_true", help="also store the impulse responses")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS, help="audio per work item")
+    parser.add_argument("--out", type=pathlib.Path, default=None, help="output directory (default: next to each file)")
+    args = parser.parse_args(argv)
+    overrides = _parse_overrides(args.overrides)
+
+    jobs = []
+    for path in args.files:
+        config = load_config(path, overrides)
+        data, _ = open_recording(path)
+        needed = max(config.refChan, *dsp.measurement_channels(config))
+        if data.shape[1] < needed:
+            raise SystemExit(f"{path}: {data.shape[1]} channels, config needs {needed}")
+        positions = frame_positions(config, data.shape[0])
+        per_chunk = max(1, int(args.chunk_seconds * config.sampleRate) // positions.step)
+        chunks = [positions[i:i + per_chunk] for i in range(0, len(positions), per_chunk)]
+        jobs.append((path, config, data.shape[0], chunks))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            [pool.submit(analyze_chunk, str(path), config.model_dump_json(), chunk, args.delay_ms, args.ir)
+             for chunk in chunks]
+            for path, config, _, chunks in jobs
+        ]
+        audio_seconds = 0.0
+        for (path, config, frames, _), file_futures in zip(jobs, futures):
+            series = _merge([f.result() for f in file_futures])
+            out_dir = args.out or path.parent
+            out_dir.mkdir(parents=True, exist_ok=True)
+            out_path = out_dir / f"{path.stem}.frames.npz"
+            np.savez(
+                out_path, **series,
+                meas_chans=np.asarray(dsp.measurement_channels(config)),
+                config=np.asarray(config.model_dump_json()),
+            )
+            audio_seconds += frames / config.sampleRate
+            print(f"{path}: {len(series.get('t', ()))} frames -> {out_path}")
+    elapsed = time.perf_counter() - start
+    print(f"{audio_seconds:.1f} s of audio in {elapsed:.1f} s ({audio_seconds / max(elapsed, 1e-9):.1f}x real time)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
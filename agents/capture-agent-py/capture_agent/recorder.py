@@ -0,0 +1,353 @@
+"""
+Raw-audio recording of a capture.
+
+``Recorder`` takes the float32 input blocks the capture loop analyzes (with
+the loopback reference already in place) and streams them to disk from a
+writer thread, so a slow disk never stalls the loop or the audio callback.
+Blocks wait in a preallocated RAM ring of ``bufferSeconds``; when the writer
+falls that far behind, new blocks are dropped and counted instead of
+growing memory.
+
+Two file formats, both plain float32 interleaved frames that ``np.memmap``
+can open in place:
+
+    "wav"  WAVE_FORMAT_EXTENSIBLE IEEE float. A JUNK chunk reserves room
+           for a ds64 chunk, so files past 4 GiB are finalized as RF64.
+    "npy"  NumPy .npy with a fixed-size header.
+
+A ``.json`` sidecar holds the ``CaptureConfig``, the start time, the frame
+count and, once the recording ends, dropped frames and delay state.
+The writer rewrites the header's sizes and the sidecar's frame count about
+once a second, so a recording cut short by a crash still opens, minus at
+most that last second. ``open_recording`` / ``read_sidecar`` read them
+back for offline analysis.
+"""
+import datetime
+import itertools
+import json
+import os
+import pathlib
+import re
+import struct
+import threading
+import time
+from typing import BinaryIO, List, Optional, Tuple
+
+import numpy as np
+from scipy.io import wavfile
+
+from .schema import CaptureConfig, RecordingMessage
+
+RECORDINGS_DIR = pathlib.Path.home() / ".sounddocs-agent" / "recordings"
+
+# KSDATAFORMAT_SUBTYPE_IEEE_FLOAT
+_FLOAT_SUBFORMAT = bytes.fromhex("0300000000001000800000aa00389b71")
+_WAV_HEADER_LEN = 12 + 36 + 48 + 8  # RIFF, JUNK/ds64, fmt (extensible), data
+_NPY_HEADER_LEN = 128
+_U32_MAX = 0xFFFFFFFF
+# How often the writer makes the header and sidecar match the data on disk
+CHECKPOINT_SECONDS = 1.0
+
+
+def _wav_header(channels: int, sample_rate: int, data_bytes: int) -> bytes:
+    block_align = 4 * channels
+    riff_bytes = _WAV_HEADER_LEN - 8 + data_bytes
+    rf64 = riff_bytes > _U32_MAX
+    if rf64:
+        head = struct.pack("<4sI4s", b"RF64", _U32_MAX, b"WAVE")
+        reserved = struct.pack("<4sIQQQI", b"ds64", 28, riff_bytes, data_bytes,
+                               data_bytes // block_align, 0)
+    else:
+        head = struct.pack("<4sI4s", b"RIFF", riff_bytes, b"WAVE")
+        reserved = struct.pack("<4sI28x", b"JUNK", 28)
+    fmt = struct.pack(
+        "<4sIHHIIHHHHI16s", b"fmt ", 40,
+        0xFFFE, channels, sample_rate, sample_rate * block_align, block_align, 32,
+        22, 32, 0, _FLOAT_SUBFORMAT,
+    )
+    data = struct.pack("<4sI", b"data", _U32_MAX if rf64 else data_bytes)
+    return head + reserved + fmt + data
+
+
+def _npy_header(channels: int, frames: int) -> bytes:
+    d = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (frames, channels)
+    pad = _NPY_HEADER_LEN - 10 - len(d) - 1
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", _NPY_HEADER_LEN - 10) + (d + " " * pad + "\n").encode("latin1")
+
+
+def _safe_stem(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("._") or "recording"
+
+
+def _create_exclusive(directory: pathlib.Path, stem: str, suffix: str) -> Tuple[BinaryIO, str]:
+    """Create ``<stem>.<suffix>`` for writing, and return it with the stem used.
+
+    Never touches an earlier recording: when the file or the ``<stem>.json``
+    sidecar already exists, tries ``<stem>-1``, ``<stem>-2``, ...
+    """
+    for n in itertools.count():
+        candidate = stem if n == 0 else f"{stem}-{n}"
+        if (directory / f"{candidate}.json").exists():
+            continue
+        try:
+            return open(directory / f"{candidate}.{suffix}", "xb"), candidate
+        except FileExistsError:
+            continue
+
+
+class Recorder:
+    """Stream a capture's input blocks to disk on a writer thread.
+
+    ``write`` is called from the capture loop and only copies into the RAM
+    ring; ``close`` drains it, finalizes the file and writes the sidecar.
+    Writer errors (disk full, ...) end the recording, not the capture, and
+    show up in ``status()``.
+    """
+
+    def __init__(
+        self,
+        config: CaptureConfig,
+        channels: int,
+        session_id: str,
+        directory: pathlib.Path = RECORDINGS_DIR,
+    ):
+        options = config.record
+        self.config = config
+        self.channels = int(channels)
+        self.sample_rate = int(config.sampleRate)
+        self.format = options.format
+        started = datetime.datetime.now().astimezone()
+        stem = _safe_stem(options.name or f"{started:%Y%m%d-%H%M%S}-{session_id}")
+        directory.mkdir(parents=True, exist_ok=True)
+        self._file, stem = _create_exclusive(directory, stem, self.format)
+        self.path = directory / f"{stem}.{self.format}"
+        self.sidecar_path = directory / f"{stem}.json"
+        self._sidecar = {
+            "file": self.path.name,
+            "format": self.format,
+            "sampleRate": self.sample_rate,
+            "channels": self.channels,
+            "started": started.isoformat(),
+            "config": config.model_dump(),
+        }
+
+        capacity = max(1, int(options.bufferSeconds * self.sample_rate))
+        self._buf = np.zeros((capacity, self.channels), dtype=np.float32)
+        self._written = 0  # frames accepted by write() (loop only)
+        self._flushed = 0  # frames written to disk (writer only)
+        self.dropped_frames = 0
+        self.error: Optional[str] = None
+        self._closing = False
+        self._wake = threading.Event()
+
+        self._file.write(self._header(0))
+        self._sidecar["frames"] = 0
+        self._write_sidecar()
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    @property
+    def active(self) -> bool:
+        return self.error is None and not self._closing
+
+    def write(self, block: np.ndarray) -> bool:
+        """Queue ``block`` (frames x channels); False if it was dropped."""
+        if not self.active:
+            return False
+        n = block.shape[0]
+        capacity = self._buf.shape[0]
+        written = self._written
+        if n > capacity - (written - self._flushed):
+            self.dropped_frames += n
+            return False
+        start = written % capacity
+        first = min(n, capacity - start)
+        self._buf[start:start + first] = block[:first]
+        self._buf[:n - first] = block[first:]
+        self._written = written + n
+        self._wake.set()
+        return True
+
+    def status(self) -> RecordingMessage:
+        return RecordingMessage(
+            type="recording",
+            path=str(self.path),
+            seconds=self._flushed / self.sample_rate,
+            backlog=(self._written - self._flushed) / self._buf.shape[0],
+            droppedFrames=self.dropped_frames,
+            active=self.active,
+            error=self.error,
+        )
+
+    def close(self, delay: Optional[List[dict]] = None):
+        """Drain the ring, finalize the file and sidecar. Blocks; run it off the loop."""
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self._write_header()
+        except OSError as e:
+            self.error = self.error or str(e)
+        finally:
+            self._file.close()
+        self._sidecar.update(
+            frames=self._flushed,
+            droppedFrames=self.dropped_frames,
+            delay=delay,
+            error=self.error,
+        )
+        self._write_sidecar()
+
+    def _header(self, frames: int) -> bytes:
+        if self.format == "wav":
+            return _wav_header(self.channels, self.sample_rate, 4 * self.channels * frames)
+        return _npy_header(self.channels, frames)
+
+    def _write_header(self):
+        """Rewrite the header for the frames on disk, then go back to appending."""
+        self._file.seek(0)
+        self._file.write(self._header(self._flushed))
+        self._file.seek(0, os.SEEK_END)
+
+    def _checkpoint(self):
+        """Make the header and sidecar describe the data written so far."""
+        self._write_header()
+        self._file.flush()
+        self._sidecar["frames"] = self._flushed
+        self._write_sidecar()
+
+    def _write_sidecar(self):
+        try:
+            self.sidecar_path.write_text(json.dumps(self._sidecar, indent=2))
+        except OSError as e:
+            self.error = self.error or str(e)
+
+    def _run(self):
+        capacity = self._buf.shape[0]
+        checkpointed = self._flushed
+        next_checkpoint = time.monotonic() + CHECKPOINT_SECONDS
+        while True:
+            self._wake.wait(CHECKPOINT_SECONDS)
+            self._wake.clear()
+            pending = self._written - self._flushed
+            if pending == 0 and self._closing:
+                return
+            try:
+                if pending:
+                    start = self._flushed % capacity
+                    first = min(pending, capacity - start)
+                    self._file.write(memoryview(self._buf[start:start + first]))
+                    if pending > first:
+                        self._file.write(memoryview(self._buf[:pending - first]))
+                    self._flushed += pending
+                    self._wake.set()  # look again: more may have arrived meanwhile
+                now = time.monotonic()
+                if now >= next_checkpoint and self._flushed != checkpointed:
+                    self._checkpoint()
+                    checkpointed = self._flushed
+                    next_checkpoint = now + CHECKPOINT_SECONDS
+            except OSError as e:
+                self.error = str(e)
+                return
+
+
+def open_recording(path: pathlib.Path) -> Tuple[np.ndarray, int]:
+    """Memory-map a recording as (frames, channels) plus its sample rate.
+
+    Reads this module's "wav" (RIFF or RF64) and "npy" files and other WAV
+    files scipy understands; integer samples are left as stored (see
+    ``as_float32``). ``.npy`` files carry no rate, so it comes from the
+    sidecar (0 when there is none). A file cut short of the length its
+    header declares maps the whole frames it does hold.
+    """
+    path = pathlib.Path(path)
+    if path.suffix.lower() == ".npy":
+        try:
+            data = np.load(path, mmap_mode="r")
+        except ValueError:
+            data = _map_truncated_npy(path)
+        sidecar = read_sidecar(path) or {}
+        sample_rate = int(sidecar.get("sampleRate", 0))
+    else:
+        try:
+            sample_rate, data = wavfile.read(path, mmap=True)
+        except ValueError:
+            data, sample_rate = _map_truncated_wav(path)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    return data, int(sample_rate)
+
+
+def _map_frames(path: pathlib.Path, dtype: np.dtype, channels: int, offset: int, frames: int) -> np.ndarray:
+    """``frames`` (at most as many as the file holds past ``offset``) as a read-only map."""
+    available = (path.stat().st_size - offset) // (dtype.itemsize * channels)
+    frames = max(0, min(frames, available))
+    if frames == 0:
+        return np.zeros((0, channels), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+
+
+def _map_truncated_npy(path: pathlib.Path) -> np.ndarray:
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if fortran_order or len(shape) not in (1, 2):
+        raise ValueError(f"{path.name}: not a (frames, channels) array")
+    channels = shape[1] if len(shape) == 2 else 1
+    return _map_frames(path, dtype, channels, offset, shape[0])
+
+
+def _map_truncated_wav(path: pathlib.Path) -> Tuple[np.ndarray, int]:
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ValueError(f"{path.name} is not a WAV file")
+        fmt = None
+        ds64_data_bytes = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError(f"{path.name} has no data chunk")
+            chunk, size = struct.unpack("<4sI", head)
+            if chunk == b"data":
+                offset = f.tell()
+                if size == _U32_MAX and ds64_data_bytes is not None:
+                    size = ds64_data_bytes
+                break
+            body = f.read(size + (size & 1))
+            if chunk == b"fmt ":
+                fmt = body
+            elif chunk == b"ds64":
+                ds64_data_bytes = struct.unpack_from("<Q", body, 8)[0]
+    if fmt is None:
+        raise ValueError(f"{path.name} has no fmt chunk")
+    tag, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", fmt)
+    if tag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE: the subformat GUID starts with the tag
+        tag = struct.unpack_from("<H", fmt, 24)[0]
+    dtypes = {(1, 8): "u1", (1, 16): "<i2", (1, 32): "<i4", (3, 32): "<f4", (3, 64): "<f8"}
+    if (tag, bits) not in dtypes:
+        raise ValueError(f"{path.name}: unsupported sample format {tag}/{bits}-bit")
+    dtype = np.dtype(dtypes[tag, bits])
+    return _map_frames(path, dtype, channels, offset, size // (dtype.itemsize * channels)), sample_rate
+
+
+def as_float32(block: np.ndarray) -> np.ndarray:
+    """Samples of ``block`` as float32 in [-1, 1) (integer PCM is scaled)."""
+    if block.dtype == np.uint8:
+        return (block.astype(np.float32) - 128.0) / 128.0
+    if np.issubdtype(block.dtype, np.integer):
+        return block.astype(np.float32) / float(-np.iinfo(block.dtype).min)
+    return block.astype(np.float32, copy=False)
+
+
+def read_sidecar(path: pathlib.Path) -> Optional[dict]:
+    """The JSON sidecar next to recording ``path``, if there is one."""
+    sidecar = pathlib.Path(path).with_suffix(".json")
+    try:
+        return json.loads(sidecar.read_text())
+    except (OSError, ValueError):
+        return None
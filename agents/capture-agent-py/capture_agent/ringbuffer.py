@@ -0,0 +1,141 @@
+"""
+Sample buffers of the capture loop.
+
+``SampleRing`` hands audio from the callback to the loop. The PortAudio
+callback runs on the driver thread and must not allocate, block or wake the
+event loop more often than the loop can use. It copies each block into a
+preallocated ring and publishes it by advancing a write count; the capture
+loop reads everything pending as at most two contiguous views and then
+releases it. Each count is written by one side only, so no lock is needed
+(a block's samples are in place before the count that exposes them moves).
+
+``MirroredHistory`` holds the analysis window the loop appends to, readable
+in place without shifting or copying it.
+"""
+import asyncio
+from typing import List, Optional
+
+import numpy as np
+
+
+class SampleRing:
+    """Single-producer/single-consumer ring of float32 frames.
+
+    ``write`` is the producer (audio callback) side; ``wait``, ``pending``
+    and ``release`` are the consumer (event loop) side. The consumer is
+    woken at most once per ``wake_frames`` written. A block that does not
+    fit is dropped whole and counted in ``overruns`` / ``dropped_frames``.
+    """
+
+    def __init__(self, capacity: int, channels: int, wake_frames: int, loop: asyncio.AbstractEventLoop):
+        self.capacity = int(capacity)
+        self.wake_frames = max(1, int(wake_frames))
+        self._buf = np.zeros((self.capacity, int(channels)), dtype=np.float32)
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self._written = 0  # frames ever written (producer only)
+        self._read = 0  # frames ever released (consumer only)
+        self._wake_at = self.wake_frames  # producer only
+        self.overruns = 0
+        self.dropped_frames = 0
+
+    def write(self, block: np.ndarray, column: Optional[int] = None, column_data: Optional[np.ndarray] = None) -> bool:
+        """Copy ``block`` (frames x channels) in; returns False if it was dropped.
+
+        With ``column`` given, that column is taken from ``column_data``
+        instead (loopback replaces the reference with the generated signal).
+        """
+        n = block.shape[0]
+        written = self._written
+        if n > self.capacity - (written - self._read):
+            self.overruns += 1
+            self.dropped_frames += n
+            return False
+        start = written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = block[:first]
+        self._buf[:n - first] = block[first:]
+        if column is not None:
+            self._buf[start:start + first, column] = column_data[:first]
+            self._buf[:n - first, column] = column_data[first:]
+        self._written = written + n
+
+        if self._written >= self._wake_at:
+            self._wake_at = self._written + self.wake_frames
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass  # Loop already closed; the capture is shutting down
+        return True
+
+    def available(self) -> int:
+        return self._written - self._read
+
+    async def wait(self):
+        """Return once the producer has signalled or a wake's worth is pending."""
+        self._ready.clear()
+        if self.available() >= self.wake_frames:
+            return
+        await self._ready.wait()
+
+    def pending(self, limit: Optional[int] = None) -> List[np.ndarray]:
+        """Unreleased frames, oldest first, as one or two views into the ring.
+
+        At most ``limit`` frames when given. The views stay valid until
+        ``release``.
+        """
+        n = self.available() if limit is None else min(int(limit), self.available())
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        views = [self._buf[start:start + first]]
+        if n > first:
+            views.append(self._buf[:n - first])
+        return views
+
+    def release(self, frames: int):
+        """Hand ``frames`` read frames back to the producer."""
+        self._read += int(frames)
+
+
+class MirroredHistory:
+    """The newest ``length`` frames of a stream, always one contiguous view.
+
+    Every frame is stored twice, ``capacity`` rows apart, in a
+    (2 * capacity, channels) array, so the window ending at the write
+    position never wraps: appending a block costs two block copies instead
+    of shifting the whole history. ``capacity`` exceeds ``length`` by
+    ``slack`` frames; up to that many may be appended while a reader (an
+    analysis job on a worker thread) still holds a ``window()`` view,
+    without touching the rows it covers.
+    """
+
+    def __init__(self, length: int, channels: int, slack: int):
+        self.length = int(length)
+        self.slack = int(slack)
+        self.capacity = self.length + self.slack
+        self._buf = np.zeros((2 * self.capacity, int(channels)), dtype=np.float32)
+        self._pos = 0  # row the next frame goes to, in [0, capacity)
+
+    def append(self, block: np.ndarray):
+        cap = self.capacity
+        n = block.shape[0]
+        if n > cap:
+            # only the newest capacity frames survive; land them where they would have
+            self._pos = (self._pos + n - cap) % cap
+            block = block[-cap:]
+            n = cap
+        pos = self._pos
+        first = min(n, cap - pos)
+        self._buf[pos:pos + first] = block[:first]
+        self._buf[pos + cap:pos + cap + first] = block[:first]
+        rest = n - first
+        if rest:
+            self._buf[:rest] = block[first:]
+            self._buf[cap:cap + rest] = block[first:]
+        self._pos = (pos + n) % cap
+
+    def window(self, frames: Optional[int] = None) -> np.ndarray:
+        """View of the newest ``frames`` (default ``length``) frames, oldest first."""
+        n = self.length if frames is None else min(int(frames), self.capacity)
+        end = self._pos + self.capacity
+        return self._buf[end - n:end]
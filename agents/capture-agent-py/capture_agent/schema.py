@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal, Union, Optional
+from typing import Dict, List, Literal, Union, Optional
 
 # Shared data structures
 class Device(BaseModel):
@@ -22,6 +22,7 @@ class SPLData(BaseModel):
 WindowType = Literal["hann", "kaiser", "blackman"]
 AvgType = Literal["power", "linear", "exp"]
 LpfMode = Literal["lpf", "none"]
+DspPrecision = Literal["float64", "float32"]
 
 class SignalGeneratorConfig(BaseModel):
     enabled: bool = False
@@ -33,12 +34,24 @@ class SignalGeneratorConfig(BaseModel):
     sweepDuration: float = 1.0  # seconds (for sweep)
     amplitude: float = 0.5  # 0.0 to 1.0
 
+class RecordOptions(BaseModel):
+    # Raw input audio (loopback reference included) is written to
+    # ~/.sounddocs-agent/recordings next to a JSON sidecar
+    format: Literal["wav", "npy"] = "wav"  # float32 WAV (RF64 past 4 GiB) or .npy
+    # File name stem; defaults to start time + session id. A stem already
+    # in use gets -1, -2, ... appended rather than overwriting a recording
+    name: Optional[str] = None
+    # RAM ahead of the disk writer; blocks are dropped once it is full
+    bufferSeconds: float = Field(10.0, gt=0, le=120)
+
 class CaptureConfig(BaseModel):
     deviceId: str
     sampleRate: int
     blockSize: int
     refChan: int
     measChan: int
+    # Batch: measure several channels against refChan (overrides measChan)
+    measChans: Optional[List[int]] = None
 
     # FFT & Averaging
     nfft: int
@@ -50,25 +63,74 @@ class CaptureConfig(BaseModel):
     lpfMode: LpfMode
     lpfFreq: float
 
+    # Output grid: log-spaced points per octave (0 sends every linear FFT bin)
+    pointsPerOctave: int = 48
+
+    # Impulse response: samples sent around t=0, tapered at both ends
+    # (0 sends all nfft samples)
+    irLength: int = Field(4096, ge=0)
+
+    # Delay estimation runs as its own periodic job at this rate
+    delayRateHz: float = 4.0
+
+    # Frames are analyzed and sent at this rate; hops in between only
+    # update the running spectra
+    targetFps: float = Field(20.0, gt=0, le=120)
+
+    # "float32" runs FFTs, windows and the spectrum ring in single precision
+    dspPrecision: DspPrecision = "float64"
+
+    # Signal gate: analysis pauses once ref or meas RMS stays below
+    # gateRmsDbfs or the crest factor exceeds gateMaxCrestDb for gateHoldMs.
+    # Off unless gateRmsDbfs is set (e.g. -80.0)
+    gateRmsDbfs: Optional[float] = None
+    gateMaxCrestDb: float = 40.0
+    gateHoldMs: float = 500.0
+
     # Signal Generator & Loopback
     useLoopback: bool = False  # Use loopback for reference channel
     generator: Optional[SignalGeneratorConfig] = None
 
+    # Record the raw input while measuring (None: no recording)
+    record: Optional[RecordOptions] = None
+
+class FrameCodecOptions(BaseModel):
+    # "q16" frame codec: max deviation tolerated before a bin is resent
+    magErrorDb: float = 0.05
+    phaseErrorDeg: float = 0.5
+    cohError: float = 0.01
+    irError: float = 1e-3  # fraction of the IR peak
+    keyframeInterval: int = 50  # frames
+
 # Message types from client to agent
 class HelloMessage(BaseModel):
     type: Literal["hello"]
     client: str
     nonce: str
+    # Frame encodings the client can decode, preferred first ("q16", "f32", "json")
+    frameFormats: Optional[List[str]] = None
+    frameCodec: Optional[FrameCodecOptions] = None
 
 class ListDevicesMessage(BaseModel):
     type: Literal["list_devices"]
 
 class StartCaptureMessage(CaptureConfig):
     type: Literal["start"]
+    # Names the new capture session; the agent picks one when omitted
+    sessionId: Optional[str] = None
 
 class StopCaptureMessage(BaseModel):
     type: Literal["stop"]
 
+class SubscribeMessage(BaseModel):
+    # Attach to a running capture and receive its frames; sessionId may be
+    # omitted while only one capture is running
+    type: Literal["subscribe"]
+    sessionId: Optional[str] = None
+
+class ListSessionsMessage(BaseModel):
+    type: Literal["list_sessions"]
+
 class CalibrateMessage(BaseModel):
     type: Literal["calibrate"]
     spl_ref_db: float
@@ -86,20 +148,81 @@ class SetManualDelayMessage(BaseModel):
     type: Literal["set_manual_delay"]
     delay_ms: float | None = None
 
+class RequestKeyframeMessage(BaseModel):
+    type: Literal["request_keyframe"]
+
 class UpdateGeneratorMessage(BaseModel):
     type: Literal["update_generator"]
     config: SignalGeneratorConfig
 
+class GetStatsMessage(BaseModel):
+    # Stats of the caller's capture now; intervalS > 0 also pushes them that
+    # often until the capture ends, 0 stops the push
+    type: Literal["get_stats"]
+    intervalS: Optional[float] = Field(None, ge=0)
+
+class ProfileStartMessage(BaseModel):
+    # Sample every agent thread's stack for up to durationS; the "profile"
+    # report follows when it ends (or on profile_stop)
+    type: Literal["profile_start"]
+    durationS: float = Field(10.0, gt=0, le=120)
+    intervalMs: float = Field(5.0, ge=1, le=100)
+    includeIdle: bool = False
+
+class ProfileStopMessage(BaseModel):
+    type: Literal["profile_stop"]
+
+class TraceStartMessage(BaseModel):
+    # Record timestamped spans of the caller's capture (callback, loop,
+    # analysis stages, sends) until trace_stop or the capture ends; the
+    # newest ``spans`` are kept
+    type: Literal["trace_start"]
+    spans: int = Field(65536, ge=1024, le=1048576)
+
+class TraceStopMessage(BaseModel):
+    type: Literal["trace_stop"]
+
+class SaveSnapshotMessage(BaseModel):
+    # Keep the raw spectra of the caller's session's newest frame
+    type: Literal["save_snapshot"]
+    name: Optional[str] = None
+
+class ListSnapshotsMessage(BaseModel):
+    type: Literal["list_snapshots"]
+
+class DeleteSnapshotMessage(BaseModel):
+    type: Literal["delete_snapshot"]
+    id: str
+
+class AverageSnapshotsMessage(BaseModel):
+    # Every measurement channel of every listed snapshot is one position
+    type: Literal["average_snapshots"]
+    ids: List[str]
+    mode: Literal["power", "complex"] = "power"
+    coherenceWeighted: bool = True
+    pointsPerOctave: int = 48
+    irLength: int = Field(4096, ge=0)
+
 # Message types from agent to client
 class HelloAckMessage(BaseModel):
     type: Literal["hello_ack"]
     agent: str
     originAllowed: bool
+    # Encoding the agent will use for frames on this connection
+    frameFormat: str = "json"
 
 class DevicesMessage(BaseModel):
     type: Literal["devices"]
     items: List[Device]
 
+class ChannelFrame(BaseModel):
+    measChan: int
+    tf: TFData
+    spl: SPLData
+    delay_ms: float
+    delay_mode: str | None = None
+    delay_confidence: float | None = None
+
 class FrameMessage(BaseModel):
     type: Literal["frame"]
     tf: TFData
@@ -110,10 +233,29 @@ class FrameMessage(BaseModel):
     sampleRate: int
     delay_mode: str | None = None
     applied_delay_ms: float | None = None
+    delay_confidence: float | None = None
+    # One entry per measurement channel when measChans is set; the top-level
+    # tf/spl/delay fields mirror the first entry
+    channels: List[ChannelFrame] | None = None
 
 class StoppedMessage(BaseModel):
     type: Literal["stopped"]
 
+class SubscribedMessage(BaseModel):
+    type: Literal["subscribed"]
+    sessionId: str
+    config: CaptureConfig  # settings of the capture being watched
+    subscribers: int
+
+class SessionInfo(BaseModel):
+    sessionId: str
+    config: CaptureConfig
+    subscribers: int
+
+class SessionsMessage(BaseModel):
+    type: Literal["sessions"]
+    sessions: List[SessionInfo]
+
 class ErrorMessage(BaseModel):
     type: Literal["error"]
     message: str
@@ -129,17 +271,122 @@ class CalibrationDoneMessage(BaseModel):
     slope: float
     offset: float
 
+class GatedMessage(BaseModel):
+    type: Literal["gated"]
+    gated: bool
+    reason: str | None = None  # "silent" | "crest" | "invalid"
+    ref_dbfs: float | None = None
+    meas_dbfs: float | None = None
+    ts: int
+
+class RecordingMessage(BaseModel):
+    # Recorder progress, about once a second and when the recording ends
+    type: Literal["recording"]
+    path: str
+    seconds: float  # audio on disk so far
+    backlog: float  # fraction of the RAM buffer waiting for the writer
+    droppedFrames: int  # frames lost because the writer fell behind
+    active: bool
+    error: str | None = None
+
+class StageTiming(BaseModel):
+    count: int  # runs since the capture started
+    # over the newest runs (up to 512)
+    meanMs: float
+    p50Ms: float
+    p95Ms: float
+    p99Ms: float
+    maxMs: float
+
+class StatsMessage(BaseModel):
+    type: Literal["stats"]
+    sessionId: str
+    ts: int
+    uptimeS: float
+    # "delay", "spectra", "ingest", "smoothing", "ir", "serialize", "send", "frame"
+    stages: Dict[str, StageTiming]
+    callback: StageTiming  # audio callback run time
+    callbackPeriodMs: float  # audio per callback at the latest block size
+    queueFrames: int  # audio waiting in the callback -> loop ring
+    queueCapacity: int
+    overruns: int  # blocks the ring had no room for
+    droppedFrames: int
+    outputUnderruns: int
+    callbackStatusFlags: int  # callbacks PortAudio flagged (overflow/underflow)
+    framesSent: int
+    rssBytes: Optional[int] = None
+    caches: Dict[str, int]  # entries per DSP cache, plus work-array bytes
+
+class ProfileFunction(BaseModel):
+    function: str
+    file: str
+    line: int
+    selfPct: float  # of the kept samples, with this function innermost
+    totalPct: float  # of the kept samples, with this function anywhere on the stack
+
+class ProfileMessage(BaseModel):
+    type: Literal["profile"]
+    running: bool
+    seconds: float
+    samples: int
+    path: str | None = None  # collapsed stacks (flamegraph.pl / speedscope)
+    threads: Dict[str, int] = {}  # kept samples per thread
+    top: List[ProfileFunction] = []  # by self samples
+    error: str | None = None
+
+class TraceMessage(BaseModel):
+    type: Literal["trace"]
+    running: bool
+    path: str | None = None  # Chrome trace-event JSON (chrome://tracing, Perfetto)
+    spans: int  # spans in the file
+    overwritten: int = 0  # older spans the ring had to drop
+    error: str | None = None
+
+class SnapshotInfo(BaseModel):
+    id: str
+    name: str
+    created: str  # ISO 8601
+    sampleRate: int
+    nfft: int
+    measChans: List[int]
+    delaysMs: List[float]
+
+class SnapshotsMessage(BaseModel):
+    # Reply to save_snapshot, list_snapshots and delete_snapshot
+    type: Literal["snapshots"]
+    snapshots: List[SnapshotInfo]
+
+class SnapshotAverageMessage(BaseModel):
+    type: Literal["snapshot_average"]
+    ids: List[str]
+    mode: str
+    coherenceWeighted: bool
+    positions: int
+    tf: TFData
+
 # Discriminated unions for parsing incoming messages
 ClientMessage = Union[
     HelloMessage,
     ListDevicesMessage,
     StartCaptureMessage,
     StopCaptureMessage,
+    SubscribeMessage,
+    ListSessionsMessage,
     CalibrateMessage,
     GetVersionMessage,
     DelayFreezeMessage,
     SetManualDelayMessage,
     UpdateGeneratorMessage,
+    RequestKeyframeMessage,
+    GetStatsMessage,
+    ProfileStartMessage,
+    ProfileStopMessage,
+    TraceStartMessage,
+    TraceStopMessage,
+    SaveSnapshotMessage,
+    ListSnapshotsMessage,
+    DeleteSnapshotMessage,
+    AverageSnapshotsMessage,
 ]
 
 AgentMessage = Union[
@@ -147,9 +394,18 @@ AgentMessage = Union[
     DevicesMessage,
     FrameMessage,
     StoppedMessage,
+    SubscribedMessage,
+    SessionsMessage,
     ErrorMessage,
     VersionMessage,
     CalibrationDoneMessage,
+    GatedMessage,
+    RecordingMessage,
+    StatsMessage,
+    ProfileMessage,
+    TraceMessage,
+    SnapshotsMessage,
+    SnapshotAverageMessage,
 ]
 
 class IncomingMessage(BaseModel):
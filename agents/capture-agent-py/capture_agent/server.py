@@ -4,8 +4,9 @@ import ssl
 import pathlib
 import time
 import gc
-from typing import Set, Optional
-from collections import deque
+import uuid
+from typing import Callable, Dict, Set, Optional
+from concurrent.futures import ThreadPoolExecutor
 import websockets
 from websockets.exceptions import ConnectionClosed
 from websockets import protocol
@@ -15,17 +16,34 @@ import sounddevice as sd
 from . import __version__
 from . import audio
 from . import dsp
+from . import framing
+from .recorder import Recorder
+from .ringbuffer import MirroredHistory, SampleRing
+from .profiling import SamplingProfiler
+from .snapshots import SnapshotStore
+from .stats import DurationRing
+from .tracing import TraceRing, trace_path
 from .signal_generator import SignalGenerator, SignalType, GeneratorConfig as GenConfig
 from .schema import (
     CaptureConfig,
+    ChannelFrame,
     ClientMessage,
     DevicesMessage,
     ErrorMessage,
+    FrameCodecOptions,
     FrameMessage,
+    GatedMessage,
     HelloAckMessage,
     IncomingMessage,
+    SessionInfo,
+    SessionsMessage,
+    SnapshotAverageMessage,
+    SnapshotsMessage,
     StartCaptureMessage,
+    StatsMessage,
     StoppedMessage,
+    TraceMessage,
+    SubscribedMessage,
     VersionMessage,
     UpdateGeneratorMessage,
     SignalGeneratorConfig,
@@ -35,16 +53,100 @@ from .schema import (
 # Fix 4: Use weakref.WeakSet for automatic cleanup of disconnected clients
 import weakref
 connected_clients: weakref.WeakSet = weakref.WeakSet()
-capture_task = None
-signal_generator = None
-generator_config = None
+# Frame encoding negotiated at hello, per connection
+frame_formats: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+frame_codecs: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+# Live "q16" encoder of the connection's capture, for keyframe requests
+frame_encoders: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+class CaptureSession:
+    """One running capture: its config, DSP state, subscribers and task."""
+
+    def __init__(self, session_id: str, config: CaptureConfig):
+        self.id = session_id
+        self.config = config
+        self.analyzer = dsp.Analyzer()
+        # Clients receiving this capture's frames: the one that sent start
+        # plus any that sent subscribe. The capture stops when the last one leaves.
+        self.subscribers: Set = set()
+        self.task: Optional[asyncio.Task] = None
+        # Builds the capture's StatsMessage; set by run_capture once it runs
+        self.stats: Optional[Callable[[], StatsMessage]] = None
+        # Subscribers that asked for periodic stats, and how often (seconds)
+        self.stats_intervals: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # Spans of the running trace, if one was started
+        self.trace: Optional[TraceRing] = None
+        # Output signal of a full-duplex capture; update_generator replaces it
+        self.generator_config: Optional[SignalGeneratorConfig] = None
+        self.generator: Optional[SignalGenerator] = None
+
+    def set_generator(self, generator_config: Optional[SignalGeneratorConfig]):
+        """Build the generator for ``generator_config`` at the capture's sample rate (disabled: none)."""
+        self.generator_config = generator_config
+        if generator_config is None or not generator_config.enabled:
+            self.generator = None
+            return
+        self.generator = SignalGenerator(GenConfig(
+            signal_type=SignalType(generator_config.signalType),
+            sample_rate=self.config.sampleRate,
+            output_channels=generator_config.outputChannels,
+            frequency=generator_config.frequency,
+            start_freq=generator_config.startFreq,
+            end_freq=generator_config.endFreq,
+            sweep_duration=generator_config.sweepDuration,
+            amplitude=generator_config.amplitude,
+        ))
+
+    def start_trace(self, spans: int) -> TraceRing:
+        self.trace = self.analyzer.timings.trace = TraceRing(spans)
+        return self.trace
+
+    async def finish_trace(self) -> TraceMessage:
+        """Stop tracing and write the trace file (off the loop)."""
+        trace = self.trace
+        self.trace = self.analyzer.timings.trace = None
+        path = trace_path(self.id)
+        loop = asyncio.get_running_loop()
+        try:
+            spans = await loop.run_in_executor(None, trace.export, path)
+        except OSError as e:
+            return TraceMessage(type="trace", running=False, spans=0, error=str(e))
+        return TraceMessage(
+            type="trace", running=False, path=str(path), spans=spans,
+            overwritten=max(0, trace.recorded - trace.capacity),
+        )
+
+    def info(self) -> SessionInfo:
+        return SessionInfo(sessionId=self.id, config=self.config, subscribers=len(self.subscribers))
+
+# Running captures by session id. Each has its own stream, DSP state and
+# worker threads, so several devices or channel sets can be measured at once.
+sessions: Dict[str, CaptureSession] = {}
+# The session each connection started or subscribed to (at most one)
+client_sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+# Generator config a connection sent before starting a capture; its next
+# start uses it unless the start message brings its own
+pending_generators: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+# Raw-spectra snapshots, shared by every connection and session
+snapshot_store = SnapshotStore()
+# The process-wide profile in progress or last finished, if any
+profiler: Optional[SamplingProfiler] = None
+# Sends started from other threads; the loop itself only keeps weak references
+background_tasks: Set[asyncio.Task] = set()
+
+# Audio the callback -> loop sample ring can hold before blocks are dropped
+RING_SECONDS = 2.0
+# Audio the loop may append to the analysis window while a job reads it
+HISTORY_SLACK_SECONDS = 0.5
+# How often a recording capture reports its progress / backpressure
+RECORDING_STATUS_INTERVAL = 1.0
+# Shortest period a client may ask stats to be pushed at
+STATS_MIN_INTERVAL = 0.25
 
 ALLOWED_ORIGINS = ["https://sounddocs.org", "https://beta.sounddocs.org", "http://localhost:5173", "https://localhost:5173"]
 
 async def process_message(ws, message_data: dict):
     """Parses and routes incoming messages."""
-    global capture_task
-
     try:
         incoming = IncomingMessage(message=message_data)
         message = incoming.message
@@ -53,11 +155,14 @@ async def process_message(ws, message_data: dict):
         return
 
     if message.type == "hello":
+        frame_formats[ws] = framing.negotiate_frame_format(message.frameFormats)
+        frame_codecs[ws] = message.frameCodec or FrameCodecOptions()
         ack = HelloAckMessage(
             type="hello_ack",
             agent="capture-agent-py",
             originAllowed=True,
             version=__version__,
+            frameFormat=frame_formats[ws],
         )
         await ws.send(json.dumps(ack.dict()))
 
@@ -71,14 +176,21 @@ async def process_message(ws, message_data: dict):
         await ws.send(json.dumps(response.dict()))
 
     elif message.type == "start":
-        if capture_task and not capture_task.done():
-            await send_error(ws, "Capture is already in progress.")
+        session_id = message.sessionId or uuid.uuid4().hex[:8]
+        if session_id in sessions:
+            await send_error(ws, f"Session {session_id} is already running; send subscribe to watch it.")
             return
-        dsp.reset_dsp_state()
-        dsp.clear_dsp_caches()  # Ensure clean start
+        # A connection follows one capture; starting another leaves the old one
+        await detach_subscriber(ws)
         config = CaptureConfig(**message.dict())
+        pending_generator = pending_generators.pop(ws, None)
+        if config.generator is None:
+            config.generator = pending_generator
         # Config received, proceed with capture setup
-        capture_task = asyncio.create_task(run_capture(ws, config))
+        session = sessions[session_id] = CaptureSession(session_id, config)
+        session.subscribers.add(ws)
+        client_sessions[ws] = session
+        session.task = asyncio.create_task(run_capture(session))
         # Add error handler for the task to prevent "Task exception was never retrieved" warnings
         def task_done_callback(task):
             try:
@@ -87,166 +199,299 @@ async def process_message(ws, message_data: dict):
                 pass  # Normal cancellation, ignore
             except Exception as e:
                 print(f"Capture task error: {e}")
-        capture_task.add_done_callback(task_done_callback)
+        session.task.add_done_callback(task_done_callback)
+        await ws.send(SubscribedMessage(
+            type="subscribed", sessionId=session.id, config=config, subscribers=1,
+        ).model_dump_json())
+
+    elif message.type == "subscribe":
+        if message.sessionId is not None:
+            session = sessions.get(message.sessionId)
+        elif len(sessions) == 1:
+            session = next(iter(sessions.values()))
+        else:
+            session = None
+        if session is None or session.task is None or session.task.done():
+            if message.sessionId is None and len(sessions) > 1:
+                await send_error(ws, "Several captures are running; subscribe needs a sessionId.")
+            else:
+                await send_error(ws, "No capture in progress.")
+            return
+        if client_sessions.get(ws) is not session:
+            await detach_subscriber(ws)
+        session.subscribers.add(ws)
+        client_sessions[ws] = session
+        await ws.send(SubscribedMessage(
+            type="subscribed", sessionId=session.id, config=session.config,
+            subscribers=len(session.subscribers),
+        ).model_dump_json())
+
+    elif message.type == "list_sessions":
+        await ws.send(SessionsMessage(
+            type="sessions", sessions=[s.info() for s in sessions.values()],
+        ).model_dump_json())
 
     elif message.type == "stop":
-        if capture_task and not capture_task.done():
-            capture_task.cancel()
-            # Wait for task to actually finish
-            try:
-                await capture_task
-            except asyncio.CancelledError:
-                pass  # Expected when task is cancelled
-            capture_task = None
+        # Detach this client; the capture itself ends with its last subscriber
+        if ws in client_sessions:
+            await detach_subscriber(ws)
+            await ws.send(json.dumps(StoppedMessage(type="stopped").dict()))
 
     elif message.type == "delay_freeze":
+        session = client_sessions.get(ws)
+        if session is None:
+            await send_error(ws, "No capture in progress.")
+            return
         enable = bool(message.enable)
         applied_ms = message.applied_ms
-        dsp.delay_freeze(enable, applied_ms)
-        await ws.send(json.dumps({"type": "delay_status", **dsp.delay_status()}))
+        dsp.delay_freeze(enable, applied_ms, analyzer=session.analyzer)
+        await ws.send(json.dumps({"type": "delay_status", **dsp.delay_status(analyzer=session.analyzer)}))
 
     elif message.type == "set_manual_delay":
+        session = client_sessions.get(ws)
+        if session is None:
+            await send_error(ws, "No capture in progress.")
+            return
         ms = getattr(message, "delay_ms", None)
-        dsp.delay_set_manual(ms)
+        dsp.delay_set_manual(ms, analyzer=session.analyzer)
         await ws.send(json.dumps({
             "type": "delay_status",
-            **dsp.delay_status()
+            **dsp.delay_status(analyzer=session.analyzer)
         }))
 
-    elif message.type == "update_generator":
-        global signal_generator, generator_config
-        generator_config = message.config
-        if generator_config.enabled:
-            # Create or update signal generator
-            gen_config = GenConfig(
-                signal_type=SignalType(generator_config.signalType),
-                sample_rate=48000,  # Will be updated when capture starts
-                output_channels=generator_config.outputChannels,
-                frequency=generator_config.frequency,
-                start_freq=generator_config.startFreq,
-                end_freq=generator_config.endFreq,
-                sweep_duration=generator_config.sweepDuration,
-                amplitude=generator_config.amplitude
+    elif message.type == "get_stats":
+        session = client_sessions.get(ws)
+        if session is None or session.stats is None:
+            await send_error(ws, "No capture in progress.")
+            return
+        if message.intervalS is not None:
+            if message.intervalS > 0:
+                session.stats_intervals[ws] = max(message.intervalS, STATS_MIN_INTERVAL)
+            else:
+                session.stats_intervals.pop(ws, None)
+        await ws.send(session.stats().model_dump_json())
+
+    elif message.type == "profile_start":
+        global profiler
+        if profiler is not None and profiler.running:
+            await send_error(ws, "A profile is already running; send profile_stop first.")
+            return
+        loop = asyncio.get_running_loop()
+
+        def profile_done(result):
+            # Sampling thread: hand the report to the loop for sending
+            async def send():
+                if ws.state == protocol.State.OPEN:
+                    try:
+                        await ws.send(result.model_dump_json())
+                    except ConnectionClosed:
+                        pass  # Client left before the profile finished
+
+            def schedule():
+                task = loop.create_task(send())
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+            try:
+                loop.call_soon_threadsafe(schedule)
+            except RuntimeError:
+                pass  # Loop already closed; the agent is shutting down
+
+        profiler = SamplingProfiler(
+            message.durationS, message.intervalMs / 1000.0, message.includeIdle, profile_done,
+        )
+        profiler.start()
+        await ws.send(profiler.status().model_dump_json())
+
+    elif message.type == "profile_stop":
+        if profiler is None or not profiler.running:
+            await send_error(ws, "No profile running.")
+            return
+        # The report goes to the client that started the profile
+        profiler.stop()
+
+    elif message.type == "trace_start":
+        session = client_sessions.get(ws)
+        if session is None:
+            await send_error(ws, "No capture in progress.")
+            return
+        if session.trace is not None:
+            await send_error(ws, "This capture is already being traced.")
+            return
+        session.start_trace(message.spans)
+        await ws.send(TraceMessage(type="trace", running=True, spans=0).model_dump_json())
+
+    elif message.type == "trace_stop":
+        session = client_sessions.get(ws)
+        if session is None or session.trace is None:
+            await send_error(ws, "No trace running.")
+            return
+        await ws.send((await session.finish_trace()).model_dump_json())
+
+    elif message.type == "save_snapshot":
+        session = client_sessions.get(ws)
+        spectra = session.analyzer.last_spectra if session is not None else None
+        if spectra is None:
+            await send_error(ws, "No analyzed frame to snapshot yet.")
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, snapshot_store.save, spectra, session.config.sampleRate, message.name,
+        )
+        await send_snapshots(ws)
+
+    elif message.type == "list_snapshots":
+        await send_snapshots(ws)
+
+    elif message.type == "delete_snapshot":
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, snapshot_store.delete, message.id):
+            await send_error(ws, f"Unknown snapshot: {message.id}")
+            return
+        await send_snapshots(ws)
+
+    elif message.type == "average_snapshots":
+        loop = asyncio.get_running_loop()
+        try:
+            tf, positions = await loop.run_in_executor(
+                None, snapshot_store.average,
+                message.ids, message.mode, message.coherenceWeighted, message.pointsPerOctave, message.irLength,
             )
-            signal_generator = SignalGenerator(gen_config)
+        except ValueError as e:
+            await send_error(ws, str(e))
+            return
+        await ws.send(SnapshotAverageMessage(
+            type="snapshot_average", ids=message.ids, mode=message.mode,
+            coherenceWeighted=message.coherenceWeighted, positions=positions, tf=tf,
+        ).model_dump_json())
+
+    elif message.type == "request_keyframe":
+        encoder = frame_encoders.get(ws)
+        if encoder is not None:
+            encoder.request_keyframe()
+
+    elif message.type == "update_generator":
+        # Replaces the output of the caller's capture only
+        session = client_sessions.get(ws)
+        if session is None:
+            # Nothing playing yet: keep it for this connection's next start
+            pending_generators[ws] = message.config
+            enabled = message.config.enabled
         else:
-            signal_generator = None
-        await ws.send(json.dumps({"type": "generator_updated", "enabled": generator_config.enabled if generator_config else False}))
+            session.set_generator(message.config)
+            enabled = session.generator is not None
+        await ws.send(json.dumps({"type": "generator_updated", "enabled": enabled}))
+
+async def detach_subscriber(ws):
+    """Stop sending capture frames to ``ws``; cancels its capture if it was the last subscriber."""
+    session = client_sessions.pop(ws, None)
+    frame_encoders.pop(ws, None)
+    if session is None:
+        return
+    session.subscribers.discard(ws)
+    session.stats_intervals.pop(ws, None)
+    task = session.task
+    if task and not task.done() and not session.subscribers:
+        task.cancel()
+        # Wait for task to actually finish
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass  # Expected when task is cancelled
 
-async def run_capture(ws, config: CaptureConfig):
-    global signal_generator
+async def broadcast(session: CaptureSession, clients, payload):
+    """Send one serialized message to every client in ``clients``.
+
+    Clients whose connection is gone are dropped from ``session``.
+    """
+    targets = [c for c in clients if c.state == protocol.State.OPEN]
+    results = await asyncio.gather(*(c.send(payload) for c in targets), return_exceptions=True)
+    for c, result in zip(targets, results):
+        if isinstance(result, ConnectionClosed):
+            session.subscribers.discard(c)
+        elif isinstance(result, Exception):
+            raise result
+    for c in clients:
+        if c.state != protocol.State.OPEN:
+            session.subscribers.discard(c)
+
+async def run_capture(session: CaptureSession):
+    config = session.config
+    analyzer = session.analyzer
+    subscribers = session.subscribers
     loop = asyncio.get_running_loop()
-    aq: asyncio.Queue[np.ndarray] = asyncio.Queue(maxsize=128)  # Increased from 32 to prevent frame drops
-    num_channels = max(config.refChan, config.measChan)
+    meas_chans = dsp.measurement_channels(config)
+    dsp_dtype = dsp.dsp_dtype(config)
+    num_channels = max(config.refChan, *meas_chans)
 
     # Initialize signal generator if configured
-    use_generator = False
-    if config.generator and config.generator.enabled:
-        # Initialize signal generator with config
-        gen_config = GenConfig(
-            signal_type=SignalType(config.generator.signalType),
-            sample_rate=config.sampleRate,
-            output_channels=config.generator.outputChannels,
-            frequency=config.generator.frequency,
-            start_freq=config.generator.startFreq,
-            end_freq=config.generator.endFreq,
-            sweep_duration=config.generator.sweepDuration,
-            amplitude=config.generator.amplitude
-        )
-        signal_generator = SignalGenerator(gen_config)
-        use_generator = True
-        pass  # Generator initialized
-    else:
-        pass  # Generator not enabled
+    session.set_generator(config.generator)
+    use_generator = session.generator is not None
 
     # Get device info to determine capabilities early
     device_info = sd.query_devices(int(config.deviceId))
     out_channels = device_info.get('max_output_channels', 0)
     in_channels = device_info.get('max_input_channels', 0)
 
-    # Add dropped frame tracking
-    dropped_frames = 0
+    # Dropped frame tracking (the ring counts them exactly)
+    ring = None
     last_drop_log_time = time.monotonic()
     drop_log_interval = 30.0  # Log dropped frames every 30 seconds
-
-    # Dynamic buffer pool with better management
-    initial_pool_size = 16  # Increased from 8
-    max_pool_size = 32  # Cap maximum pool growth
-    blocksize = 4096 if (use_generator and out_channels > 0) else 1024  # Match stream blocksize
-    pool = deque([np.empty((blocksize, num_channels), dtype=np.float32) for _ in range(initial_pool_size)])
-    pool_miss_count = 0
     last_gc_time = time.monotonic()
     gc_interval = 30.0  # Run GC hints every 30 seconds
 
     # Buffer for generated signal if using loopback
     generated_signal_buffer = None
 
+    def push_input(indata, frames):
+        # Driver thread: copy the block into the sample ring (no allocation,
+        # no loop wakeup unless a hop's worth has accumulated)
+        trace = session.trace
+        started = time.perf_counter() if trace is not None else 0.0
+        ref_idx = config.refChan - 1  # Convert to 0-indexed
+        if (config.useLoopback and generated_signal_buffer is not None
+                and len(generated_signal_buffer) == frames and ref_idx < indata.shape[1]):
+            # Replace reference channel with generated signal
+            ring.write(indata, ref_idx, generated_signal_buffer)
+        else:
+            ring.write(indata)
+        if trace is not None:
+            trace.span("enqueue", started, time.perf_counter(), frames)
+
+    # Callback run times and flags, for the capture's stats (driver thread only)
+    callback_times = DurationRing()
+    callback_frames = [0]
+    callback_status_count = [0]
+
     def audio_callback(indata, frames, _time_info, status):
         # called on driver thread; never block here
-        nonlocal pool_miss_count, dropped_frames, generated_signal_buffer
+        started = time.perf_counter()
         if status:
-            pass  # Audio callback status tracked
-
-        buf = None
-        # Fix 1: Ensure buffers are always returned to pool, even when frames are dropped
-        buf = None
-        try:
-            try:
-                buf = pool.popleft()
-                # PortAudio reuses its buffers; copy into our reusable buffer
-                np.copyto(buf, indata, casting='no')
-
-                # If using loopback, inject generated signal to reference channel
-                if config.useLoopback and generated_signal_buffer is not None and len(generated_signal_buffer) == frames:
-                    # Replace reference channel with generated signal
-                    ref_idx = config.refChan - 1  # Convert to 0-indexed
-                    if ref_idx < buf.shape[1]:
-                        buf[:, ref_idx] = generated_signal_buffer
-
-            except IndexError:
-                # pool exhausted - track misses
-                pool_miss_count += 1
-                # Create new buffer only if under max size
-                if len(pool) < max_pool_size:
-                    buf = indata.copy() if indata.dtype == np.float32 else indata.astype(np.float32, copy=True)
-
-                    # Apply loopback even to newly created buffer
-                    if config.useLoopback and generated_signal_buffer is not None and len(generated_signal_buffer) == frames:
-                        ref_idx = config.refChan - 1
-                        if ref_idx < buf.shape[1]:
-                            buf[:, ref_idx] = generated_signal_buffer
-                else:
-                    # Pool at max, drop this frame to prevent unbounded growth
-                    dropped_frames += 1
-                    return
+            callback_status_count[0] += 1
+        push_input(indata, frames)
+        callback_frames[0] = frames
+        callback_done(started, frames)
 
-            # Try to queue the buffer
-            loop.call_soon_threadsafe(aq.put_nowait, buf)
-        except Exception:
-            # queue full -> drop; always return buffer to pool
-            dropped_frames += 1
-            if buf is not None and len(pool) < max_pool_size:
-                try:
-                    pool.append(buf)
-                except Exception:
-                    pass  # If pool append fails, let GC handle it
-        finally:
-            # Critical fix: For buffers created during pool exhaustion that fail to queue,
-            # ensure they're returned to pool if there's space
-            pass  # Buffer management handled in except block
+    def callback_done(started, frames):
+        ended = time.perf_counter()
+        callback_times.add(ended - started)
+        trace = session.trace
+        if trace is not None:
+            trace.span("callback", started, ended, frames)
 
     # Full-duplex callback for both input and output (macOS compatible)
     duplex_callback_count = [0]
     output_underrun_count = [0]
 
     def duplex_callback(indata, outdata, frames, _time_info, status):
-        nonlocal generated_signal_buffer, pool_miss_count, dropped_frames
+        nonlocal generated_signal_buffer
+        started = time.perf_counter()
         duplex_callback_count[0] += 1
 
         if duplex_callback_count[0] == 1:
             pass  # First callback initialized
 
         if status:
+            callback_status_count[0] += 1
             status_str = str(status).lower()
             # Track output underruns specifically
             if "output underflow" in status_str:
@@ -259,10 +504,12 @@ async def run_capture(ws, config: CaptureConfig):
 
         # Handle output (signal generation) first - CRITICAL for low latency
         generated_signal = None
+        generator = session.generator
+        generator_config = session.generator_config
         try:
-            if use_generator and signal_generator:
+            if use_generator and generator:
                 # Generate signal directly into output buffer for minimum latency
-                generated_signal = signal_generator.generate_block(frames, outdata.shape[1])
+                generated_signal = generator.generate_block(frames, outdata.shape[1])
 
                 # Ensure signal is the right shape and type
                 if generated_signal.shape[0] == frames and generated_signal.shape[1] == outdata.shape[1]:
@@ -279,8 +526,8 @@ async def run_capture(ws, config: CaptureConfig):
                 if config.useLoopback:
                     # Extract just the generated signal (not multichannel) for loopback
                     # Use the first active output channel's signal
-                    if config.generator.outputChannels:
-                        ch_idx = config.generator.outputChannels[0] - 1 if config.generator.outputChannels else 0
+                    if generator_config.outputChannels:
+                        ch_idx = generator_config.outputChannels[0] - 1 if generator_config.outputChannels else 0
                     else:
                         ch_idx = 0
 
@@ -295,68 +542,240 @@ async def run_capture(ws, config: CaptureConfig):
             outdata.fill(0)
 
         # Handle input (capture) processing
-        buf = None
-        try:
+        push_input(indata, frames)
+        callback_frames[0] = frames
+        callback_done(started, frames)
+
+    async def run_delay_estimation():
+        # Periodic delay job: snapshot ref/meas and estimate off the event loop.
+        # compute_metrics only reads the applied value.
+        period = 1.0 / max(0.1, float(config.delayRateHz))
+        while True:
+            await asyncio.sleep(period)
+            if gated:
+                continue  # don't let silence or junk into the delay EMA
+            if not any(st["mode"] in ("auto", "tracking") for st in dsp.delay_states(meas_chans, analyzer)):
+                continue
+            # Snapshot in the analysis precision; the estimator follows the input dtype
+            window = history.window()
+            x = window[:, config.refChan - 1].astype(dsp_dtype)
+            ys = window[:, [ch - 1 for ch in meas_chans]].T.astype(dsp_dtype)
             try:
-                buf = pool.popleft()
-                # PortAudio reuses its buffers; copy into our reusable buffer
-                np.copyto(buf, indata, casting='no')
-
-                # If using loopback, inject generated signal to reference channel
-                if config.useLoopback and generated_signal_buffer is not None and len(generated_signal_buffer) == frames:
-                    # Replace reference channel with generated signal
-                    ref_idx = config.refChan - 1  # Convert to 0-indexed
-                    if ref_idx < buf.shape[1]:
-                        buf[:, ref_idx] = generated_signal_buffer
-
-            except IndexError:
-                # pool exhausted - track misses
-                pool_miss_count += 1
-                # Create new buffer only if under max size
-                if len(pool) < max_pool_size:
-                    buf = indata.copy() if indata.dtype == np.float32 else indata.astype(np.float32, copy=True)
-
-                    # Apply loopback even to newly created buffer
-                    if config.useLoopback and generated_signal_buffer is not None and len(generated_signal_buffer) == frames:
-                        ref_idx = config.refChan - 1
-                        if ref_idx < buf.shape[1]:
-                            buf[:, ref_idx] = generated_signal_buffer
-                else:
-                    # Pool at max, drop this frame to prevent unbounded growth
-                    dropped_frames += 1
-                    return
+                await loop.run_in_executor(
+                    delay_executor, dsp.update_delay_estimates,
+                    x, ys, float(fs), float(max_delay_ms), meas_chans, analyzer,
+                )
+            except Exception:
+                pass  # Keep the last estimate; try again next period
 
-            # Try to queue the buffer
-            loop.call_soon_threadsafe(aq.put_nowait, buf)
-        except Exception:
-            # queue full -> drop; always return buffer to pool
-            dropped_frames += 1
-            if buf is not None and len(pool) < max_pool_size:
-                try:
-                    pool.append(buf)
-                except Exception:
-                    pass  # If pool append fails, let GC handle it
-        finally:
-            # Critical fix: For buffers created during pool exhaustion that fail to queue,
-            # ensure they're returned to pool if there's space
-            pass  # Buffer management handled in except block
+    # "q16" encoders, one per set of codec options; subscribers sharing one
+    # get the same bytes, so a late joiner just forces a keyframe for all
+    encoders = {}
+
+    def subscriber_groups() -> dict:
+        # Loop thread: group subscribers by the payload they need, keyed
+        # ("json",), ("f32",) or ("q16", *codec options)
+        groups = {}
+        for sub in list(subscribers):
+            fmt = frame_formats.get(sub, "json")
+            key = (fmt,)
+            if fmt == "q16":
+                codec = frame_codecs.get(sub) or FrameCodecOptions()
+                key = (fmt, *codec.model_dump().values())
+                encoder = encoders.get(key)
+                if encoder is None:
+                    encoder = encoders[key] = framing.QuantizedFrameEncoder(
+                        mag_error_db=codec.magErrorDb,
+                        phase_error_deg=codec.phaseErrorDeg,
+                        coh_error=codec.cohError,
+                        ir_error=codec.irError,
+                        keyframe_interval=codec.keyframeInterval,
+                    )
+                if frame_encoders.get(sub) is not encoder:
+                    frame_encoders[sub] = encoder
+                    encoder.request_keyframe()
+            groups.setdefault(key, []).append(sub)
+        return groups
+
+    def analyze_frame(snapshot: np.ndarray, pos: int, formats) -> dict:
+        # Worker thread: analyze once, then encode the frame once per format
+        # key in ``formats`` (see subscriber_groups). Returns {key: payload}.
+        results = dsp.compute_metrics_batch(
+            snapshot, config, stream_pos=pos, estimate_delay=False, arrays=True, analyzer=analyzer,
+        )
+        tf_arrays, spl_data, _ = results[0]
+        status = dsp.delay_status(analyzer=analyzer)
+        applied = status["applied_ms"]
+        latency_ms = float(stream.latency[0] if isinstance(stream.latency, tuple) else stream.latency)*1000.0 if hasattr(stream, "latency") else 0.0
+        ts = int(time.time() * 1000)
+        per_channel = None
+        if config.measChans:
+            per_channel = [
+                framing.ChannelArrays(ch, ch_tf, ch_spl, ch_delay, st["mode"], st["confidence"])
+                for ch, st, (ch_tf, ch_spl, ch_delay) in zip(meas_chans, dsp.delay_states(meas_chans, analyzer), results)
+            ]
+
+        payloads = {}
+        with analyzer.timings.time("serialize"):
+            for key in formats:
+                if key[0] == "json":
+                    payloads[key] = frame_json(tf_arrays, spl_data, applied, latency_ms, ts, status, per_channel)
+                    continue
+                encode = framing.encode_frame_f32 if key[0] == "f32" else encoders[key].encode
+                payloads[key] = encode(
+                    tf_arrays, spl_data,
+                    delay_ms=applied,
+                    latency_ms=latency_ms,
+                    ts=ts,
+                    sample_rate=fs,
+                    delay_mode=status["mode"],
+                    delay_confidence=status["confidence"],
+                    meas_chan=meas_chans[0],
+                    channels=per_channel,
+                )
+        return payloads
+
+    def frame_json(tf_arrays, spl_data, applied, latency_ms, ts, status, per_channel) -> str:
+        channels = None
+        if per_channel is not None:
+            channels = [
+                ChannelFrame(
+                    measChan=c.meas_chan,
+                    tf=c.tf.to_tfdata(),
+                    spl=c.spl,
+                    delay_ms=c.delay_ms,
+                    delay_mode=c.delay_mode,
+                    delay_confidence=c.delay_confidence,
+                )
+                for c in per_channel
+            ]
+        frame = FrameMessage(
+            type="frame",
+            tf=tf_arrays.to_tfdata(),
+            spl=spl_data,
+            delay_ms=applied,              # show applied, not local variable
+            latency_ms=latency_ms,
+            ts=ts,
+            sampleRate=fs,
+            delay_mode=status["mode"],
+            applied_delay_ms=applied,
+            delay_confidence=status["confidence"],
+            channels=channels,
+        )
+        return frame.model_dump_json()
+
+    async def analyze_and_send(snapshot: np.ndarray, pos: int) -> bool:
+        # Runs analyze_frame on the analysis worker and fans each payload out
+        # to its subscribers; returns False once none are left so the capture
+        # loop can stop.
+        started = time.perf_counter()
+        groups = subscriber_groups()
+        payloads = await loop.run_in_executor(analysis_executor, analyze_frame, snapshot, pos, list(groups))
+        sending = time.perf_counter()
+        await asyncio.gather(*(broadcast(session, subs, payloads[key]) for key, subs in groups.items()))
+        done = time.perf_counter()
+        analyzer.timings.add("send", done - sending, done)
+        analyzer.timings.add("frame", done - started, done)
+        frames_sent[0] += 1
+        return bool(subscribers)
+
+    async def ingest_hops(tail: np.ndarray, pos: int) -> bool:
+        # Between frames: fold new hops into the running spectra on the same
+        # worker (it owns the spectra ring), so a frame has little left to do
+        await loop.run_in_executor(
+            analysis_executor, dsp.ingest_spectra, tail, config, pos, buffer_len, meas_chans, analyzer,
+        )
+        return True
+
+    frames_sent = [0]
+    started_at = time.monotonic()
+
+    def stats_message() -> StatsMessage:
+        # Loop thread: the counters are read while the callback and workers
+        # keep updating them, which is fine for monitoring
+        return StatsMessage(
+            type="stats",
+            sessionId=session.id,
+            ts=int(time.time() * 1000),
+            uptimeS=time.monotonic() - started_at,
+            stages=analyzer.timings.summary(),
+            callback=callback_times.summary(),
+            callbackPeriodMs=1000.0 * callback_frames[0] / float(config.sampleRate),
+            queueFrames=ring.available() if ring is not None else 0,
+            queueCapacity=ring.capacity if ring is not None else 0,
+            overruns=ring.overruns if ring is not None else 0,
+            droppedFrames=ring.dropped_frames if ring is not None else 0,
+            outputUnderruns=output_underrun_count[0],
+            callbackStatusFlags=callback_status_count[0],
+            framesSent=frames_sent[0],
+            rssBytes=dsp.process_rss_bytes(),
+            caches=dsp.cache_sizes(analyzer),
+        )
+
+    def delay_snapshot() -> list:
+        return [
+            {"measChan": ch, **dsp.delay_status(st)}
+            for ch, st in zip(meas_chans, dsp.delay_states(meas_chans, analyzer))
+        ]
+
+    async def close_recorder():
+        # Drains the writer's backlog, so off the loop; subscribers get the final status
+        await loop.run_in_executor(None, recorder.close, delay_snapshot())
+        await broadcast(session, list(subscribers), recorder.status().model_dump_json())
 
     stream = None
+    recorder = None
+    delay_task = None
+    analysis_task = None
+    # NumPy/FFT work releases the GIL, so the loop keeps serving pings,
+    # control messages and the audio queue while a frame is analyzed
+    analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+    delay_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="delay")
     try:
         fs = int(config.sampleRate)
         nperseg = int(config.nfft)
         max_delay_ms = int(getattr(config, "maxDelayMs", 2000))
-        max_lag_samples = int(np.ceil(fs * max_delay_ms / 1000.0))
 
-        buffer_len = nperseg + 2*max_lag_samples + int(0.75*nperseg)
+        buffer_len = dsp.analysis_window_len(config)
         noverlap = int(0.75 * nperseg)
         hop_size = nperseg - noverlap
 
-        analysis_buffer = np.zeros((buffer_len, num_channels), dtype=np.float32)
-        carry = 0  # how many new samples since last analysis
-        last_send = 0.0
-        target_fps = 20.0  # UI update rate
-        send_interval = 1.0 / target_fps
+        # Analysis window: jobs on the worker read it in place, while the
+        # loop appends up to its slack before it has to wait for them
+        history = MirroredHistory(
+            buffer_len, num_channels, max(int(HISTORY_SLACK_SECONDS * fs), 2 * hop_size)
+        )
+        # Callback -> loop hand-off: wakes the loop once per hop and holds
+        # RING_SECONDS of audio while analysis or the loop falls behind
+        ring = SampleRing(max(int(RING_SECONDS * fs), 4 * hop_size), num_channels, hop_size, loop)
+        stream_pos = buffer_len  # absolute sample index just past the window end
+        frame_pos = stream_pos   # stream_pos of the last frame's snapshot
+        ingest_pos = stream_pos  # stream_pos the spectra ring was last advanced to
+        job_pos = stream_pos     # stream_pos the in-flight job's window view ends at
+
+        # Optional raw recording, fed from the loop and written on its own thread
+        if config.record is not None:
+            recorder = Recorder(config, num_channels, session.id)
+        session.stats = stats_message
+        stats_due: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        last_recording_send = 0.0
+        last_frame_time = 0.0
+        send_interval = 1.0 / float(config.targetFps)
+
+        # Signal gate: per-block level/crest check on ref + meas. After
+        # gateHoldMs of failing blocks analysis (and delay estimation) pause,
+        # the last frame stays on screen and a light "gated" status is sent.
+        gate_enabled = config.gateRmsDbfs is not None
+        gate_hold_samples = int(fs * config.gateHoldMs / 1000.0)
+        gate_ref_col = config.refChan - 1
+        gate_meas_cols = [ch - 1 for ch in meas_chans]
+        gate_fail_samples = 0
+        gate_status = (None, None, None)  # (reason, ref_dbfs, meas_dbfs) of the latest block
+        gated = False
+        # Set at a gate transition: the running spectra describe the signal before it
+        spectra_stale = False
+        last_gated_send = 0.0
+        gated_status_interval = 1.0
 
         # Device channels: input={in_channels}, output={out_channels}
 
@@ -409,103 +828,164 @@ async def run_capture(ws, config: CaptureConfig):
             if use_generator:
                 pass  # Generator unavailable for input-only device
 
+        delay_task = asyncio.create_task(run_delay_estimation())
+
         while True:
-            # wait for at least one block
-            block = await aq.get()
-
-            # Process blocks one at a time to avoid memory spikes
-            # Limit how many we drain at once
-            max_drain = 4
-            blocks_to_process = [block]
-            drain_count = 0
-            while drain_count < max_drain:
-                try:
-                    blocks_to_process.append(aq.get_nowait())
-                    drain_count += 1
-                except asyncio.QueueEmpty:
-                    break
+            # woken by the audio callback once a hop's worth is pending
+            await ring.wait()
+            trace = session.trace
+            # Frames taken this pass: the callback keeps writing, and blocks
+            # it adds after this check wait in the ring for the next one
+            available = ring.available()
+            if analysis_task is not None and stream_pos + available - job_pos > history.slack:
+                # appending now would overwrite what the in-flight job reads
+                waited = time.perf_counter()
+                await asyncio.wait([analysis_task])
+                if trace is not None:
+                    trace.span("history wait", waited, time.perf_counter())
+            dequeued = time.perf_counter() if trace is not None else 0.0
+            pending = ring.pending(available)
 
-            # roll each block into the analysis buffer without concatenating
-            for b in blocks_to_process:
+            # append the pending audio to the analysis window
+            for b in pending:
                 Lb = b.shape[0]
-                if Lb >= buffer_len:
-                    analysis_buffer[...] = b[-buffer_len:, :]
-                    carry = hop_size  # force analysis
-                elif Lb > 0:
-                    analysis_buffer[:-Lb, :] = analysis_buffer[Lb:, :]
-                    analysis_buffer[-Lb:, :] = b
-                    carry += Lb
-                
-                # Always return buffer to pool
-                if len(pool) < max_pool_size:
-                    try:
-                        pool.append(b)
-                    except Exception:
-                        pass
-                # If pool is full, let GC collect the buffer
+                if gate_enabled and Lb > 0:
+                    gate_status = dsp.signal_gate(
+                        b, gate_ref_col, gate_meas_cols, config.gateRmsDbfs, config.gateMaxCrestDb
+                    )
+                    gate_fail_samples = gate_fail_samples + Lb if gate_status[0] else 0
+                appended = time.perf_counter() if trace is not None else 0.0
+                history.append(b)
+                if trace is not None:
+                    trace.span("history append", appended, time.perf_counter(), Lb)
+                if recorder is not None:
+                    recorder.write(b)
+                stream_pos += Lb
+            released = sum(b.shape[0] for b in pending)
+            ring.release(released)
+            if trace is not None:
+                trace.span("dequeue", dequeued, time.perf_counter(), released)
 
-            # Periodic GC hint and pool health check
+            # Periodic GC hint
             now = time.monotonic()
             if now - last_gc_time > gc_interval:
                 gc.collect(0)  # Collect only generation 0 (fast)
                 last_gc_time = now
-                # Log pool health if we've had misses
-                if pool_miss_count > 0:
-                    pass  # Pool health tracked
-                    pool_miss_count = 0
 
             # Log dropped frames periodically
-            if dropped_frames > 0 and (now - last_drop_log_time > drop_log_interval or dropped_frames % 1000 == 0):
+            if ring.overruns > 0 and now - last_drop_log_time > drop_log_interval:
                 pass  # Frame drops tracked
                 last_drop_log_time = now
 
-            # run analysis only when we've advanced by one hop
-            if carry >= hop_size:
-                tf_data, spl_data, delay_ms = dsp.compute_metrics(analysis_buffer, config)
-                now = time.monotonic()
-                if now - last_send >= send_interval:
-                    status = dsp.delay_status()
-                    applied = status["applied_ms"]
-
-                    # Check if WebSocket is still open before sending
-                    if ws.state == protocol.State.OPEN:
-                        try:
-                            frame = FrameMessage(
-                                type="frame",
-                                tf=tf_data,
-                                spl=spl_data,
-                                delay_ms=applied,              # show applied, not local variable
-                                latency_ms=float(stream.latency[0] if isinstance(stream.latency, tuple) else stream.latency)*1000.0 if hasattr(stream, "latency") else 0.0,
-                                ts=int(time.time() * 1000),
-                                sampleRate=fs,
-                                delay_mode=status["mode"],
-                                applied_delay_ms=applied,
-                            )
-                            await ws.send(frame.model_dump_json())
-                            last_send = now
-                        except websockets.exceptions.ConnectionClosed:
-                            pass  # Connection closed during send
-                            break  # Exit the capture loop
-                    else:
-                        # WebSocket not open, stopping
-                        break
-                carry -= hop_size
+            # Recording progress, including how far the disk writer lags
+            if recorder is not None and now - last_recording_send >= RECORDING_STATUS_INTERVAL:
+                last_recording_send = now
+                if recorder.active:
+                    await broadcast(session, list(subscribers), recorder.status().model_dump_json())
+                else:
+                    # the writer failed; measuring goes on without it
+                    await close_recorder()
+                    recorder = None
+
+            # Periodic stats for the subscribers that asked for them
+            if session.stats_intervals:
+                # (get_stats itself answered right away; the first push follows one interval later)
+                intervals = list(session.stats_intervals.items())
+                due = [sub for sub, interval in intervals if now >= stats_due.setdefault(sub, now + interval)]
+                if due:
+                    for sub in due:
+                        stats_due[sub] = now + session.stats_intervals.get(sub, STATS_MIN_INTERVAL)
+                    await broadcast(session, due, stats_message().model_dump_json())
+
+            # A finished analysis job either sent its frame or found the
+            # connection gone; surface errors from the worker here
+            if analysis_task is not None and analysis_task.done():
+                connection_open = analysis_task.result()
+                analysis_task = None
+                if not connection_open:
+                    break
+
+            # Gate transitions and the periodic "still gated" status
+            now_gated = gate_enabled and gate_fail_samples >= gate_hold_samples
+            if now_gated != gated or (gated and now - last_gated_send >= gated_status_interval):
+                spectra_stale = spectra_stale or now_gated != gated
+                gated = now_gated
+                last_gated_send = now
+                reason, ref_db, meas_db = gate_status
+                await broadcast(session, list(subscribers), GatedMessage(
+                    type="gated",
+                    gated=gated,
+                    reason=reason if gated else None,
+                    ref_dbfs=ref_db,
+                    meas_dbfs=meas_db,
+                    ts=int(time.time() * 1000),
+                ).model_dump_json())
+                if not subscribers:
+                    break
+            if spectra_stale and analysis_task is None:
+                # between jobs, so no worker is folding segments into the ring
+                analyzer.spectra.reset()
+                spectra_stale = False
+            if gated:
+                # hold the last frame; nothing to analyze until the gate reopens
+                frame_pos = ingest_pos = stream_pos
+                await asyncio.sleep(0)
+                continue
+
+            # One job at a time on the worker, always on the newest audio. A
+            # full frame (smoothing, IR, encoding) only when one is due at
+            # targetFps and at least a hop arrived since the last; otherwise
+            # idle worker time absorbs new hops into the spectra ring.
+            if analysis_task is None:
+                if stream_pos - frame_pos >= hop_size and now - last_frame_time >= send_interval:
+                    frame_pos = ingest_pos = job_pos = stream_pos
+                    # keep the average at targetFps even though frames can
+                    # only start when an audio block arrives
+                    last_frame_time = max(last_frame_time + send_interval, now - send_interval)
+                    analysis_task = asyncio.create_task(
+                        analyze_and_send(history.window(), stream_pos)
+                    )
+                elif stream_pos - ingest_pos >= hop_size:
+                    tail_len = min(buffer_len, dsp.spectra_tail_len(config, stream_pos - ingest_pos, meas_chans, analyzer))
+                    ingest_pos = job_pos = stream_pos
+                    analysis_task = asyncio.create_task(
+                        ingest_hops(history.window(tail_len), stream_pos)
+                    )
 
             await asyncio.sleep(0)
     except asyncio.CancelledError:
         pass  # Task cancelled
     except Exception as e:
         print(f"Error during capture: {e}")
-        # Only send error if connection is still open
-        if ws.state == protocol.State.OPEN:
-            try:
-                await send_error(ws, f"Capture failed: {e}")
-            except websockets.exceptions.ConnectionClosed:
-                pass  # Connection already closed, can't send error
+        # Tell every subscriber still connected
+        try:
+            await broadcast(session, list(subscribers), json.dumps(
+                ErrorMessage(type="error", message=f"Capture failed: {e}").dict()
+            ))
+        except Exception:
+            pass  # Best effort; the capture is ending anyway
     finally:
-        # Clean up buffer pool and DSP caches
-        pool.clear()
-        dsp.clear_dsp_caches()
+        for task in (delay_task, analysis_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        # Let in-flight jobs finish before the DSP caches are cleared
+        delay_executor.shutdown(wait=True)
+        analysis_executor.shutdown(wait=True)
+        for sub, enc in list(frame_encoders.items()):
+            if enc in encoders.values():
+                frame_encoders.pop(sub, None)
+
+        # Clean up DSP caches; the shared ones only once no other session
+        # is using them
+        if sessions.get(session.id) is session:
+            del sessions[session.id]
+        analyzer.clear_caches()
+        if not sessions:
+            dsp.clear_dsp_caches()
 
         # Force comprehensive garbage collection
         gc.collect()
@@ -519,17 +999,36 @@ async def run_capture(ws, config: CaptureConfig):
         except Exception:
             pass
 
-        # Only send stopped message if connection is still open
-        if ws.state == protocol.State.OPEN:
+        if recorder is not None:
             try:
-                await ws.send(json.dumps(StoppedMessage(type="stopped").dict()))
-            except websockets.exceptions.ConnectionClosed:
-                pass  # Connection closed, can't send stopped message
+                await close_recorder()
+            except Exception as e:
+                print(f"Error finishing recording: {e}")
+
+        # A trace still running when the capture ends is written out
+        if session.trace is not None:
+            try:
+                await broadcast(session, list(subscribers), (await session.finish_trace()).model_dump_json())
+            except Exception as e:
+                print(f"Error finishing trace: {e}")
+
+        # Subscribers still attached (capture ended on its own) learn it stopped
+        try:
+            await broadcast(session, list(subscribers), json.dumps(StoppedMessage(type="stopped").dict()))
+        except Exception:
+            pass  # Best effort; nothing left to clean up
+        for sub in list(subscribers):
+            if client_sessions.get(sub) is session:
+                del client_sessions[sub]
+        subscribers.clear()
 
         # Log final dropped frames count if any
-        if dropped_frames > 0:
+        if ring is not None and ring.dropped_frames > 0:
             pass  # Capture completed
 
+async def send_snapshots(ws):
+    await ws.send(SnapshotsMessage(type="snapshots", snapshots=snapshot_store.list()).model_dump_json())
+
 async def send_error(ws, error_message: str):
     error_msg = ErrorMessage(type="error", message=error_message)
     await ws.send(json.dumps(error_msg.dict()))
@@ -564,16 +1063,9 @@ async def handler(ws):
     except Exception as e:
         print(f"Unexpected error in WebSocket handler: {e}")
     finally:
-        # Ensure cleanup happens in all error paths
-        global capture_task
-        if capture_task and not capture_task.done():
-            capture_task.cancel()
-            # Wait for task to actually finish
-            try:
-                await capture_task
-            except asyncio.CancelledError:
-                pass  # Expected when task is cancelled
-            capture_task = None
+        # Ensure cleanup happens in all error paths; the capture keeps
+        # running while other subscribers are still watching
+        await detach_subscriber(ws)
         # WeakSet automatically removes disconnected clients, but we ensure removal
         try:
             connected_clients.discard(ws)  # Use discard to avoid KeyError
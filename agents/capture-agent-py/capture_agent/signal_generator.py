@@ -29,6 +29,7 @@ class GeneratorConfig:
     start_freq: float = 20.0  # Hz
     end_freq: float = 20000.0  # Hz
     sweep_duration: float = 1.0  # seconds
+    prerender_sweep: bool = True  # render one sweep period up front, play it as a loop
     # Noise specific
     noise_color: Optional[float] = None  # Beta parameter for colorednoise
     # General
@@ -41,11 +42,19 @@ class SignalGenerator:
         self.config = config
         self.sample_rate = config.sample_rate
         self.phase = 0.0  # For sine wave continuity
-        self.sweep_phase = 0.0  # For sweep continuity
         self.sweep_start_time = 0.0
-        self.current_time = 0.0
         self._initialized = False
 
+        # Sweep: samples played so far (the phase is a function of it) and
+        # the rendered period, if pre-rendered
+        self._sweep_pos = 0
+        self._sweep_len = 0
+        self._sweep_rate = 0.0
+        self._sweep_scale = 0.0
+        self._sweep_table = None
+        if self.config.signal_type == SignalType.SINE_SWEEP:
+            self._prepare_sweep()
+
         # Map noise types to beta values for colorednoise
         self.noise_beta_map = {
             SignalType.WHITE_NOISE: 0,     # 1/f^0
@@ -164,45 +173,71 @@ class SignalGenerator:
 
         return signal.astype(np.float32)
 
-    def _generate_sine_sweep(self, block_size: int) -> np.ndarray:
-        """Generate a logarithmic sine sweep signal."""
-        t = np.arange(block_size) / self.sample_rate
-
-        # Calculate sweep parameters
-        duration = self.config.sweep_duration
-        f0 = self.config.start_freq
-        f1 = self.config.end_freq
-
-        # Create time array relative to sweep start
-        sweep_times = t + self.current_time
-
-        # Reset sweep when we reach the end
-        sweep_times = np.fmod(sweep_times, duration)
-
-        # Logarithmic frequency sweep
-        # f(t) = f0 * (f1/f0)^(t/T)
-        k = np.log(f1 / f0) / duration
-        frequencies = f0 * np.exp(k * sweep_times)
+    def _prepare_sweep(self):
+        """Fix the sweep's period and phase function; optionally render one period.
 
-        # Generate swept sine using phase accumulation for continuity
-        signal = np.zeros(block_size, dtype=np.float32)
-        for i in range(block_size):
-            signal[i] = np.sin(self.sweep_phase)
-            # Update phase based on instantaneous frequency
-            self.sweep_phase += 2 * np.pi * frequencies[i] / self.sample_rate
-
-            # Reset phase when sweep restarts
-            if i > 0 and sweep_times[i] < sweep_times[i-1]:
-                self.sweep_phase = 0.0
-
-        # Keep phase within bounds
-        self.sweep_phase = np.fmod(self.sweep_phase, 2 * np.pi)
+        The logarithmic sweep f(t) = f0 * exp(t / L), L = T / ln(f1 / f0), has
+        the closed-form phase 2*pi*f0*L*(exp(t / L) - 1), which reaches
+        2*pi*L*(f1 - f0) at t = T. The end frequency is nudged (by a few Hz at
+        most) so that is a whole number of cycles: every sweep then starts
+        where the previous one ended, and the signal is exactly periodic in
+        T = round(sweep_duration * fs) samples.
+        """
+        fs = float(self.sample_rate)
+        n = max(2, int(round(self.config.sweep_duration * fs)))
+        T = n / fs
+        f0 = float(self.config.start_freq)
+        f1 = float(self.config.end_freq)
+        self._sweep_len = n
+
+        if abs(f1 - f0) < 1e-6 * f0:
+            # Degenerate sweep: a tone with a whole number of cycles per period
+            cycles = max(1, round(f0 * T))
+            self._sweep_rate = 0.0
+            self._sweep_scale = 2 * np.pi * cycles / T
+        else:
+            def cycles_at(f):  # cycles per sweep ending at f
+                return T * (f - f0) / np.log(f / f0)
+
+            target = max(1, round(cycles_at(f1)))
+            for _ in range(20):  # Newton on the end frequency; cycles_at is smooth and monotonic
+                lr = np.log(f1 / f0)
+                slope = T * (lr - (f1 - f0) / f1) / lr**2
+                step = (cycles_at(f1) - target) / slope
+                f1 -= step
+                if abs(step) < 1e-9 * f1:
+                    break
+            L = T / np.log(f1 / f0)
+            self._sweep_rate = 1.0 / (L * fs)  # exponent per sample
+            self._sweep_scale = 2 * np.pi * f0 * L
+
+        self._sweep_table = None
+        if self.config.prerender_sweep:
+            self._sweep_table = self._render_sweep(np.arange(n))
+
+    def _render_sweep(self, index: np.ndarray) -> np.ndarray:
+        """Sweep samples at positions ``index`` (0 <= index < period)."""
+        if self._sweep_rate == 0.0:
+            phase = self._sweep_scale * (index / float(self.sample_rate))
+        else:
+            phase = self._sweep_scale * np.expm1(self._sweep_rate * index)
+        return np.sin(phase).astype(np.float32)
 
-        # Update current time
-        self.current_time += block_size / self.sample_rate
-        if self.current_time >= duration:
-            self.current_time = np.fmod(self.current_time, duration)
+    def _generate_sine_sweep(self, block_size: int) -> np.ndarray:
+        """Generate a logarithmic sine sweep signal."""
+        if self._sweep_len == 0:
+            self._prepare_sweep()
+        n = self._sweep_len
+        p = self._sweep_pos
+
+        if self._sweep_table is not None:
+            # Loop the rendered period, like the noise table (no seam to hide)
+            idx = (p + np.arange(block_size)) % n
+            signal = self._sweep_table[idx]
+        else:
+            signal = self._render_sweep((p + np.arange(block_size)) % n)
 
+        self._sweep_pos = (p + block_size) % n
         return signal
 
     def _generate_colored_noise(self, block_size: int) -> np.ndarray:
@@ -263,7 +298,6 @@ class SignalGenerator:
     def reset(self):
         """Reset generator state (phases, etc)."""
         self.phase = 0.0
-        self.sweep_phase = 0.0
-        self.current_time = 0.0
+        self._sweep_pos = 0
         self.sweep_start_time = 0.0
         self._noise_pos = 0  # Reset noise table position
\ No newline at end of file
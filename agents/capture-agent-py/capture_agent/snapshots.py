@@ -0,0 +1,131 @@
+"""
+Measurement snapshots: the raw averaged spectra behind a frame.
+
+A frame's display values (smoothed dB, phase, coherence) cannot be averaged
+across microphone positions without bias; the spectra they come from can.
+``SnapshotStore`` keeps ``dsp.CrossSpectra`` of chosen frames on disk, one
+``<id>.npz`` per snapshot (float32 ``Pxx``/``Pyy``, complex64 ``Pxy``,
+``freqs``) plus an ``index.json`` listing them, and averages any subset with
+``dsp.average_spectra``: every measurement channel of every snapshot is one
+position, stacked into ``(P, bins)`` arrays and averaged in one pass.
+"""
+import datetime
+import json
+import pathlib
+import threading
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import dsp
+from .schema import SnapshotInfo, TFData
+
+SNAPSHOTS_DIR = pathlib.Path.home() / ".sounddocs-agent" / "snapshots"
+
+
+class SnapshotStore:
+    """Snapshots under ``directory``, indexed by ``index.json``.
+
+    Methods are called from the event loop and from worker threads (file
+    I/O and averaging run off the loop), so the index is guarded by a lock.
+    Errors the client can fix (unknown ids, snapshots of different FFT
+    sizes) raise ``ValueError``.
+    """
+
+    def __init__(self, directory: pathlib.Path = SNAPSHOTS_DIR):
+        self.directory = pathlib.Path(directory)
+        self._index_path = self.directory / "index.json"
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, dict]] = None
+
+    def _entries(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                items = json.loads(self._index_path.read_text())
+            except (OSError, ValueError):
+                items = []
+            self._index = {item["id"]: item for item in items}
+        return self._index
+
+    def _write_index(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self._index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(list(self._entries().values()), indent=2))
+        tmp.replace(self._index_path)
+
+    def list(self) -> List[SnapshotInfo]:
+        with self._lock:
+            return [SnapshotInfo(**item) for item in self._entries().values()]
+
+    def save(self, spectra: dsp.CrossSpectra, sample_rate: int, name: Optional[str] = None) -> SnapshotInfo:
+        created = datetime.datetime.now().astimezone()
+        info = SnapshotInfo(
+            id=uuid.uuid4().hex[:8],
+            name=name or f"{created:%Y-%m-%d %H:%M:%S}",
+            created=created.isoformat(),
+            sampleRate=int(sample_rate),
+            nfft=2 * (len(spectra.freqs) - 1),
+            measChans=list(spectra.meas_chans),
+            delaysMs=[float(d) for d in spectra.delays_ms],
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            self.directory / f"{info.id}.npz",
+            freqs=spectra.freqs.astype(np.float32),
+            Pxx=spectra.Pxx.astype(np.float32),
+            Pyy=spectra.Pyy.astype(np.float32),
+            Pxy=spectra.Pxy.astype(np.complex64),
+        )
+        with self._lock:
+            self._entries()[info.id] = info.model_dump()
+            self._write_index()
+        return info
+
+    def delete(self, snapshot_id: str) -> bool:
+        with self._lock:
+            if self._entries().pop(snapshot_id, None) is None:
+                return False
+            self._write_index()
+        (self.directory / f"{snapshot_id}.npz").unlink(missing_ok=True)
+        return True
+
+    def load(self, ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """``freqs`` and ``(P, bins)`` ``Pxx``, ``Pyy``, ``Pxy`` of the snapshots' positions."""
+        with self._lock:
+            entries = self._entries()
+            unknown = [i for i in ids if i not in entries]
+        if unknown:
+            raise ValueError(f"Unknown snapshot(s): {', '.join(unknown)}")
+        if not ids:
+            raise ValueError("No snapshots selected")
+
+        freqs = None
+        Pxx, Pyy, Pxy = [], [], []
+        for snapshot_id in ids:
+            with np.load(self.directory / f"{snapshot_id}.npz") as f:
+                if freqs is None:
+                    freqs = f["freqs"]
+                elif f["freqs"].shape != freqs.shape or not np.allclose(f["freqs"], freqs):
+                    raise ValueError(f"Snapshot {snapshot_id} has a different frequency grid")
+                pyy = np.atleast_2d(f["Pyy"])
+                Pxx.append(np.broadcast_to(f["Pxx"], pyy.shape))
+                Pyy.append(pyy)
+                Pxy.append(np.atleast_2d(f["Pxy"]))
+        return freqs.astype(np.float64), np.concatenate(Pxx), np.concatenate(Pyy), np.concatenate(Pxy)
+
+    def average(
+        self,
+        ids: Sequence[str],
+        mode: str = "power",
+        coherence_weighted: bool = True,
+        points_per_octave: int = 48,
+        ir_length: int = 4096,
+    ) -> Tuple[TFData, int]:
+        """Spatial average of the snapshots' positions as ``TFData``, and the position count."""
+        freqs, Pxx, Pyy, Pxy = self.load(ids)
+        positions = Pxy.shape[0]
+        Pxx, Pyy, Pxy = dsp.average_spectra(Pxx, Pyy, Pxy, mode, coherence_weighted)
+        # A private analyzer: the IR work array must not be a capture's
+        tf = dsp.spectra_to_tf(freqs, Pxx, Pyy, Pxy, points_per_octave, dsp.Analyzer(), ir_length)[0]
+        return tf.to_tfdata(), positions
@@ -0,0 +1,91 @@
+"""
+Timing statistics of a capture.
+
+``DurationRing`` keeps the newest durations of one recurring step in a
+preallocated array, so the audio callback can record its own run time
+without allocating. ``StageTimings`` holds one ring per named stage of the
+analysis ("delay", "spectra", "smoothing", "ir", ...); the DSP code records
+into its ``Analyzer``'s, the server adds serialization and send times.
+While a trace is running every stage run is also recorded as a span.
+Summaries are read on the event loop while the workers keep recording;
+a summary that misses the newest sample or two is fine for monitoring.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+
+from .schema import StageTiming
+from .tracing import TraceRing
+
+# Durations each summary's percentiles are taken over
+DURATION_HISTORY = 512
+
+
+class DurationRing:
+    """The newest ``size`` durations (seconds) of one step, and how many there were."""
+
+    def __init__(self, size: int = DURATION_HISTORY):
+        self._buf = np.zeros(int(size), dtype=np.float64)
+        self.count = 0
+
+    def add(self, seconds: float):
+        self._buf[self.count % self._buf.size] = seconds
+        self.count += 1
+
+    def summary(self) -> StageTiming:
+        n = min(self.count, self._buf.size)
+        if n == 0:
+            return StageTiming(count=0, meanMs=0.0, p50Ms=0.0, p95Ms=0.0, p99Ms=0.0, maxMs=0.0)
+        ms = self._buf[:n] * 1000.0
+        p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+        return StageTiming(
+            count=self.count,
+            meanMs=float(ms.mean()),
+            p50Ms=float(p50),
+            p95Ms=float(p95),
+            p99Ms=float(p99),
+            maxMs=float(ms.max()),
+        )
+
+
+class StageTimings:
+    """A ``DurationRing`` per stage name, created on first use."""
+
+    def __init__(self):
+        self._stages: Dict[str, DurationRing] = {}
+        self._lock = threading.Lock()
+        # Set while the capture is traced
+        self.trace: Optional[TraceRing] = None
+
+    def add(self, stage: str, seconds: float, end: Optional[float] = None):
+        """Record one run of ``stage``, ending at ``end`` (default: now)."""
+        ring = self._stages.get(stage)
+        if ring is None:
+            with self._lock:
+                ring = self._stages.setdefault(stage, DurationRing())
+        ring.add(seconds)
+        trace = self.trace
+        if trace is not None:
+            end = time.perf_counter() if end is None else end
+            trace.span(stage, end - seconds, end)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(stage, end - start, end)
+
+    def summary(self) -> Dict[str, StageTiming]:
+        with self._lock:
+            stages = list(self._stages.items())
+        return {name: ring.summary() for name, ring in stages}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
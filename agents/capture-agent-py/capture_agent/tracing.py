@@ -0,0 +1,91 @@
+"""
+Per-frame trace timeline of a capture.
+
+``TraceRing`` records timestamped spans from every thread that touches a
+capture (the audio callback, the event loop, the analysis and delay
+workers) into preallocated arrays; once full, the oldest spans are
+overwritten. ``export`` writes them as Chrome trace-event JSON, which
+chrome://tracing, Perfetto and speedscope open, to see how the callback,
+the loop and the analysis interleave frame by frame.
+
+Recording a span is a slot reservation (``next`` on a shared counter, atomic
+under the GIL) and a few array stores, cheap enough for the audio callback.
+Captures only record while a trace is running.
+"""
+import datetime
+import itertools
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Dict
+
+import numpy as np
+
+TRACES_DIR = pathlib.Path.home() / ".sounddocs-agent" / "traces"
+DEFAULT_TRACE_SPANS = 65536
+
+
+class TraceRing:
+    """The newest ``capacity`` spans: name, thread, start, duration and one integer argument."""
+
+    def __init__(self, capacity: int = DEFAULT_TRACE_SPANS):
+        self.capacity = int(capacity)
+        self._names = [""] * self.capacity
+        self._start = np.zeros(self.capacity, dtype=np.float64)
+        self._dur = np.zeros(self.capacity, dtype=np.float64)
+        self._tid = np.zeros(self.capacity, dtype=np.int64)
+        self._arg = np.full(self.capacity, -1, dtype=np.int64)
+        self._next = itertools.count()
+        self.recorded = 0
+        self.origin = time.perf_counter()
+
+    def span(self, name: str, start: float, end: float, arg: int = -1):
+        """Record ``name`` running from ``start`` to ``end`` (``time.perf_counter`` seconds)."""
+        n = next(self._next)
+        i = n % self.capacity
+        self._names[i] = name
+        self._start[i] = start
+        self._dur[i] = end - start
+        self._tid[i] = threading.get_ident()
+        self._arg[i] = arg
+        self.recorded = n + 1
+
+    def export(self, path: pathlib.Path) -> int:
+        """Write the recorded spans as Chrome trace-event JSON; returns how many."""
+        n = min(self.recorded, self.capacity)
+        order = np.argsort(self._start[:n], kind="stable")
+        pid = os.getpid()
+        events = []
+        first_span: Dict[int, str] = {}
+        for i in order.tolist():
+            tid = int(self._tid[i])
+            first_span.setdefault(tid, self._names[i])
+            event = {
+                "name": self._names[i],
+                "ph": "X",
+                "ts": (self._start[i] - self.origin) * 1e6,
+                "dur": self._dur[i] * 1e6,
+                "pid": pid,
+                "tid": tid,
+            }
+            if self._arg[i] >= 0:
+                event["args"] = {"frames": int(self._arg[i])}
+            events.append(event)
+
+        # Threads Python started have names; the audio driver's does not
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, span_name in first_span.items():
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": names.get(tid, f"{span_name} thread")},
+            })
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        return n
+
+
+def trace_path(session_id: str, directory: pathlib.Path = TRACES_DIR) -> pathlib.Path:
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return directory / f"trace-{stamp}-{session_id}.json"
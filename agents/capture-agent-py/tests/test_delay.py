@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+from capture_agent import dsp
+
+FS = 48000
+
+
+def _delayed(n, lag, rng, dtype=np.float64):
+    """Filtered noise ``ref`` and ``meas[t] = 0.5 * ref[t - lag]`` plus a little noise."""
+    src = lfilter([1.0, -0.6], [1.0, -0.3], rng.standard_normal(n + abs(lag)))
+    if lag >= 0:
+        ref, meas = src[lag:lag + n], src[:n]
+    else:
+        ref, meas = src[:n], src[-lag:-lag + n]
+    meas = 0.5 * meas + 0.01 * rng.standard_normal(n)
+    return ref.astype(dtype), meas.astype(dtype)
+
+
+@pytest.mark.parametrize("lag", [0, 7, -7, 240, -1000, 4800])
+@pytest.mark.parametrize("n", [8192, 96000])
+def test_find_delay_known_lag(lag, n):
+    # n=8192 runs the single full-rate pass, 96000 the coarse-to-fine search
+    ref, meas = _delayed(n, lag, np.random.default_rng(abs(lag) + n))
+    delay_ms, confidence = dsp.find_delay(ref, meas, FS, max_ms=2000.0)
+    assert delay_ms == pytest.approx(lag / FS * 1000.0, abs=0.05 / FS * 1000.0)
+    assert confidence > 3.0
+
+
+def test_find_delay_float32():
+    ref, meas = _delayed(96000, 240, np.random.default_rng(0), np.float32)
+    delay_ms, _ = dsp.find_delay(ref, meas, FS, max_ms=2000.0)
+    assert delay_ms == pytest.approx(5.0, abs=0.01)
+
+
+def test_find_delay_respects_max_ms():
+    ref, meas = _delayed(96000, 4800, np.random.default_rng(1))
+    delay_ms, _ = dsp.find_delay(ref, meas, FS, max_ms=20.0)
+    assert abs(delay_ms) <= 20.0 + 1e-9
+
+
+def test_freeze_during_a_delay_search_wins(monkeypatch):
+    # the delay job searches off the event loop; a freeze arriving meanwhile
+    # must not be overwritten by the estimate it superseded
+    an = dsp.Analyzer()
+
+    def slow_find_delay(*args, **kwargs):
+        dsp.delay_freeze(True, 3.0, analyzer=an)
+        return 5.0, 20.0
+
+    monkeypatch.setattr(dsp, "find_delay", slow_find_delay)
+    x = np.zeros(1024)
+    assert dsp.update_delay_estimate(x, x, FS, 200.0, analyzer=an) is None
+    assert an.delay["mode"] == "frozen"
+    assert an.delay["ema_ms"] == 3.0
+    assert dsp.delay_applied_ms(analyzer=an) == 3.0
+
+
+def test_manual_delay_during_a_tracking_search_wins(monkeypatch):
+    an = dsp.Analyzer()
+    an.delay.update(mode="tracking", ema_ms=5.0)
+
+    def slow_track_delay(*args, **kwargs):
+        dsp.delay_set_manual(1.5, analyzer=an)
+        return 5.1, 2.0  # would unlock back to "auto"
+
+    monkeypatch.setattr(dsp, "track_delay", slow_track_delay)
+    x = np.zeros(1024)
+    assert dsp.update_delay_estimate(x, x, FS, 200.0, analyzer=an) is None
+    assert an.delay["mode"] == "manual"
+    assert dsp.delay_applied_ms(analyzer=an) == 1.5
+
+
+def test_auto_locks_into_tracking_on_a_confident_peak():
+    an = dsp.Analyzer()
+    ref, meas = _delayed(8192, 240, np.random.default_rng(3))
+    for _ in range(3):
+        raw = dsp.update_delay_estimate(ref, meas, FS, 200.0, analyzer=an)
+        assert raw == pytest.approx(5.0, abs=0.01)
+        assert an.delay["mode"] == "tracking"
+        assert an.delay["confidence"] >= dsp.DELAY_LOCK_CONFIDENCE
+    assert dsp.delay_applied_ms(analyzer=an) == pytest.approx(5.0, abs=0.01)
+
+
+def test_tracking_unlocks_and_keeps_the_last_good_delay(monkeypatch):
+    an = dsp.Analyzer()
+    an.delay.update(mode="tracking", ema_ms=5.0)
+    monkeypatch.setattr(dsp, "track_delay", lambda *a, **k: (40.0, dsp.DELAY_UNLOCK_CONFIDENCE - 1.0))
+    x = np.zeros(1024)
+    assert dsp.update_delay_estimate(x, x, FS, 200.0, analyzer=an) == 40.0
+    assert an.delay["mode"] == "auto"
+    assert dsp.delay_applied_ms(analyzer=an) == 5.0
+
+
+def test_relock_on_a_new_path_drops_the_stale_average(monkeypatch):
+    an = dsp.Analyzer()
+    an.delay.update(mode="auto", ema_ms=5.0)
+    monkeypatch.setattr(dsp, "find_delay", lambda *a, **k: (12.0, dsp.DELAY_LOCK_CONFIDENCE))
+    x = np.zeros(1024)
+    dsp.update_delay_estimate(x, x, FS, 200.0, analyzer=an)
+    assert an.delay["mode"] == "tracking"
+    assert an.delay["ema_ms"] == 12.0
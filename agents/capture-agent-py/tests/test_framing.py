@@ -0,0 +1,181 @@
+import struct
+
+import numpy as np
+import pytest
+
+from capture_agent import framing
+from capture_agent.dsp import TFArrays
+from capture_agent.schema import SPLData
+
+N_FREQS = 97
+N_IR = 64
+HEADER = struct.Struct("<4sHHdfffffIIIBBHI")
+Q_HEADER = struct.Struct("<4sHHdfffffIIIBBHII")
+CHANNEL_HEADER = struct.Struct("<HBxffff")
+
+
+def _tf(rng):
+    freqs = np.geomspace(20.0, 20000.0, N_FREQS)
+    return TFArrays(
+        freqs=freqs,
+        mag_db=rng.uniform(-40.0, 10.0, N_FREQS),
+        phase_deg=rng.uniform(-180.0, 180.0, N_FREQS),
+        coh=rng.uniform(0.0, 1.0, N_FREQS),
+        ir=rng.standard_normal(N_IR) / 4.0,
+    )
+
+
+def _channels(tfs):
+    return [
+        framing.ChannelArrays(
+            meas_chan=2 + i, tf=tf, spl=SPLData(Leq=-20.0 - i, LZ=-19.0 - i),
+            delay_ms=1.5 * i, delay_mode="auto", delay_confidence=8.0,
+        )
+        for i, tf in enumerate(tfs)
+    ]
+
+
+def _encode_args(tfs):
+    return dict(
+        delay_ms=1.25, latency_ms=42.0, ts=1_700_000_000_000, sample_rate=48000,
+        delay_mode="tracking", delay_confidence=None, meas_chan=2,
+        channels=_channels(tfs) if len(tfs) > 1 else None,
+    )
+
+
+class _Reader:
+    def __init__(self, buf, offset=0):
+        self.buf = buf
+        self.pos = offset
+
+    def array(self, dtype, n):
+        a = np.frombuffer(self.buf, dtype=dtype, count=n, offset=self.pos)
+        self.pos += a.nbytes + (-a.nbytes % 4)
+        return a
+
+    def struct(self, s):
+        values = s.unpack_from(self.buf, self.pos)
+        self.pos += s.size
+        return values
+
+
+def _decode_f32(buf):
+    head = HEADER.unpack_from(buf)
+    assert head[0] == framing.FRAME_MAGIC
+    n_freqs, n_ir, n_channels = head[10], head[11], head[13]
+    r = _Reader(buf, head[2])
+    freqs = r.array("<f4", n_freqs)
+    tfs = []
+    for i in range(max(1, n_channels)):
+        if i > 0:
+            r.struct(CHANNEL_HEADER)
+        mag, phase, coh = (r.array("<f4", n_freqs) for _ in range(3))
+        tfs.append((freqs, mag, phase, coh, r.array("<f4", n_ir)))
+    assert r.pos == len(buf)
+    return head, tfs
+
+
+class _QDecoder:
+    """Client side of "q16": keeps the quantized arrays and applies deltas."""
+
+    def __init__(self):
+        self.seq = None
+        self.freqs = None
+        self.state = []
+
+    def decode(self, buf):
+        head = Q_HEADER.unpack_from(buf)
+        assert head[0] == framing.QFRAME_MAGIC
+        n_freqs, n_ir, n_channels, seq, flags = head[10], head[11], head[13], head[15], head[16]
+        keyframe = bool(flags & 1)
+        assert keyframe or seq == self.seq + 1
+        self.seq = seq
+        r = _Reader(buf, head[2])
+        if keyframe:
+            self.freqs = r.array("<f4", n_freqs)
+            self.state = []
+        types = ("<i2", "<i2", "<i2", "u1")
+        sizes = (n_freqs, n_freqs, n_ir, n_freqs)
+        for i in range(max(1, n_channels)):
+            if i > 0:
+                r.struct(CHANNEL_HEADER)
+            if keyframe:
+                (scale,) = r.struct(struct.Struct("<f"))
+                self.state.append([scale] + [r.array(t, n).copy() for t, n in zip(types, sizes)])
+                continue
+            st = self.state[i]
+            for k, (t, n) in enumerate(zip(types, sizes), start=1):
+                changed = np.unpackbits(r.array("u1", -(-n // 8)), bitorder="little")[:n].astype(bool)
+                st[k][changed] += r.array(t, int(changed.sum()))
+        return [
+            (
+                self.freqs,
+                st[1] * framing.QuantizedFrameEncoder.MAG_STEP_DB,
+                st[2] * framing.QuantizedFrameEncoder.PHASE_STEP_DEG,
+                st[4] * framing.QuantizedFrameEncoder.COH_STEP,
+                st[3] * st[0],
+            )
+            for st in self.state
+        ]
+
+
+def _wrap_deg(d):
+    return (d + 180.0) % 360.0 - 180.0
+
+
+@pytest.mark.parametrize("chans", [1, 3])
+def test_f32_round_trip(chans):
+    rng = np.random.default_rng(chans)
+    tfs = [_tf(rng) for _ in range(chans)]
+    buf = framing.encode_frame_f32(tfs[0], SPLData(Leq=-20.0, LZ=-19.0), **_encode_args(tfs))
+    head, decoded = _decode_f32(buf)
+    assert head[9] == 48000
+    assert np.isnan(head[8])  # no delay confidence
+    assert head[13] == (chans if chans > 1 else 0)
+    for tf, got in zip(tfs, decoded):
+        for want, have in zip(tf, got):
+            np.testing.assert_array_equal(have, np.asarray(want, dtype=np.float32))
+
+
+@pytest.mark.parametrize("chans", [1, 3])
+def test_q16_round_trip_stays_within_error_bounds(chans):
+    rng = np.random.default_rng(10 + chans)
+    enc = framing.QuantizedFrameEncoder(keyframe_interval=10)
+    dec = _QDecoder()
+    tfs = [_tf(rng) for _ in range(chans)]
+    keyframes = 0
+    for _ in range(25):
+        # drifts around the error bounds, so some bins are resent and some not
+        tfs = [
+            tf._replace(
+                mag_db=tf.mag_db + rng.normal(0.0, 0.05, N_FREQS),
+                phase_deg=_wrap_deg(tf.phase_deg + rng.normal(0.0, 1.0, N_FREQS)),
+                coh=np.clip(tf.coh + rng.normal(0.0, 0.01, N_FREQS), 0.0, 1.0),
+                ir=tf.ir * 0.98 + rng.normal(0.0, 1e-3, N_IR),
+            )
+            for tf in tfs
+        ]
+        buf = enc.encode(tfs[0], SPLData(Leq=-20.0, LZ=-19.0), **_encode_args(tfs))
+        keyframes += Q_HEADER.unpack_from(buf)[16] & 1
+        decoded = dec.decode(buf)
+        for tf, st, (freqs, mag, phase, coh, ir) in zip(tfs, dec.state, decoded):
+            np.testing.assert_array_equal(freqs, tf.freqs.astype(np.float32))
+            assert np.max(np.abs(mag - tf.mag_db)) <= enc.mag_error_db + enc.MAG_STEP_DB
+            assert np.max(np.abs(_wrap_deg(phase - tf.phase_deg))) <= enc.phase_error_deg + enc.PHASE_STEP_DEG
+            assert np.max(np.abs(coh - tf.coh)) <= enc.coh_error + enc.COH_STEP
+            ir_scale = st[0]  # the keyframe peak is 32767 / 2 steps
+            assert np.max(np.abs(ir - tf.ir)) <= enc.ir_error * 32767.0 / 2.0 * ir_scale + ir_scale
+    assert keyframes == 3
+
+
+def test_q16_requested_keyframe():
+    rng = np.random.default_rng(0)
+    enc = framing.QuantizedFrameEncoder()
+    tf = _tf(rng)
+    flags = []
+    for i in range(4):
+        if i == 2:
+            enc.request_keyframe()
+        buf = enc.encode(tf, SPLData(Leq=0.0, LZ=0.0), **_encode_args([tf]))
+        flags.append(Q_HEADER.unpack_from(buf)[16] & 1)
+    assert flags == [1, 0, 1, 0]
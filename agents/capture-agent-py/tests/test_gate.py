@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from capture_agent import dsp
+from capture_agent.schema import CaptureConfig
+
+
+def _block(ref_db, meas_db, n=4800, chans=3):
+    rng = np.random.default_rng(0)
+    block = np.zeros((n, chans), np.float32)
+    block[:, 0] = rng.standard_normal(n) * 10 ** (ref_db / 20)
+    for c in range(1, chans):
+        block[:, c] = rng.standard_normal(n) * 10 ** (meas_db / 20)
+    return block
+
+
+def _gate(block, meas_cols=(1,)):
+    return dsp.signal_gate(block, 0, list(meas_cols), -80.0, 40.0)
+
+
+def test_signal_passes():
+    reason, ref_db, meas_db = _gate(_block(-20.0, -30.0))
+    assert reason is None
+    assert ref_db == pytest.approx(-20.0, abs=0.5)
+    assert meas_db == pytest.approx(-30.0, abs=0.5)
+
+
+@pytest.mark.parametrize(("ref_db", "meas_db"), [(-100.0, -20.0), (-20.0, -100.0)])
+def test_silence_on_either_side_is_gated(ref_db, meas_db):
+    assert _gate(_block(ref_db, meas_db))[0] == "silent"
+
+
+def test_loudest_measurement_channel_counts():
+    block = _block(-20.0, -100.0)
+    block[:, 2] *= 10 ** (70 / 20)  # -30 dBFS on the second meas channel
+    reason, _, meas_db = _gate(block, (1, 2))
+    assert reason is None
+    assert meas_db == pytest.approx(-30.0, abs=0.5)
+
+
+def test_click_is_gated_on_crest():
+    block = np.full((48000, 2), 1e-6, np.float32)
+    block[100] = 0.9  # loud enough to pass, but 47 dB above its RMS
+    assert _gate(block)[0] == "crest"
+
+
+def test_non_finite_block_is_invalid():
+    block = _block(-20.0, -20.0)
+    block[10, 1] = np.nan
+    assert _gate(block)[0] == "invalid"
+
+
+def test_gate_is_off_by_default():
+    config = CaptureConfig(
+        deviceId="0", sampleRate=48000, blockSize=512, refChan=1, measChan=2,
+        nfft=8192, avg="power", avgCount=8, window="hann", lpfMode="none", lpfFreq=0.0,
+    )
+    assert config.gateRmsDbfs is None
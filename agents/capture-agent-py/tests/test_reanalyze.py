@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from capture_agent import dsp, reanalyze
+
+FS = 48000
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """5 s of ref/meas at -6 dB, with 1 s of silence in the middle."""
+    rng = np.random.default_rng(0)
+    ref = (rng.standard_normal(5 * FS) * 0.1).astype(np.float32)
+    ref[2 * FS:3 * FS] = 0.0
+    path = tmp_path / "take.wav"
+    wavfile.write(path, FS, np.stack([ref, 0.5 * ref], axis=1))
+    return path
+
+
+def _config(path, **overrides):
+    return reanalyze.load_config(path, dict(nfft=8192, **overrides))
+
+
+def test_cli_writes_the_frame_series(recording, tmp_path):
+    reanalyze.main([
+        str(recording), "--workers", "1", "--chunk-seconds", "2", "--delay-ms", "0", "--out", str(tmp_path / "out"),
+    ])
+    with np.load(tmp_path / "out" / "take.frames.npz") as f:
+        t, mag = f["t"], f["mag_db"]
+        assert np.all(np.diff(t) > 0)
+        assert mag.shape == (t.size, 1, f["freqs"].size)
+        assert f["meas_chans"].tolist() == [2]
+    loud = (t < 2.0) | (t > 3.5)
+    assert np.median(mag[loud, 0], axis=-1) == pytest.approx(-6.02, abs=0.1)
+
+
+def test_gated_frames_are_left_out(recording):
+    config = _config(recording, gateRmsDbfs=-60.0, gateHoldMs=100.0)
+    positions = reanalyze.frame_positions(config, 5 * FS)
+    out = reanalyze.analyze_chunk(str(recording), config.model_dump_json(), positions, 0.0, False)
+    t = out["t"]
+    assert not np.any((t > 2.2) & (t <= 3.0))
+    assert np.any(t > 3.0)
+
+
+def test_spectra_restart_at_gate_transitions(recording, monkeypatch):
+    # as in the live loop, the running averages restart when the gate
+    # closes and again when it reopens
+    resets = []
+    reset = dsp.StreamingSpectra.reset
+    monkeypatch.setattr(dsp.StreamingSpectra, "reset", lambda self: resets.append(1) or reset(self))
+    config = _config(recording, gateRmsDbfs=-60.0, gateHoldMs=100.0)
+    positions = reanalyze.frame_positions(config, 5 * FS)
+    reanalyze.analyze_chunk(str(recording), config.model_dump_json(), positions, 0.0, False)
+    assert len(resets) == 1 + 2  # the analyzer's own, then close and reopen
+
+    resets.clear()
+    config = _config(recording)
+    reanalyze.analyze_chunk(str(recording), config.model_dump_json(), positions, 0.0, False)
+    assert len(resets) == 1
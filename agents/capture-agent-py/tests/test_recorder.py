@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pytest
+
+from capture_agent import recorder
+from capture_agent.schema import CaptureConfig
+
+
+def _config(**record):
+    return CaptureConfig(
+        deviceId="0", sampleRate=48000, blockSize=512, refChan=1, measChan=2,
+        nfft=8192, avg="power", avgCount=8, window="hann", lpfMode="none", lpfFreq=0.0,
+        record=record,
+    )
+
+
+def _record(tmp_path, blocks, **record):
+    rec = recorder.Recorder(_config(**record), blocks[0].shape[1], "abc", directory=tmp_path)
+    for b in blocks:
+        assert rec.write(b)
+    rec.close(delay=[{"mode": "auto"}])
+    return rec
+
+
+@pytest.mark.parametrize("fmt", ["wav", "npy"])
+def test_round_trip(tmp_path, fmt):
+    rng = np.random.default_rng(0)
+    blocks = [rng.standard_normal((int(n), 3)).astype(np.float32) for n in rng.integers(1, 3000, 40)]
+    rec = _record(tmp_path, blocks, format=fmt, name="take")
+    assert rec.path.name == f"take.{fmt}"
+    data, sample_rate = recorder.open_recording(rec.path)
+    assert sample_rate == 48000
+    np.testing.assert_array_equal(data, np.concatenate(blocks))
+    sidecar = recorder.read_sidecar(rec.path)
+    assert sidecar["frames"] == data.shape[0]
+    assert sidecar["droppedFrames"] == 0
+    assert sidecar["delay"] == [{"mode": "auto"}]
+    assert CaptureConfig(**sidecar["config"]).record.name == "take"
+
+
+def test_a_reused_name_never_overwrites(tmp_path):
+    first = _record(tmp_path, [np.ones((100, 2), np.float32)], name="take")
+    second = _record(tmp_path, [np.zeros((50, 2), np.float32)], name="take")
+    third = _record(tmp_path, [np.zeros((10, 2), np.float32)], format="npy", name="take")
+    assert [r.path.name for r in (first, second, third)] == ["take.wav", "take-1.wav", "take-2.npy"]
+    assert recorder.open_recording(first.path)[0].shape == (100, 2)
+    assert json.loads(first.sidecar_path.read_text())["frames"] == 100
+    assert json.loads(second.sidecar_path.read_text())["file"] == "take-1.wav"
+
+
+@pytest.mark.parametrize("fmt", ["wav", "npy"])
+def test_a_file_cut_short_still_opens(tmp_path, fmt):
+    blocks = [np.arange(2048, dtype=np.float32).reshape(1024, 2)] * 8
+    rec = _record(tmp_path, blocks, format=fmt, name="take")
+    raw = rec.path.read_bytes()
+    cut = tmp_path / f"cut.{fmt}"
+    cut.write_bytes(raw[:len(raw) // 2 + 3])  # mid-frame
+    (tmp_path / "cut.json").write_text(rec.sidecar_path.read_text())
+    data, sample_rate = recorder.open_recording(cut)
+    assert sample_rate == 48000
+    assert 0 < data.shape[0] < 8 * 1024
+    np.testing.assert_array_equal(data, np.concatenate(blocks)[:data.shape[0]])
@@ -0,0 +1,91 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from capture_agent.ringbuffer import MirroredHistory, SampleRing
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _blocks(rng, count, channels, max_len):
+    return [rng.standard_normal((int(rng.integers(0, max_len)), channels)).astype(np.float32) for _ in range(count)]
+
+
+def test_history_window_across_wraparound():
+    rng = np.random.default_rng(1)
+    h = MirroredHistory(50, 2, 13)
+    ref = np.zeros((50, 2), np.float32)
+    for b in _blocks(rng, 2000, 2, 90):
+        h.append(b)
+        ref = np.concatenate([ref, b])[-50:]
+        np.testing.assert_array_equal(h.window(), ref)
+        k = int(rng.integers(0, 51))
+        np.testing.assert_array_equal(h.window(k), ref[50 - k:])
+
+
+def test_history_slack_protects_a_held_window():
+    rng = np.random.default_rng(2)
+    h = MirroredHistory(50, 1, 13)
+    for b in _blocks(rng, 37, 1, 40):
+        h.append(b)
+    view = h.window()
+    snapshot = view.copy()
+    for _ in range(13):
+        h.append(np.full((1, 1), 99, np.float32))
+    np.testing.assert_array_equal(view, snapshot)
+
+
+def test_sample_ring_wraparound(loop):
+    rng = np.random.default_rng(3)
+    ring = SampleRing(100, 2, 10, loop)
+    written = []
+    read = []
+    for _ in range(500):
+        b = rng.standard_normal((int(rng.integers(1, 40)), 2)).astype(np.float32)
+        if ring.write(b):
+            written.append(b)
+        if rng.random() < 0.5:
+            pending = ring.pending()
+            assert len(pending) <= 2
+            read.extend(p.copy() for p in pending)
+            ring.release(sum(p.shape[0] for p in pending))
+    read.extend(p.copy() for p in ring.pending())
+    np.testing.assert_array_equal(np.concatenate(read), np.concatenate(written))
+
+
+def test_sample_ring_drops_whole_blocks_when_full(loop):
+    ring = SampleRing(64, 1, 8, loop)
+    assert ring.write(np.ones((60, 1), np.float32))
+    assert not ring.write(np.ones((5, 1), np.float32))
+    assert (ring.overruns, ring.dropped_frames) == (1, 5)
+    ring.release(60)
+    assert ring.write(np.full((5, 1), 2, np.float32))
+    np.testing.assert_array_equal(np.concatenate(ring.pending()), np.full((5, 1), 2, np.float32))
+
+
+def test_sample_ring_pending_limit_leaves_the_rest(loop):
+    ring = SampleRing(16, 1, 4, loop)
+    data = np.arange(24, dtype=np.float32)[:, None]
+    ring.write(data[:12])
+    ring.release(12)
+    ring.write(data[12:24])  # wraps at 16
+    pending = ring.pending(6)
+    assert sum(p.shape[0] for p in pending) == 6
+    np.testing.assert_array_equal(np.concatenate(pending), data[12:18])
+    ring.release(6)
+    np.testing.assert_array_equal(np.concatenate(ring.pending()), data[18:24])
+
+
+def test_sample_ring_replaces_column(loop):
+    ring = SampleRing(16, 2, 4, loop)
+    block = np.ones((6, 2), np.float32)
+    ring.write(block, 0, np.arange(6, dtype=np.float32))
+    (view,) = ring.pending()
+    np.testing.assert_array_equal(view[:, 0], np.arange(6))
+    np.testing.assert_array_equal(view[:, 1], np.ones(6))
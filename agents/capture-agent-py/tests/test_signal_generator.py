@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from capture_agent.signal_generator import GeneratorConfig, SignalGenerator, SignalType
+
+
+def _sweep(prerender=True, **kw):
+    config = GeneratorConfig(
+        signal_type=SignalType.SINE_SWEEP, sample_rate=48000, amplitude=1.0, prerender_sweep=prerender, **kw,
+    )
+    gen = SignalGenerator(config)
+    gen.reset()
+    return gen
+
+
+def _play(gen, sizes):
+    return np.concatenate([gen.generate_block(n, 1)[:, 0] for n in sizes])
+
+
+@pytest.mark.parametrize("prerender", [True, False])
+def test_sweep_blocks_join_seamlessly(prerender):
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 5000, 60)
+    one = _play(_sweep(prerender), [int(sizes.sum())])
+    blocks = _play(_sweep(prerender), sizes.tolist())
+    np.testing.assert_array_equal(blocks, one)
+
+
+@pytest.mark.parametrize(("f0", "f1", "seconds"), [(20.0, 20000.0, 1.0), (100.0, 1000.0, 0.37), (1000.0, 1000.0, 0.5)])
+def test_sweep_is_periodic_and_continuous(f0, f1, seconds):
+    gen = _sweep(start_freq=f0, end_freq=f1, sweep_duration=seconds)
+    n = gen._sweep_len
+    x = _play(gen, [1024] * (-(-3 * n // 1024)))
+    np.testing.assert_allclose(x[n:2 * n], x[:n], atol=1e-6)
+    # no click at the wrap: each period starts at zero phase, and its last
+    # sample is one step of the (slightly nudged) end frequency before that
+    assert abs(x[0]) < 1e-6
+    assert x[n - 1] == pytest.approx(np.sin(-2 * np.pi * f1 / 48000), abs=2e-3)
+
+
+def test_prerendered_sweep_matches_rendered():
+    sizes = [1000, 4096, 333] * 30
+    np.testing.assert_allclose(_play(_sweep(True), sizes), _play(_sweep(False), sizes), atol=1e-6)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from capture_agent import dsp
+
+
+def _reference_smoothing(freqs, Pxx, Pyy, Pxy, frac=6, min_bins=3, eps=1e-20):
+    """The per-bin loop the sparse operator replaced, for one channel."""
+    I0, I1, valid = dsp._log_band_edges(freqs, frac=frac)
+    coh0 = np.clip(np.abs(Pxy) ** 2 / (np.maximum(Pxx, eps) * np.maximum(Pyy, eps) + eps), 0.0, 1.0)
+    Hs = np.zeros_like(Pxy, dtype=np.complex128)
+    coh_s = np.zeros_like(coh0)
+    fpos_idx = np.flatnonzero(valid)
+    for k, i in enumerate(fpos_idx):
+        a, b = int(I0[i]), int(I1[i])
+        if b - a < min_bins:
+            a = max(0, k - min_bins // 2)
+            b = min(len(fpos_idx), a + min_bins)
+        seg = fpos_idx[a:b]
+        M = seg.size
+        w = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(M) / (M - 1)) if M > 1 else np.ones(1)
+        w = w * coh0[seg]
+        wsum = np.sum(w) + eps
+        Pxx_b = np.sum(Pxx[seg] * w) / wsum
+        Pyy_b = np.sum(Pyy[seg] * w) / wsum
+        Pxy_b = np.sum(Pxy[seg] * w) / wsum
+        Hs[i] = Pxy_b / (Pxx_b + eps)
+        coh_s[i] = np.abs(Pxy_b) ** 2 / (Pxx_b * Pyy_b + eps)
+    return Hs, np.clip(coh_s, 0.0, 1.0)
+
+
+def _spectra(nfft, chans, rng):
+    n = nfft // 2 + 1
+    freqs = np.fft.rfftfreq(nfft, 1 / 48000.0)
+    Pxx = rng.random(n) + 0.1
+    Pyy = rng.random((chans, n)) + 0.1
+    Pxy = (rng.random((chans, n)) - 0.5 + 1j * (rng.random((chans, n)) - 0.5)) * 0.3
+    return freqs, Pxx, Pyy, Pxy
+
+
+@pytest.fixture
+def banded(monkeypatch):
+    """Force the banded fallback used for operators too large to cache."""
+    monkeypatch.setattr(dsp, "MAX_SMOOTHING_NNZ", 0)
+    dsp.clear_dsp_caches()
+    yield
+    dsp.clear_dsp_caches()
+
+
+@pytest.mark.parametrize("nfft", [256, 4096])
+@pytest.mark.parametrize("frac", [3, 6, 24])
+def test_operator_matches_reference_loop(nfft, frac):
+    dsp.clear_dsp_caches()
+    freqs, Pxx, Pyy, Pxy = _spectra(nfft, 2, np.random.default_rng(nfft + frac))
+    Hs, coh_s = dsp.smooth_constQ_tf_and_coh(freqs, Pxx, Pyy, Pxy, frac=frac)
+    valid = freqs > 0
+    for c in range(2):
+        Hr, cr = _reference_smoothing(freqs, Pxx, Pyy[c], Pxy[c], frac=frac)
+        np.testing.assert_allclose(Hs[c][valid], Hr[valid], rtol=1e-10)
+        np.testing.assert_allclose(coh_s[c][valid], cr[valid], rtol=1e-10, atol=1e-14)
+
+
+@pytest.mark.usefixtures("banded")
+@pytest.mark.parametrize("nfft", [256, 4096])
+@pytest.mark.parametrize("frac", [1, 6, 24])
+def test_banded_fallback_matches_reference_loop(nfft, frac):
+    freqs, Pxx, Pyy, Pxy = _spectra(nfft, 1, np.random.default_rng(nfft * frac))
+    assert dsp._get_smoothing_operator(freqs, frac, 3) is None
+    Hs, coh_s = dsp.smooth_constQ_tf_and_coh(freqs, Pxx, Pyy[0], Pxy[0], frac=frac)
+    Hr, cr = _reference_smoothing(freqs, Pxx, Pyy[0], Pxy[0], frac=frac)
+    valid = freqs > 0
+    np.testing.assert_allclose(Hs[valid], Hr[valid], rtol=1e-10)
+    np.testing.assert_allclose(coh_s[valid], cr[valid], rtol=1e-10, atol=1e-14)
+
+
+def test_banded_sums_match_operator():
+    rng = np.random.default_rng(5)
+    freqs = np.fft.rfftfreq(16384, 1 / 48000.0)
+    V = rng.random((freqs.size, 5)) * np.logspace(0, -9, freqs.size)[:, None]
+    expected = dsp._smoothing_operator(freqs, 6, 3) @ V
+    np.testing.assert_allclose(dsp._smooth_sums_banded(freqs, V, 6, 3), expected, rtol=1e-12)
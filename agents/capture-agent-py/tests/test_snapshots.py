@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from capture_agent import dsp
+from capture_agent.snapshots import SnapshotStore
+
+BINS = 257
+
+
+def _position(H, coh, level=1.0):
+    """Spectra of one position with transfer function ``H`` and coherence ``coh``."""
+    H = np.broadcast_to(np.asarray(H, dtype=np.complex128), (BINS,))
+    Pxx = np.full(BINS, level)
+    return Pxx, np.abs(H) ** 2 * Pxx / coh, H * Pxx
+
+
+def _stack(*positions):
+    return tuple(np.stack(a) for a in zip(*positions))
+
+
+def _tf(Pxx, Pyy, Pxy):
+    H = Pxy[0] / Pxx
+    return H, np.abs(Pxy[0]) ** 2 / (Pxx * Pyy[0])
+
+
+def test_identical_positions_average_to_themselves():
+    for mode in ("power", "complex"):
+        H, coh = _tf(*dsp.average_spectra(*_stack(_position(0.5j, 0.9), _position(0.5j, 0.9)), mode=mode))
+        np.testing.assert_allclose(H, 0.5j)
+        np.testing.assert_allclose(coh, 0.9)
+
+
+def test_positions_are_normalized_by_their_reference_level():
+    H, _ = _tf(*dsp.average_spectra(*_stack(_position(0.5, 0.9, level=1.0), _position(0.5, 0.9, level=100.0))))
+    np.testing.assert_allclose(H, 0.5)
+
+
+def test_power_and_complex_modes():
+    spectra = _stack(_position(1.0, 0.99), _position(1j, 0.99))
+    H_pow, coh_pow = _tf(*dsp.average_spectra(*spectra, mode="power", coherence_weighted=False))
+    H_vec, coh_vec = _tf(*dsp.average_spectra(*spectra, mode="complex", coherence_weighted=False))
+    np.testing.assert_allclose(np.abs(H_pow), 1.0)
+    np.testing.assert_allclose(np.abs(H_vec), np.sqrt(0.5))
+    np.testing.assert_allclose(np.angle(H_pow), np.pi / 4)
+    np.testing.assert_allclose(np.angle(H_vec), np.pi / 4)
+    # the positions disagree in phase, which only the vector average shows
+    assert np.all(coh_vec < coh_pow)
+    assert np.all((coh_vec >= 0.0) & (coh_pow <= 1.0))
+
+
+def test_coherence_weighting_favours_the_clean_position():
+    spectra = _stack(_position(1.0, 0.99), _position(0.1, 0.2))
+    H_w, _ = _tf(*dsp.average_spectra(*spectra, mode="complex"))
+    H_u, _ = _tf(*dsp.average_spectra(*spectra, mode="complex", coherence_weighted=False))
+    np.testing.assert_allclose(H_u, 0.55)
+    assert np.all(H_w.real > 0.97)
+
+
+def _spectra(rng, chans=1, nfft=512):
+    freqs = np.fft.rfftfreq(nfft, 1 / 48000.0)
+    n = freqs.size
+    Pxx = rng.random(n) + 0.5
+    Pxy = (rng.random((chans, n)) + 1j * rng.random((chans, n))) * Pxx
+    Pyy = np.abs(Pxy) ** 2 / Pxx / 0.9
+    return dsp.CrossSpectra(freqs, Pxx, Pyy, Pxy, tuple(range(2, 2 + chans)), (1.0,) * chans)
+
+
+def test_store_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    store = SnapshotStore(tmp_path)
+    front = _spectra(rng, chans=2)
+    a = store.save(front, 48000, "front")
+    b = store.save(_spectra(rng), 48000)
+    assert (a.nfft, a.measChans, a.delaysMs) == (512, [2, 3], [1.0, 1.0])
+
+    # a new store reads the index back
+    store = SnapshotStore(tmp_path)
+    assert [s.id for s in store.list()] == [a.id, b.id]
+    freqs, Pxx, Pyy, Pxy = store.load([a.id, b.id])
+    assert Pxy.shape == (3, freqs.size) and Pxx.shape == Pyy.shape == (3, freqs.size)
+    np.testing.assert_allclose(Pxy[:2], front.Pxy, rtol=1e-6)  # stored as complex64
+
+    tf, positions = store.average([a.id, b.id], points_per_octave=0, ir_length=64)
+    assert positions == 3
+    assert len(tf.mag_db) == freqs.size and len(tf.ir) == 64
+
+    assert store.delete(a.id)
+    assert not store.delete(a.id)
+    assert [s.id for s in SnapshotStore(tmp_path).list()] == [b.id]
+    assert not (tmp_path / f"{a.id}.npz").exists()
+
+
+def test_store_rejects_unknown_and_mismatched_snapshots(tmp_path):
+    rng = np.random.default_rng(1)
+    store = SnapshotStore(tmp_path)
+    a = store.save(_spectra(rng), 48000)
+    b = store.save(_spectra(rng, nfft=1024), 48000)
+    with pytest.raises(ValueError, match="Unknown"):
+        store.load([a.id, "nope"])
+    with pytest.raises(ValueError, match="different frequency grid"):
+        store.average([a.id, b.id])
+    with pytest.raises(ValueError):
+        store.average([])
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from scipy.signal import csd, welch
+
+from capture_agent import dsp
+
+FS = 48000.0
+
+
+def _pair(n, lag, rng, chans=1):
+    x = rng.standard_normal(n)
+    ys = np.stack([np.roll(x, lag) * (0.5 / (c + 1)) + 0.1 * rng.standard_normal(n) for c in range(chans)])
+    return x, ys
+
+
+@pytest.mark.parametrize(("n", "nperseg"), [(50000, 4096), (10000, 1000), (5000, 33)])
+def test_cross_spectra_matches_scipy(n, nperseg):
+    rng = np.random.default_rng(0)
+    x, ys = _pair(n, 3, rng)
+    y = ys[0]
+    noverlap = int(0.75 * nperseg)
+    w = dsp.get_window("hann", nperseg)
+
+    _, Pxx, Pyy, Pxy = dsp.cross_spectra(x, y, FS, w, nperseg, noverlap)
+    kw = dict(fs=FS, window=w, nperseg=nperseg, noverlap=noverlap, detrend="constant")
+    np.testing.assert_allclose(Pxx, welch(x, **kw)[1], rtol=1e-10)
+    np.testing.assert_allclose(Pyy, welch(y, **kw)[1], rtol=1e-10)
+    np.testing.assert_allclose(Pxy, csd(x, y, **kw)[1], rtol=1e-10, atol=1e-12 * np.abs(Pxy).max())
+
+
+def test_cross_spectra_channels_match_single_channel():
+    rng = np.random.default_rng(1)
+    x, ys = _pair(20000, 5, rng, chans=3)
+    w = dsp.get_window("hann", 1024)
+    _, Pxx, Pyy, Pxy = dsp.cross_spectra(x, ys, FS, w, 1024, 768)
+    for c in range(3):
+        _, Pxx1, Pyy1, Pxy1 = dsp.cross_spectra(x, ys[c], FS, w, 1024, 768)
+        np.testing.assert_allclose(Pxx, Pxx1)
+        np.testing.assert_allclose(Pyy[c], Pyy1)
+        np.testing.assert_allclose(Pxy[c], Pxy1)
+
+
+@pytest.mark.parametrize("delays", [(37,), (-5,), (37, 12, -3)])
+def test_streaming_spectra_match_one_shot(delays):
+    """Hop-by-hop updates equal ``cross_spectra`` over the same aligned segments."""
+    rng = np.random.default_rng(2)
+    nperseg, noverlap = 4096, 3072
+    hop = nperseg - noverlap
+    total, N = 200000, 60000
+    x_all = rng.standard_normal(total)
+    y_all = np.stack([np.roll(x_all, d) * 0.5 + 0.1 * rng.standard_normal(total) for d in delays])
+    D = list(delays)
+
+    eng = dsp.StreamingSpectra()
+    for pos in range(N, total, 3 * hop):
+        result = eng.update(x_all[pos - N:pos], y_all[:, pos - N:pos], pos, FS, nperseg, noverlap, D)
+    _, Pxx, Pyy, Pxy = result
+
+    # ref segments on the absolute hop grid that every channel fully overlaps
+    start = pos - N
+    lo = start + max(0, -min(D))
+    hi = pos - nperseg - max(0, max(D))
+    first = -(-lo // hop) * hop
+    last = (hi // hop) * hop
+    w = dsp.get_window("hann", nperseg)
+    xe = x_all[first:last + nperseg]
+    for c, d in enumerate(D):
+        ye = y_all[c, first + d:last + d + nperseg]
+        _, Rxx, Ryy, Rxy = dsp.cross_spectra(xe, ye, FS, w, nperseg, noverlap)
+        np.testing.assert_allclose(Pxx, Rxx, rtol=1e-9)
+        np.testing.assert_allclose(Pyy[c], Ryy, rtol=1e-9)
+        np.testing.assert_allclose(Pxy[c], Rxy, rtol=1e-9, atol=1e-9 * np.abs(Rxy).max())
+
+
+def test_streaming_spectra_restart_after_reset():
+    rng = np.random.default_rng(3)
+    x, ys = _pair(30000, 0, rng)
+    eng = dsp.StreamingSpectra()
+    first = eng.update(x, ys, 30000, FS, 1024, 768, [0])
+    eng.reset()
+    again = eng.update(x, ys, 30000, FS, 1024, 768, [0])
+    for a, b in zip(first, again):
+        np.testing.assert_allclose(a, b)
+
+
+@pytest.mark.parametrize("ir_length", [1024, 1025])
+def test_truncated_ir_keeps_the_centre_of_the_full_ir(ir_length):
+    rng = np.random.default_rng(7)
+    x, ys = _pair(40000, 5, rng, chans=2)
+    w = dsp.get_window("hann", 8192)
+    freqs, Pxx, Pyy, Pxy = dsp.cross_spectra(x, ys, FS, w, 8192, 6144)
+    full = dsp.spectra_to_tf(freqs, Pxx, Pyy, Pxy, 24, dsp.Analyzer())
+    short = dsp.spectra_to_tf(freqs, Pxx, Pyy, Pxy, 24, dsp.Analyzer(), ir_length)
+    fade = max(8, ir_length // 64)
+    for f, s in zip(full, short):
+        assert f.ir.size == 8192 and s.ir.size == ir_length
+        # t=0 at index len // 2 in both, so the UI's time axis still holds
+        start = 8192 // 2 - ir_length // 2
+        np.testing.assert_array_equal(s.ir[fade:-fade], f.ir[start + fade:start + ir_length - fade])
+        assert s.ir[0] == 0.0 and s.ir[-1] == 0.0
+        np.testing.assert_array_equal(s.mag_db, f.mag_db)
+
+
+def test_streaming_spectra_from_the_stream_start():
+    # the first windows reach back into zeros before sample 0, so their
+    # segments start at negative positions
+    rng = np.random.default_rng(4)
+    N, hop = 30000, 256
+    x_all = np.zeros(N + 20000)
+    x_all[N:] = rng.standard_normal(20000)
+    y_all = 0.5 * x_all[np.newaxis]
+    eng = dsp.StreamingSpectra()
+    for pos in range(hop, 20000, 2 * hop):
+        x, y = x_all[pos:pos + N], y_all[:, pos:pos + N]
+        got = eng.update(x, y, pos, FS, 1024, 768, [0])
+        want = dsp.StreamingSpectra().update(x, y, pos, FS, 1024, 768, [0])
+        for a, b in zip(got, want):
+            np.testing.assert_allclose(a, b, rtol=1e-9, atol=1e-12 * np.abs(b).max())
@@ -35,6 +35,7 @@ const AnalyzerProPage: React.FC = () => {
   const [devices, setDevices] = useState<Device[]>([]);
   const [tfData, setTfData] = useState<TFData | null>(null);
   const [sampleRate, setSampleRate] = useState<number>(48000);
+  const [captureNfft, setCaptureNfft] = useState<number>(8192);
   const [delayMode, setDelayMode] = useState<string>("auto");
   const [appliedDelayMs, setAppliedDelayMs] = useState<number>(0);
   const [isCapturing, setIsCapturing] = useState(false);
@@ -109,7 +110,7 @@ const AnalyzerProPage: React.FC = () => {
           ...rest,
           color_preference: color,
           user_id: user.id,
-          nfft: m.tf_data.freqs.length * 2 - 2,
+          nfft: m.tf_data.ir.length || m.tf_data.freqs.length * 2 - 2,
           agent_version: "capture-agent-py/0.1.0",
           dsp_version: "tf/0.1.0",
           window: "hann",
@@ -394,7 +395,7 @@ const AnalyzerProPage: React.FC = () => {
         tf_data: tfData,
         sample_rate: sampleRate,
         capture_delay_ms: appliedDelayMs,
-        nfft: tfData.freqs.length * 2 - 2, // This is an approximation
+        nfft: captureNfft, // neither the log-grid freqs nor the truncated IR give the FFT size
         // Hardcoded for now, will be dynamic later
         agent_version: "capture-agent-py/0.1.0",
         dsp_version: "tf/0.1.0",
@@ -464,6 +465,7 @@ const AnalyzerProPage: React.FC = () => {
               devices={devices}
               onStartCapture={(config) => {
                 sendMessage({ type: "start", ...config });
+                setCaptureNfft(config.nfft);
                 setIsCapturing(true);
               }}
               onStopCapture={() => {
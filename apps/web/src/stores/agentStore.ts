@@ -10,7 +10,9 @@ interface AgentState {
   lastMessage: AgentMessage | null;
   worker: Worker | null;
   actions: {
-    connect: () => void;
+    // compactFrames asks for the lossy "q16" frame codec (default: only
+    // for an agent on another host)
+    connect: (options?: { compactFrames?: boolean }) => void;
     disconnect: () => void;
     sendMessage: (message: ClientMessage) => void;
     initialize: () => void;
@@ -41,8 +43,11 @@ const useAgentStore = create<AgentState>((set, get) => ({
 
       set({ worker });
     },
-    connect: () => {
-      get().worker?.postMessage({ type: "connect", payload: { url: AGENT_URL } });
+    connect: (options = {}) => {
+      get().worker?.postMessage({
+        type: "connect",
+        payload: { url: AGENT_URL, compactFrames: options.compactFrames },
+      });
     },
     disconnect: () => {
       get().worker?.postMessage({ type: "disconnect" });
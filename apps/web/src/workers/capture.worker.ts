@@ -1,15 +1,26 @@
 /// <reference lib="webworker" />
 
-import { AgentMessage, ClientMessage } from "@sounddocs/analyzer-protocol";
+import {
+  AgentMessage,
+  ClientMessage,
+  FrameFormat,
+  QuantizedFrameDecoder,
+  decodeBinaryFrame,
+  isBinaryFrame,
+  isQuantizedFrame,
+} from "@sounddocs/analyzer-protocol";
 
 let ws: WebSocket | null = null;
+// "q16" deltas apply to the previous frame, so the decoder lives per connection
+let quantizedDecoder = new QuantizedFrameDecoder();
+let keyframeRequested = false;
 
 self.onmessage = (event: MessageEvent) => {
   const { type, payload } = event.data;
 
   switch (type) {
     case "connect":
-      connect(payload.url);
+      connect(payload.url, payload.compactFrames);
       break;
     case "disconnect":
       ws?.close();
@@ -20,22 +31,58 @@ self.onmessage = (event: MessageEvent) => {
   }
 };
 
-function connect(url: string) {
+// "q16" is lossy (within the agent's codec error bounds), so it is only
+// requested when asked for, or by default for an agent on another host,
+// where bandwidth matters more than on the loopback
+function preferredFrameFormats(url: string, compactFrames?: boolean): FrameFormat[] {
+  const host = new URL(url).hostname;
+  const remote = !["127.0.0.1", "localhost", "[::1]"].includes(host);
+  return (compactFrames ?? remote) ? ["q16", "f32", "json"] : ["f32", "json"];
+}
+
+function connect(url: string, compactFrames?: boolean) {
   if (ws && ws.readyState === WebSocket.OPEN) {
     return;
   }
 
   ws = new WebSocket(url);
+  // Binary frames are decoded from ArrayBuffers (negotiated in hello)
+  ws.binaryType = "arraybuffer";
+  quantizedDecoder = new QuantizedFrameDecoder();
+  keyframeRequested = false;
 
   ws.onopen = () => {
     self.postMessage({ type: "status", payload: "connected" });
     // Send a hello message automatically on connect
-    sendMessage({ type: "hello", client: "sounddocs-web", nonce: crypto.randomUUID() });
+    sendMessage({
+      type: "hello",
+      client: "sounddocs-web",
+      nonce: crypto.randomUUID(),
+      frameFormats: preferredFrameFormats(url, compactFrames),
+    });
   };
 
   ws.onmessage = (event) => {
     try {
-      const message: AgentMessage = JSON.parse(event.data);
+      let message: AgentMessage;
+      if (event.data instanceof ArrayBuffer && isQuantizedFrame(event.data)) {
+        const frame = quantizedDecoder.decode(event.data);
+        if (!frame) {
+          // Missed a frame: drop deltas until the agent sends a keyframe
+          if (!keyframeRequested) {
+            sendMessage({ type: "request_keyframe" });
+            keyframeRequested = true;
+          }
+          return;
+        }
+        keyframeRequested = false;
+        message = frame;
+      } else {
+        message =
+          event.data instanceof ArrayBuffer && isBinaryFrame(event.data)
+            ? decodeBinaryFrame(event.data)
+            : JSON.parse(event.data);
+      }
       // For now, we'll just forward the JSON message.
       // In the next step, this will be replaced with SharedArrayBuffer.
       self.postMessage({ type: "agentMessage", payload: message });
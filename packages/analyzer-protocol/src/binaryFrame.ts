@@ -0,0 +1,289 @@
+// Decoders for the agent's binary frame formats ("f32" and "q16").
+// Layout (little-endian) mirrors capture_agent/framing.py:
+//   header (headerLen bytes, 56 in version 1)
+//     magic "SDFB", u16 version, u16 headerLen, f64 ts,
+//     f32 delay_ms, latency_ms, Leq, LZ, delay_confidence (NaN = none),
+//     u32 sampleRate, nFreqs, nIr, u8 delayMode, u8 nChannels, u16 measChan, u32 reserved
+//   f32[nFreqs] freqs, mag_db, phase_deg, coh; f32[nIr] ir
+//   (nChannels - 1) channel blocks: u16 measChan, u8 delayMode, u8 pad,
+//     f32 delay_ms, delay_confidence, Leq, LZ, then mag_db, phase_deg, coh, ir
+//
+// "q16" uses magic "SDFQ", a 60-byte header whose reserved word is a u32 seq
+// followed by u32 flags (bit 0: keyframe), and int16/uint8 bodies:
+//   keyframe: f32[nFreqs] freqs, then per channel (extra channels prefixed by
+//     the channel header): f32 irScale, i16 mag, i16 phase, i16 ir, u8 coh
+//   delta: per channel, for mag, phase, ir, coh: u8 changed-bin bitmask
+//     (LSB first), then one wrapping delta per changed bin
+//   every section zero-padded to 4 bytes
+
+import type { ChannelFrame, FrameMessage, TFData } from "./index";
+
+export const BINARY_FRAME_MAGIC = 0x42464453; // "SDFB" read as u32 LE
+export const QUANTIZED_FRAME_MAGIC = 0x51464453; // "SDFQ" read as u32 LE
+export const BINARY_FRAME_VERSION = 1;
+
+const DELAY_MODES = ["auto", "tracking", "frozen", "manual"];
+const CHANNEL_HEADER_BYTES = 20;
+const QUANTIZED_KEYFRAME = 1;
+
+const MAG_STEP_DB = 0.01;
+const PHASE_STEP_DEG = 180 / 32768;
+const COH_STEP = 1 / 255;
+
+function delayMode(code: number): string {
+  return DELAY_MODES[code] ?? "unknown";
+}
+
+function optional(value: number): number | null {
+  return Number.isNaN(value) ? null : value;
+}
+
+function pad4(size: number): number {
+  return (size + 3) & ~3;
+}
+
+// Float32 views are read in place; only the final widening to number[]
+// (what TFData consumers expect) copies.
+function readArray(buffer: ArrayBuffer, offset: number, length: number): number[] {
+  return Array.from(new Float32Array(buffer, offset, length));
+}
+
+interface FrameHeader {
+  headerLen: number;
+  ts: number;
+  delayMs: number;
+  latencyMs: number;
+  leq: number;
+  lz: number;
+  confidence: number | null;
+  sampleRate: number;
+  nFreqs: number;
+  nIr: number;
+  mode: string;
+  nChannels: number;
+  measChan: number;
+}
+
+function readHeader(view: DataView, magic: number): FrameHeader {
+  if (view.byteLength < 8 || view.getUint32(0, true) !== magic) {
+    throw new Error("Not a binary frame");
+  }
+  const version = view.getUint16(4, true);
+  if (version !== BINARY_FRAME_VERSION) {
+    throw new Error(`Unsupported binary frame version ${version}`);
+  }
+  return {
+    headerLen: view.getUint16(6, true),
+    ts: view.getFloat64(8, true),
+    delayMs: view.getFloat32(16, true),
+    latencyMs: view.getFloat32(20, true),
+    leq: view.getFloat32(24, true),
+    lz: view.getFloat32(28, true),
+    confidence: optional(view.getFloat32(32, true)),
+    sampleRate: view.getUint32(36, true),
+    nFreqs: view.getUint32(40, true),
+    nIr: view.getUint32(44, true),
+    mode: delayMode(view.getUint8(48)),
+    nChannels: view.getUint8(49),
+    measChan: view.getUint16(50, true),
+  };
+}
+
+interface ChannelInfo {
+  measChan: number;
+  spl: { Leq: number; LZ: number };
+  delay_ms: number;
+  delay_mode: string;
+  delay_confidence: number | null;
+}
+
+function readChannelHeader(view: DataView, offset: number): ChannelInfo {
+  return {
+    measChan: view.getUint16(offset, true),
+    delay_mode: delayMode(view.getUint8(offset + 2)),
+    delay_ms: view.getFloat32(offset + 4, true),
+    delay_confidence: optional(view.getFloat32(offset + 8, true)),
+    spl: { Leq: view.getFloat32(offset + 12, true), LZ: view.getFloat32(offset + 16, true) },
+  };
+}
+
+// Assemble the FrameMessage both binary formats decode to
+function buildFrame(header: FrameHeader, tfs: TFData[], infos: ChannelInfo[]): FrameMessage {
+  const spl = { Leq: header.leq, LZ: header.lz };
+  const frame: FrameMessage = {
+    type: "frame",
+    tf: tfs[0],
+    spl,
+    delay_ms: header.delayMs,
+    latency_ms: header.latencyMs,
+    ts: header.ts,
+    sampleRate: header.sampleRate,
+    delay_mode: header.mode,
+    applied_delay_ms: header.delayMs,
+    delay_confidence: header.confidence,
+  };
+  if (header.nChannels > 0) {
+    const channels: ChannelFrame[] = [
+      {
+        measChan: header.measChan,
+        tf: tfs[0],
+        spl,
+        delay_ms: header.delayMs,
+        delay_mode: header.mode,
+        delay_confidence: header.confidence,
+      },
+    ];
+    infos.forEach((info, i) => channels.push({ ...info, tf: tfs[i + 1] }));
+    frame.channels = channels;
+  }
+  return frame;
+}
+
+export function isBinaryFrame(buffer: ArrayBuffer): boolean {
+  return (
+    buffer.byteLength >= 8 && new DataView(buffer).getUint32(0, true) === BINARY_FRAME_MAGIC
+  );
+}
+
+export function isQuantizedFrame(buffer: ArrayBuffer): boolean {
+  return (
+    buffer.byteLength >= 8 && new DataView(buffer).getUint32(0, true) === QUANTIZED_FRAME_MAGIC
+  );
+}
+
+export function decodeBinaryFrame(buffer: ArrayBuffer): FrameMessage {
+  const view = new DataView(buffer);
+  const header = readHeader(view, BINARY_FRAME_MAGIC);
+  const { nFreqs, nIr } = header;
+
+  let offset = header.headerLen;
+  const freqs = readArray(buffer, offset, nFreqs);
+  offset += 4 * nFreqs;
+
+  const readTF = (): TFData => {
+    const mag_db = readArray(buffer, offset, nFreqs);
+    const phase_deg = readArray(buffer, offset + 4 * nFreqs, nFreqs);
+    const coh = readArray(buffer, offset + 8 * nFreqs, nFreqs);
+    const ir = readArray(buffer, offset + 12 * nFreqs, nIr);
+    offset += 4 * (3 * nFreqs + nIr);
+    return { freqs, mag_db, phase_deg, coh, ir };
+  };
+
+  const tfs = [readTF()];
+  const infos: ChannelInfo[] = [];
+  for (let i = 1; i < header.nChannels; i++) {
+    infos.push(readChannelHeader(view, offset));
+    offset += CHANNEL_HEADER_BYTES;
+    tfs.push(readTF());
+  }
+  return buildFrame(header, tfs, infos);
+}
+
+// Quantized values of one channel, as last sent by the agent
+interface QuantizedChannel {
+  irScale: number;
+  mag: Int16Array;
+  phase: Int16Array;
+  ir: Int16Array;
+  coh: Uint8Array;
+}
+
+// Stateful "q16" decoder: keeps the quantized arrays the deltas apply to.
+// decode() returns null when a delta does not follow the last decoded frame;
+// the caller should then send request_keyframe (needsKeyframe stays true
+// until one arrives).
+export class QuantizedFrameDecoder {
+  needsKeyframe = true;
+  private seq = 0;
+  private freqs: number[] = [];
+  private channels: QuantizedChannel[] = [];
+
+  decode(buffer: ArrayBuffer): FrameMessage | null {
+    const view = new DataView(buffer);
+    const header = readHeader(view, QUANTIZED_FRAME_MAGIC);
+    const seq = view.getUint32(52, true);
+    const keyframe = (view.getUint32(56, true) & QUANTIZED_KEYFRAME) !== 0;
+    const nChannels = Math.max(1, header.nChannels);
+    const { nFreqs, nIr } = header;
+
+    if (!keyframe && (this.needsKeyframe || seq !== ((this.seq + 1) >>> 0))) {
+      this.needsKeyframe = true;
+      return null;
+    }
+
+    let offset = header.headerLen;
+    if (keyframe) {
+      this.freqs = readArray(buffer, offset, nFreqs);
+      offset += 4 * nFreqs;
+      this.channels = [];
+    } else if (this.channels.length !== nChannels) {
+      this.needsKeyframe = true;
+      return null;
+    }
+
+    const infos: ChannelInfo[] = [];
+    for (let c = 0; c < nChannels; c++) {
+      if (c > 0) {
+        infos.push(readChannelHeader(view, offset));
+        offset += CHANNEL_HEADER_BYTES;
+      }
+      if (keyframe) {
+        const irScale = view.getFloat32(offset, true);
+        offset += 4;
+        // slice() copies so the state outlives the message buffer
+        const mag = new Int16Array(buffer.slice(offset, offset + 2 * nFreqs));
+        offset += pad4(2 * nFreqs);
+        const phase = new Int16Array(buffer.slice(offset, offset + 2 * nFreqs));
+        offset += pad4(2 * nFreqs);
+        const ir = new Int16Array(buffer.slice(offset, offset + 2 * nIr));
+        offset += pad4(2 * nIr);
+        const coh = new Uint8Array(buffer.slice(offset, offset + nFreqs));
+        offset += pad4(nFreqs);
+        this.channels.push({ irScale, mag, phase, ir, coh });
+      } else {
+        const ch = this.channels[c];
+        for (const target of [ch.mag, ch.phase, ch.ir, ch.coh]) {
+          offset = applyDelta(buffer, offset, target);
+        }
+      }
+    }
+
+    this.seq = seq;
+    this.needsKeyframe = false;
+    const freqs = this.freqs;
+    const tfs = this.channels.map(
+      (ch): TFData => ({
+        freqs,
+        mag_db: Array.from(ch.mag, (v) => v * MAG_STEP_DB),
+        phase_deg: Array.from(ch.phase, (v) => v * PHASE_STEP_DEG),
+        coh: Array.from(ch.coh, (v) => v * COH_STEP),
+        ir: Array.from(ch.ir, (v) => v * ch.irScale),
+      }),
+    );
+    return buildFrame(header, tfs, infos);
+  }
+}
+
+// Apply one mask + deltas section to target in place; returns the next offset.
+// Typed-array assignment wraps, matching the agent's wrapping deltas.
+function applyDelta(buffer: ArrayBuffer, offset: number, target: Int16Array | Uint8Array): number {
+  const n = target.length;
+  const mask = new Uint8Array(buffer, offset, (n + 7) >> 3);
+  offset += pad4(mask.length);
+  let count = 0;
+  for (let i = 0; i < mask.length; i++) {
+    for (let b = mask[i]; b; b &= b - 1) count++;
+  }
+  const deltas =
+    target instanceof Int16Array
+      ? new Int16Array(buffer, offset, count)
+      : new Uint8Array(buffer, offset, count);
+  offset += pad4(deltas.byteLength);
+  let k = 0;
+  for (let i = 0; i < n && k < count; i++) {
+    if (mask[i >> 3] & (1 << (i & 7))) {
+      target[i] += deltas[k++];
+    }
+  }
+  return offset;
+}
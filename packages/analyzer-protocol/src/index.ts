@@ -24,6 +24,7 @@ export interface SPLData {
 export type WindowType = "hann" | "kaiser" | "blackman";
 export type AvgType = "power" | "linear" | "exp";
 export type LpfMode = "lpf" | "none";
+export type DspPrecision = "float64" | "float32";
 
 export interface SignalGeneratorConfig {
   enabled: boolean;
@@ -36,12 +37,23 @@ export interface SignalGeneratorConfig {
   amplitude: number;
 }
 
+// Raw input audio (loopback reference included) is written to
+// ~/.sounddocs-agent/recordings next to a JSON sidecar
+export interface RecordOptions {
+  format?: "wav" | "npy"; // float32 WAV (RF64 past 4 GiB) or .npy
+  name?: string | null; // file name stem; defaults to start time + session id
+  // RAM ahead of the disk writer; blocks are dropped once it is full
+  bufferSeconds?: number;
+}
+
 export interface CaptureConfig {
   deviceId: string;
   sampleRate: number;
   blockSize: number;
   refChan: number;
   measChan: number;
+  // Batch: measure several channels against refChan (overrides measChan)
+  measChans?: number[] | null;
 
   // FFT & Averaging
   nfft: number;
@@ -53,16 +65,59 @@ export interface CaptureConfig {
   lpfMode: LpfMode;
   lpfFreq: number;
 
+  // Output grid: log-spaced points per octave (0 sends every linear FFT bin)
+  pointsPerOctave?: number;
+
+  // Impulse response: samples sent around t=0, tapered at both ends
+  // (0 sends all nfft samples; default 4096)
+  irLength?: number;
+
+  // Delay estimation runs as its own periodic job at this rate (Hz)
+  delayRateHz?: number;
+
+  // Frames are analyzed and sent at this rate; hops in between only
+  // update the running spectra
+  targetFps?: number;
+
+  // "float32" runs FFTs, windows and the spectrum ring in single precision
+  dspPrecision?: DspPrecision;
+
+  // Signal gate: analysis pauses once ref or meas RMS stays below
+  // gateRmsDbfs or the crest factor exceeds gateMaxCrestDb for gateHoldMs.
+  // Off unless gateRmsDbfs is set (e.g. -80)
+  gateRmsDbfs?: number | null;
+  gateMaxCrestDb?: number;
+  gateHoldMs?: number;
+
   // Signal Generator & Loopback
   useLoopback?: boolean;
   generator?: SignalGeneratorConfig;
+
+  // Record the raw input while measuring (null: no recording)
+  record?: RecordOptions | null;
 }
 
 // Message types from client to agent
+// Frame encodings: "f32" is the binary layout decoded by decodeBinaryFrame,
+// "q16" the quantized delta layout decoded by QuantizedFrameDecoder
+export type FrameFormat = "q16" | "f32" | "json";
+
+// "q16" codec: max deviation tolerated before a bin is resent
+export interface FrameCodecOptions {
+  magErrorDb?: number;
+  phaseErrorDeg?: number;
+  cohError?: number;
+  irError?: number; // fraction of the IR peak
+  keyframeInterval?: number; // frames
+}
+
 export interface HelloMessage {
   type: "hello";
   client: string;
   nonce: string;
+  // Frame encodings the client can decode, preferred first
+  frameFormats?: FrameFormat[];
+  frameCodec?: FrameCodecOptions;
 }
 
 export interface ListDevicesMessage {
@@ -71,12 +126,25 @@ export interface ListDevicesMessage {
 
 export interface StartCaptureMessage extends CaptureConfig {
   type: "start";
+  // Names the new capture session; the agent picks one when omitted
+  sessionId?: string;
 }
 
 export interface StopCaptureMessage {
   type: "stop";
 }
 
+// Attach to a running capture and receive its frames; sessionId may be
+// omitted while only one capture is running
+export interface SubscribeMessage {
+  type: "subscribe";
+  sessionId?: string;
+}
+
+export interface ListSessionsMessage {
+  type: "list_sessions";
+}
+
 export interface CalibrateMessage {
   type: "calibrate";
   spl_ref_db: number;
@@ -93,20 +161,94 @@ export interface DelayFreezeMessage {
   applied_ms?: number;
 }
 
+// Sent when a "q16" delta cannot be applied (missed frame)
+export interface RequestKeyframeMessage {
+  type: "request_keyframe";
+}
+
 export interface UpdateGeneratorMessage {
   type: "update_generator";
   config: SignalGeneratorConfig;
 }
 
+// Stats of the current capture now; intervalS > 0 also pushes them that
+// often until the capture ends, 0 stops the push
+export interface GetStatsMessage {
+  type: "get_stats";
+  intervalS?: number;
+}
+
+// Sample every agent thread's stack for up to durationS; the "profile"
+// report follows when it ends (or on profile_stop)
+export interface ProfileStartMessage {
+  type: "profile_start";
+  durationS?: number; // default 10, at most 120
+  intervalMs?: number; // default 5
+  includeIdle?: boolean;
+}
+
+export interface ProfileStopMessage {
+  type: "profile_stop";
+}
+
+// Record timestamped spans of the current capture (callback, loop, analysis
+// stages, sends) until trace_stop or the capture ends; the newest `spans`
+// are kept
+export interface TraceStartMessage {
+  type: "trace_start";
+  spans?: number; // default 65536
+}
+
+export interface TraceStopMessage {
+  type: "trace_stop";
+}
+
+// Keep the raw spectra of the current capture's newest frame
+export interface SaveSnapshotMessage {
+  type: "save_snapshot";
+  name?: string;
+}
+
+export interface ListSnapshotsMessage {
+  type: "list_snapshots";
+}
+
+export interface DeleteSnapshotMessage {
+  type: "delete_snapshot";
+  id: string;
+}
+
+// Every measurement channel of every listed snapshot is one position
+export interface AverageSnapshotsMessage {
+  type: "average_snapshots";
+  ids: string[];
+  mode?: "power" | "complex"; // default "power"
+  coherenceWeighted?: boolean; // default true
+  pointsPerOctave?: number; // default 48
+  irLength?: number; // default 4096
+}
+
 export type ClientMessage =
   | HelloMessage
   | ListDevicesMessage
   | StartCaptureMessage
   | StopCaptureMessage
+  | SubscribeMessage
+  | ListSessionsMessage
   | CalibrateMessage
   | GetVersionMessage
   | DelayFreezeMessage
-  | UpdateGeneratorMessage;
+  | UpdateGeneratorMessage
+  | RequestKeyframeMessage
+  | GetStatsMessage
+  | ProfileStartMessage
+  | ProfileStopMessage
+  | TraceStartMessage
+  | TraceStopMessage
+  | SaveSnapshotMessage
+  | ListSnapshotsMessage
+  | DeleteSnapshotMessage
+  | AverageSnapshotsMessage;
 
 // Message types from agent to client
 export interface HelloAckMessage {
@@ -114,6 +256,8 @@ export interface HelloAckMessage {
   agent: string;
   originAllowed: boolean;
   version?: string;
+  // Encoding the agent will use for frames on this connection
+  frameFormat?: FrameFormat;
 }
 
 export interface DevicesMessage {
@@ -121,6 +265,16 @@ export interface DevicesMessage {
   items: Device[];
 }
 
+// Per-channel result when measuring several channels (measChans)
+export interface ChannelFrame {
+  measChan: number;
+  tf: TFData;
+  spl: SPLData;
+  delay_ms: number;
+  delay_mode?: string | null;
+  delay_confidence?: number | null;
+}
+
 export interface FrameMessage {
   type: "frame";
   tf: TFData;
@@ -131,12 +285,35 @@ export interface FrameMessage {
   sampleRate: number;
   delay_mode: string;
   applied_delay_ms: number;
+  // Peak-to-sidelobe ratio of the delay estimate; high while "tracking"
+  delay_confidence?: number | null;
+  // One entry per measurement channel when measChans is set; the top-level
+  // tf/spl/delay fields mirror the first entry
+  channels?: ChannelFrame[] | null;
 }
 
 export interface StoppedMessage {
   type: "stopped";
 }
 
+export interface SubscribedMessage {
+  type: "subscribed";
+  sessionId: string;
+  config: CaptureConfig; // settings of the capture being watched
+  subscribers: number;
+}
+
+export interface SessionInfo {
+  sessionId: string;
+  config: CaptureConfig;
+  subscribers: number;
+}
+
+export interface SessionsMessage {
+  type: "sessions";
+  sessions: SessionInfo[];
+}
+
 export interface ErrorMessage {
   type: "error";
   message: string;
@@ -155,11 +332,117 @@ export interface CalibrationDoneMessage {
   offset: number;
 }
 
+// Sent while analysis is paused by the signal gate (and once when it reopens);
+// the last frame stays valid meanwhile
+export interface GatedMessage {
+  type: "gated";
+  gated: boolean;
+  reason?: "silent" | "crest" | "invalid" | null;
+  ref_dbfs?: number | null;
+  meas_dbfs?: number | null;
+  ts: number;
+}
+
+// Recorder progress, about once a second and when the recording ends
+export interface RecordingMessage {
+  type: "recording";
+  path: string;
+  seconds: number; // audio on disk so far
+  backlog: number; // fraction of the RAM buffer waiting for the writer
+  droppedFrames: number; // frames lost because the writer fell behind
+  active: boolean;
+  error?: string | null;
+}
+
+export interface StageTiming {
+  count: number; // runs since the capture started
+  // over the newest runs (up to 512)
+  meanMs: number;
+  p50Ms: number;
+  p95Ms: number;
+  p99Ms: number;
+  maxMs: number;
+}
+
+export interface StatsMessage {
+  type: "stats";
+  sessionId: string;
+  ts: number;
+  uptimeS: number;
+  // "delay", "spectra", "ingest", "smoothing", "ir", "serialize", "send", "frame"
+  stages: Record<string, StageTiming>;
+  callback: StageTiming; // audio callback run time
+  callbackPeriodMs: number; // audio per callback at the latest block size
+  queueFrames: number; // audio waiting in the callback -> loop ring
+  queueCapacity: number;
+  overruns: number; // blocks the ring had no room for
+  droppedFrames: number;
+  outputUnderruns: number;
+  callbackStatusFlags: number; // callbacks PortAudio flagged (overflow/underflow)
+  framesSent: number;
+  rssBytes?: number | null;
+  caches: Record<string, number>; // entries per DSP cache, plus work-array bytes
+}
+
+export interface ProfileFunction {
+  function: string;
+  file: string;
+  line: number;
+  selfPct: number; // of the kept samples, with this function innermost
+  totalPct: number; // of the kept samples, with this function anywhere on the stack
+}
+
+export interface ProfileMessage {
+  type: "profile";
+  running: boolean;
+  seconds: number;
+  samples: number;
+  path?: string | null; // collapsed stacks (flamegraph.pl / speedscope)
+  threads?: Record<string, number>; // kept samples per thread
+  top?: ProfileFunction[]; // by self samples
+  error?: string | null;
+}
+
+export interface TraceMessage {
+  type: "trace";
+  running: boolean;
+  path?: string | null; // Chrome trace-event JSON (chrome://tracing, Perfetto)
+  spans: number; // spans in the file
+  overwritten?: number; // older spans the ring had to drop
+  error?: string | null;
+}
+
+export interface SnapshotInfo {
+  id: string;
+  name: string;
+  created: string; // ISO 8601
+  sampleRate: number;
+  nfft: number;
+  measChans: number[];
+  delaysMs: number[];
+}
+
+// Reply to save_snapshot, list_snapshots and delete_snapshot
+export interface SnapshotsMessage {
+  type: "snapshots";
+  snapshots: SnapshotInfo[];
+}
+
+export interface SnapshotAverageMessage {
+  type: "snapshot_average";
+  ids: string[];
+  mode: string;
+  coherenceWeighted: boolean;
+  positions: number;
+  tf: TFData;
+}
+
 export interface DelayStatusMessage {
   type: "delay_status";
   mode: string;
   applied_ms: number;
   raw_ms?: number;
+  confidence?: number | null;
 }
 
 export type AgentMessage =
@@ -167,10 +450,19 @@ export type AgentMessage =
   | DevicesMessage
   | FrameMessage
   | StoppedMessage
+  | SubscribedMessage
+  | SessionsMessage
   | ErrorMessage
   | VersionMessage
   | CalibrationDoneMessage
-  | DelayStatusMessage;
+  | DelayStatusMessage
+  | GatedMessage
+  | RecordingMessage
+  | StatsMessage
+  | ProfileMessage
+  | TraceMessage
+  | SnapshotsMessage
+  | SnapshotAverageMessage;
 
 // Union type for all messages
 export type ProtocolMessage = ClientMessage | AgentMessage;
@@ -182,10 +474,22 @@ export function isClientMessage(msg: ProtocolMessage): msg is ClientMessage {
     "list_devices",
     "start",
     "stop",
+    "subscribe",
+    "list_sessions",
     "calibrate",
     "get_version",
     "delay_freeze",
     "update_generator",
+    "request_keyframe",
+    "save_snapshot",
+    "list_snapshots",
+    "delete_snapshot",
+    "average_snapshots",
+    "get_stats",
+    "profile_start",
+    "profile_stop",
+    "trace_start",
+    "trace_stop",
   ].includes(msg.type);
 }
 
@@ -195,9 +499,20 @@ export function isAgentMessage(msg: ProtocolMessage): msg is AgentMessage {
     "devices",
     "frame",
     "stopped",
+    "subscribed",
+    "sessions",
     "error",
     "version",
     "calibration_done",
     "delay_status",
+    "gated",
+    "recording",
+    "snapshots",
+    "snapshot_average",
+    "stats",
+    "profile",
+    "trace",
   ].includes(msg.type);
 }
+
+export * from "./binaryFrame";